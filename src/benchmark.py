@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+#
+# usage: ./benchmark.py [-n N] [-m MB] [-j FILE] [-b FILE] [-t TOL] [-s]
+# microbenchmark suite for the rxp packet codec,
+# checksum, send segmentation and the listener's
+# timer wheel. Every case is
+# reported in operations (packets) per second and
+# compared against a stored baseline, so codec
+# regressions show up as numbers. Cases are compared
+# as ratios to the legacy (ctypes) header codec, timed
+# alongside each case, so a baseline taken on another
+# machine (or a busier one) still applies.
+# With -m, also reports the memory traced while
+# Socket.send segments an MB megabyte message.
+
+from lib.rxp import *
+import ctypes
+import timeit
+import tracemalloc
+import json
+import os
+import platform
+import sys
+import getopt
+from collections import deque
+from itertools import islice
+
+# number of packets per measurement
+N = 20000
+# message size for the memory measurement (MB)
+MB = None
+# file the results are written to (JSON)
+JSON_FILE = None
+# baseline results (JSON)
+BASELINE_FILE = os.path.join(os.path.dirname(
+	os.path.abspath(__file__)), "benchmark_baseline.json")
+# slowdown relative to the baseline reported
+# as a regression (fraction)
+TOLERANCE = 0.2
+# save the results as the new baseline
+SAVE = False
+# measurements per case; the best one counts, which
+# drops the runs the machine was busy for
+REPEAT = 7
+# header round trips (legacy codec) timed with every
+# measurement, as a fraction of N
+REFERENCE_SHARE = 0.1
+
+# payload sizes (bytes) of the Packet cases
+PAYLOAD_SIZES = (0, 64, 1450, 16384)
+# message sizes (bytes) of the Socket.send cases
+MESSAGE_SIZES = (1024, 65536, 1048576)
+# number of timers armed in the TimerWheel cases
+TIMERS = 10000
+
+opts, args = getopt.getopt(sys.argv[1:], "n:m:j:b:t:s")
+for opt, arg in opts:
+	if opt == "-n":
+		N = int(arg)
+	elif opt == "-m":
+		MB = int(arg)
+	elif opt == "-j":
+		JSON_FILE = arg
+	elif opt == "-b":
+		BASELINE_FILE = arg
+	elif opt == "-t":
+		TOLERANCE = float(arg)
+	elif opt == "-s":
+		SAVE = True
+
+# ctypes field types used by the previous codec
+_CTYPES = {"H": ctypes.c_uint16, "I": ctypes.c_uint32}
+
+def legacyPickle(header):
+	"""previous Header.pickle: one ctypes object
+	per field, extending a bytearray"""
+	byteArr = bytearray()
+	for item in Header.FIELDS:
+		fieldVal = header.fields[item[0]]
+		if fieldVal is not None:
+			byteArr.extend(bytearray(
+				_CTYPES[item[1]](fieldVal)))
+	return byteArr
+
+def legacyUnpickle(byteArr):
+	"""previous Header.unpickle: copies into a
+	bytearray and decodes one field at a time"""
+	if not isinstance(byteArr, bytearray):
+		byteArr = bytearray(byteArr)
+	h = Header()
+	base = 0
+	for item in Header.FIELDS:
+		fieldSize = item[2]
+		value = byteArr[base : base + fieldSize]
+		h.fields[item[0]] = _CTYPES[item[1]].from_buffer(value).value
+		base += fieldSize
+	return h
+
+def upfrontSend(sock, msg):
+	"""previous Socket.send segmentation: one copied
+	chunk and one Packet per segment, all created
+	before sending"""
+	packetQ = deque()
+	for i in range(0, len(msg), sock.mss):
+		header = Header(
+			srcPort=sock.srcAddr[1],
+			destPort=sock.destAddr[1],
+			seq=sock.seq.num,
+			attrs=0
+			)
+		packetQ.append(Packet(header, msg[i:i+sock.mss]))
+		sock.seq.next()
+	while packetQ:
+		packetQ.popleft()
+
+def lazySend(sock, msg):
+	"""Socket.send segmentation: a window of packets at
+	a time, released to the pool once acknowledged"""
+	segments = sock._segments(msg)
+	while True:
+		window = list(islice(segments, sock.sendWindow))
+		if not window:
+			break
+		for packet in window:
+			sock.packetPool.release(packet)
+
+def scanDeadline(conns):
+	"""previous listener timers: the next deadline is 
+	the earliest of every connection's (O(n) scan)"""
+	return min(conn.deadline for conn in conns)
+
+def wheelTicks(wheel, tick):
+	"""returns a function advancing wheel by one tick
+	per call, on a virtual clock. Fired timers arm 
+	themselves again, a minute later.
+	"""
+	clock = [0.0]
+	def rearm(now):
+		wheel.schedule(now + 60.0, rearm, now + 60.0)
+	for i in range(TIMERS):
+		deadline = (i * 7919) % 60000 * 0.001 + 0.001
+		wheel.schedule(deadline, rearm, deadline)
+	def advance():
+		clock[0] += tick
+		wheel.advance(clock[0])
+	return advance
+
+def traced(func, *args):
+	"""returns the peak memory (bytes) traced
+	while running func"""
+	tracemalloc.start()
+	func(*args)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak
+
+def rate(func, ops=1, reference=None):
+	"""returns (operations/sec, relative speed) for func,
+	which performs ops operations per call (best of 
+	REPEAT). Each measurement runs about N operations
+	and is followed by one of reference; the relative
+	speed is func's rate over reference's, which 
+	cancels out the speed of the machine."""
+	number = max(1, N // ops)
+	refNumber = max(1, int(N * REFERENCE_SHARE))
+	best = refBest = None
+	for i in range(REPEAT):
+		elapsed = timeit.timeit(func, number=number)
+		if best is None or elapsed < best:
+			best = elapsed
+		if reference is not None:
+			elapsed = timeit.timeit(reference, number=refNumber)
+			if refBest is None or elapsed < refBest:
+				refBest = elapsed
+	value = number * ops / best
+	if reference is None:
+		return value, None
+	return value, value / (refNumber / refBest)
+
+class BenchSocket(Socket):
+	"""Socket for the running interpreter: the cases
+	measure whichever Python runs the suite"""
+	_expectedPythonVersion = sys.hexversion
+
+def makeSocket():
+	"""returns an unbound socket set up for
+	segmenting messages"""
+	sock = BenchSocket()
+	sock.srcAddr = ("127.0.0.1", 8080)
+	sock.destAddr = ("127.0.0.1", 8081)
+	sock.sendWindow = 10
+	return sock
+
+def cases():
+	"""returns the benchmark cases as a list of
+	(name, func, operations per call), and the 
+	reference func (a legacy header round trip)"""
+
+	header = Header(
+		srcPort=8080,
+		destPort=8081,
+		seq=12345,
+		ack=12346,
+		recvWindow=4096,
+		length=1000,
+		checksum=123,
+		attrs=PacketAttributes.NM
+		)
+	wire = header.pickle()
+	buf = bytearray(Header.LENGTH)
+
+	assert legacyPickle(header) == wire
+	assert legacyUnpickle(wire).fields == Header.unpickle(wire).fields
+	reference = lambda: legacyUnpickle(legacyPickle(header))
+
+	attrNames = ("SYN", "ACK")
+	attrMask = PacketAttributes.SYN | PacketAttributes.ACK
+	attrPacket = Packet(Header(attrs=attrMask))
+	num = WrapableNum(max=Packet.MAX_SEQ_NUM)
+
+	result = [
+		("Header.pickle (ctypes)", lambda: legacyPickle(header), 1),
+		("Header.unpickle (ctypes)", lambda: legacyUnpickle(wire), 1),
+		("Header.pickle", lambda: header.pickle(), 1),
+		("Header.pack_into", lambda: header.pack_into(buf), 1),
+		("Header.unpickle", lambda: Header.unpickle(wire), 1),
+		("Header.unpack_from", lambda: Header.unpack_from(buf), 1),
+		("PacketAttributes.pickle",
+			lambda: PacketAttributes.pickle(attrNames), 1),
+		("PacketAttributes.unpickle",
+			lambda: PacketAttributes.unpickle(attrMask), 1),
+		("Packet.checkAttrs (mask)",
+			lambda: attrPacket.checkAttrs(attrMask, exclusive=True), 1),
+		("Packet.checkAttrs (names)",
+			lambda: attrPacket.checkAttrs(attrNames, exclusive=True), 1),
+		("WrapableNum.next", lambda: num.next(), 1),
+		("Packet.update",
+			lambda: attrPacket.update(seq=12345, ack=12346), 1),
+		]
+
+	for size in PAYLOAD_SIZES:
+		data = os.urandom(size)
+		packet = Packet(Header(seq=12345, attrs=PacketAttributes.NM), data)
+		wire = bytes(packet.pickle())
+		received = Packet.unpickle(wire)
+		assert received.verify()
+
+		# default arguments bind the current packet
+		result.extend([
+			("Packet [%d]" % size,
+				lambda data=data: Packet(Header(seq=12345), data), 1),
+			("Packet.pickle [%d]" % size,
+				lambda p=packet: p.pickle(), 1),
+			("Packet.buffers [%d]" % size,
+				lambda p=packet: p.buffers(), 1),
+			("Packet.unpickle [%d]" % size,
+				lambda w=wire: Packet.unpickle(w), 1),
+			("Packet._checksum [%d]" % size,
+				lambda p=packet: p._checksum(), 1),
+			("Packet.verify [%d]" % size,
+				lambda p=received: p.verify(), 1),
+			])
+
+	sock = makeSocket()
+	for size in MESSAGE_SIZES:
+		msg = bytes(size)
+		segments = (size + sock.mss - 1) // sock.mss
+		result.append(("Socket.send segments [%d]" % size,
+			lambda msg=msg: lazySend(sock, msg), segments))
+
+	# TIMERS armed timers, spread over a minute
+	wheel = TimerWheel(now=0.0)
+	timers = [wheel.schedule((i * 7919) % 60000 * 0.001 + 0.001, len)
+		for i in range(TIMERS)]
+	assert scanDeadline(timers) == wheel.nextDeadline()
+	ticking = TimerWheel(now=0.0)
+	result.extend([
+		("TimerWheel.schedule+cancel",
+			lambda: wheel.schedule(30.0, len).cancel(), 1),
+		("TimerWheel.nextDeadline [%d]" % TIMERS,
+			lambda: wheel.nextDeadline(), 1),
+		("deadline scan [%d]" % TIMERS,
+			lambda: scanDeadline(timers), 1),
+		("TimerWheel.advance [%d]" % TIMERS,
+			wheelTicks(ticking, ticking.tick), 1),
+		])
+
+	return result, reference
+
+def run():
+	"""runs every case, returns {name: ops/sec} and
+	{name: speed relative to the reference}"""
+	results = {}
+	relative = {}
+	caseList, reference = cases()
+	for name, func, ops in caseList:
+		results[name], relative[name] = rate(func, ops, reference)
+	return results, relative
+
+def compare(results, relative, baseline, baseRelative):
+	"""prints results next to the baseline. The ratio 
+	of a case is its relative speed over the 
+	baseline's (its ops/sec over the baseline's if the
+	baseline has no relative speeds). Returns the 
+	names of the cases that regressed."""
+	regressions = []
+
+	print("{0:<32} {1:>12} {2:>12} {3:>7}".format(
+		"ops/sec", "result", "baseline", "ratio"))
+	for name in sorted(results):
+		value = results[name]
+		if name in baseline:
+			if name in baseRelative:
+				ratio = relative[name] / baseRelative[name]
+			else:
+				ratio = value / baseline[name]
+			flag = ""
+			if ratio < 1 - TOLERANCE:
+				flag = " REGRESSION"
+				regressions.append(name)
+			print("{0:<32} {1:>12,.0f} {2:>12,.0f} {3:>6.2f}x{4}".format(
+				name, value, baseline[name], ratio, flag))
+		else:
+			print("{0:<32} {1:>12,.0f} {2:>12} {3:>7}".format(
+				name, value, "-", "-"))
+
+	return regressions
+
+results, relative = run()
+output = {
+	"python": platform.python_version(),
+	"n": N,
+	"results": results,
+	"relative": relative
+	}
+
+baseline = {}
+baseRelative = {}
+if os.path.exists(BASELINE_FILE):
+	with open(BASELINE_FILE) as f:
+		saved = json.load(f)
+	baseline = saved["results"]
+	baseRelative = saved.get("relative", {})
+
+regressions = compare(results, relative, baseline, baseRelative)
+
+if JSON_FILE:
+	with open(JSON_FILE, "w") as f:
+		json.dump(output, f, indent=1, sort_keys=True)
+
+if SAVE:
+	with open(BASELINE_FILE, "w") as f:
+		json.dump(output, f, indent=1, sort_keys=True)
+
+if MB:
+	msg = bytes(MB * 1024 * 1024)
+	sock = makeSocket()
+
+	print("")
+	print("{0:<32} {1:>12} {2:>12}".format(
+		"peak traced MB (" + str(MB) + " MB)", "before", "after"))
+	print("{0:<32} {1:>12.2f} {2:>12.2f}".format(
+		"Socket.send segments",
+		traced(upfrontSend, sock, msg) / 2**20,
+		traced(lazySend, sock, msg) / 2**20))
+
+if regressions:
+	print("")
+	print(str(len(regressions)) + " regression(s) beyond " +
+		str(int(TOLERANCE * 100)) + "%")
+	sys.exit(1)
@@ -2,8 +2,18 @@ import queue
 import threading
 import sys
 import socket
-
-MAX_QUEUE_CONNECTIONS = 3
+import os
+from lib.rxp import RxPException
+
+# connections the server queues until it accepts
+# them (listen backlog)
+MAX_QUEUE_CONNECTIONS = 128
+# size of the buffer received file data is
+# written from (bytes)
+RECV_BUFFER = 65536
+# seconds the server keeps the connection of a client
+# it hears nothing from (the client vanished)
+IDLE_TIMEOUT = 600
 DEBUG_MODE = False
 lock = threading.Lock()
 cond = threading.Condition(lock)
@@ -22,6 +32,9 @@ class FxA:
 		self.W = 10
 		self.accepting = False
 		self.connected = False
+		# connect was deferred to the first request,
+		# which is sent in the SYN (fast open)
+		self.deferred = False
 		self.socket = socket
 
 	def run(self):
@@ -40,10 +53,16 @@ class FxA:
 				command = uin[0]
 				if(not self.server and command == "connect"):
 					self.connect()
-				elif(not self.server and command == "get" and len(uin) > 1):
-					self.get(uin[1])
-				elif(not self.server and command == "post" and len(uin) > 1):
-					self.post(uin[1])
+				elif(not self.server and command in ("get", "post") and len(uin) > 1):
+					try:
+						if(command == "get"):
+							self.get(uin[1])
+						else:
+							self.post(uin[1])
+					except RxPException as e:
+						# the server stopped answering
+						if(DEBUG_MODE):
+							print("Transfer failed: " + str(e))
 				elif(not self.server and command == "disconnect"):
 					self.disconnect()
 				elif(command == "window" and len(uin) > 1):
@@ -57,6 +76,11 @@ class FxA:
 	def setupSocket(self):
 		#self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 		self.socket.bind((self.ip, self.port))
+		self.socket.sendWindow = self.W
+		# the first connect gets a token from the server,
+		# later ones send their first request in the SYN,
+		# saving a round trip per transfer
+		self.socket.fastOpen = True
 
 	def getuserinput(self):
 		self.ithread = threading.Thread(target = self.userinput, args=(self.iqueue,lock))
@@ -83,6 +107,13 @@ class FxA:
 	def connect(self):
 		if(self.connected):
 			return
+		if(self.socket.canFastOpen((self.ip, self.destport))):
+			# the server issued a token to an earlier
+			# connection: the handshake carries the
+			# first request
+			self.connected = True
+			self.deferred = True
+			return
 		try:
 			if(DEBUG_MODE):
 				print("connecting")
@@ -90,20 +121,49 @@ class FxA:
 			if(DEBUG_MODE):
 				print("connected")
 			self.connected = True
-		except socket.error:
+		except Exception:
+			# the server could not be reached
 			if(DEBUG_MODE):
 				print("error connecting..")
 			self.connected = False
 
+	# sends the first message of a request. If the
+	# connect was deferred, the handshake sends it.
+	# Returns False if the server could not be reached
+	def request(self, msg):
+		if(self.deferred):
+			self.deferred = False
+			try:
+				self.socket.connect((self.ip, self.destport), msg)
+			except Exception:
+				if(DEBUG_MODE):
+					print("error connecting..")
+				self.connected = False
+				return False
+		else:
+			self.socket.send(msg)
+		return True
+
+	# replaces the closed socket, so the client
+	# can connect again
+	def reopen(self):
+		self.socket = type(self.socket)()
+		self.setupSocket()
+
 	def disconnect(self):
 		if(not self.connected):
 			if(DEBUG_MODE):
 				print("Not connected")
 			return
+		self.connected = False
+		if(self.deferred):
+			# nothing was sent
+			self.deferred = False
+			return
 		resp = "CLOSE:DONE"
 		self.socket.send(str.encode(resp))
 		self.socket.close()
-		self.connected = False
+		self.reopen()
 
 	def get(self, F):
 		if(not self.connected):
@@ -111,14 +171,22 @@ class FxA:
 				print("Not connected")
 			return
 		resp = "GET:"+F
-		self.socket.send(str.encode(resp))
+		if(not self.request(str.encode(resp))):
+			return
 
 		recvd = False
 		while(not recvd):
 			if(DEBUG_MODE):
 				print("receiving size..")
 			self.socket.timeout = 1
-			resp = self.socket.recv() #receive the size of packets
+			try:
+				resp = self.socket.recv() #receive the size of packets
+			except RxPException as e:
+				if(e.type != RxPException.CONNECTION_TIMEOUT):
+					raise
+				if(DEBUG_MODE):
+					print("Server timed out")
+				return
 			resp = bytes.decode(resp)
 			if(DEBUG_MODE):
 				print("received")
@@ -144,6 +212,7 @@ class FxA:
 				recvd = True
 				self.socket.close()
 				self.connected = False
+				self.reopen()
 				if(DEBUG_MODE):
 					print("Server closed")
 				return
@@ -163,23 +232,34 @@ class FxA:
 
 		recvd = 0
 		size = int(size)
-		while(recvd < size):
-			if(DEBUG_MODE):
-				print("received:" + str(recvd) + " bytes")
-			if(size - recvd < 1024):
-				temp = self.socket.recv()
-			else:
-				temp = self.socket.recv()
-			recvd+=1024
-			#f.write(bytes.decode(temp))
-			f.write(temp)
+		# the file is written as it arrives
+		buf = bytearray(RECV_BUFFER)
+		view = memoryview(buf)
+		# read until recv_into returns 0 (the end of the
+		# message, which it consumes). An empty file is
+		# not sent
+		if(size):
+			temp = self.socket.recv_into(buf)
+			while(temp):
+				if(DEBUG_MODE):
+					print("received:" + str(recvd) + " bytes")
+				recvd+=temp
+				f.write(view[:temp])
+				temp = self.socket.recv_into(buf)
 		if(DEBUG_MODE):
 			with lock: 
-				print("Transfered file successfully")
+				if(recvd == size):
+					print("Transfered file successfully")
+				else:
+					print("Transfer ended after " + str(recvd) + " bytes")
 
 		f.close()
 		
 	def post(self, F):
+		if(not self.connected):
+			if(DEBUG_MODE):
+				print("Not connected")
+			return
 		try:
 			f = open(F, 'rb')
 		except IOError:
@@ -187,12 +267,14 @@ class FxA:
 				print("File error..")
 			return
 
-		a = f.read()
+		size = os.fstat(f.fileno()).st_size
 
 		if(DEBUG_MODE):
 			print("Sending size..")
-		resp = "POST:" + str(len(a)) + ":" + F
-		self.socket.send(str.encode(resp))
+		resp = "POST:" + str(size) + ":" + F
+		if(not self.request(str.encode(resp))):
+			f.close()
+			return
 		
 		crecvd = False
 		while(not crecvd):
@@ -205,147 +287,166 @@ class FxA:
 					crecvd = False
 			except ValueError:
 				crecvd = False
+			except RxPException as e:
+				if(e.type != RxPException.CONNECTION_TIMEOUT):
+					raise
+				if(DEBUG_MODE):
+					print("Server timed out")
+				f.close()
+				return
 
-		sent = 0
-		while(sent < len(a)):
-			if(len(a) - sent < 1024):
-				self.socket.send(a[sent:len(a)])
-			else:
-				self.socket.send(a[sent:sent+1024])
-			sent+=1024
+		# the file is read as it is sent
+		if(size):
+			self.socket.send(f)
 		if(DEBUG_MODE):
 			print("Transfered file successfully")
 		f.close()
 
 	def runserver(self):
-		#self.socket.timeout = 1000
-		if(DEBUG_MODE):
-			print("running" + str(self.connected))
-		if(not self.connected):
-			if(not self.accepting):
-				if(DEBUG_MODE):
-					print("listening")
-				self.socket.listen()
-				if(DEBUG_MODE):
-					print("accepting")
-				self.accepting = True
-			try:
-				self.socket.timeout = 1
-				self.socket.accept()
-			except socket.timeout:
-				return	
-			self.accepting = False
+		if(not self.accepting):
 			if(DEBUG_MODE):
-				print("accepted")
-			self.connected = True
-
-		if(DEBUG_MODE):
-			print("receiving..")
+				print("listening")
+			self.socket.idleTimeout = IDLE_TIMEOUT
+			self.socket.listen(MAX_QUEUE_CONNECTIONS)
+			self.accepting = True
 		try:
 			self.socket.timeout = 1
-			recvd = self.socket.recv()
+			conn = self.socket.accept()
 		except socket.timeout:
-			#probably should close socket of the client
-			#self.socket.close()
-			#self.connected = False
-			return	
-		recvd = bytes.decode(recvd)
-
+			return
 		if(DEBUG_MODE):
-			print("received:" + recvd)
-		recvd = recvd.split(':')
-		if(len(recvd)>1 and recvd[0] == "GET"):
-			filename = recvd[1]
-			
-			try:
-				f = open(filename, 'rb')
-			except IOError:
-				if(DEBUG_MODE):
-					print("File error..")
-				resp = "ERR:File error"
-				self.socket.send(str.encode(resp))
-				return
+			print("accepted " + str(conn.destAddr))
 
-			fdata = f.read()
-			#a = str.encode(fdata)
-			a = fdata
+		# every client is served on its own thread
+		cthread = threading.Thread(target = self.serve, args=(conn,))
+		cthread.daemon = True
+		cthread.start()
 
-			crecvd = False
-			while(not crecvd):
-				if(DEBUG_MODE):
-					print("Sending size..")
-				resp = "SND:" + str(len(a))
-				self.socket.send(str.encode(resp))
-				try:
-					resp = self.socket.recv()
-					resp = bytes.decode(resp).split(':')[0]
-					if(resp == "GOT"):
-						crecvd = True
-					else:
-						crecvd = False
-				except ValueError:
-					crecvd = False
-
-			sent = 0
-			while(sent < len(a)):
-				if(len(a) - sent < 1024):
-					self.socket.send(a[sent:len(a)])
-				else:
-					self.socket.send(a[sent:sent+1024])
-				sent+=1024
+	def serve(self, conn):
+		try:
+			self.handle(conn)
+		except RxPException as e:
+			# the client stopped answering
 			if(DEBUG_MODE):
-				print("Transfered file successfully")
-			f.close()
+				print(str(conn.destAddr) + ": " + str(e))
 
-		if(len(recvd)>1 and recvd[0] == "POST"):
+	def handle(self, conn):
+		while(self.running):
+			if(DEBUG_MODE):
+				print("receiving..")
 			try:
-				size = int(recvd[1])
-				filename = recvd[2]
-
-				resp = "GOT:"+str(size)
-				self.socket.send(str.encode(resp))
-				if(DEBUG_MODE):
-					print("Got size:" + str(size))
-			except ValueError:
-				resp = "ERR:VALUE_ERROR"
-				self.socket.send(str.encode(resp))
-				if(DEBUG_MODE):
-					print("Did not get a proper size:" + resp.split(':')[1])
+				recvd = conn.recv()
+			except RxPException as e:
+				if(e.type == RxPException.CONNECTION_TIMEOUT):
+					# the client is idle, the listener
+					# closes it after IDLE_TIMEOUT
+					continue
+				return
+			except Exception:
+				return
+			if(not recvd):
+				# the client closed the connection, or
+				# vanished (idle timeout)
+				conn.close()
 				return
+			recvd = bytes.decode(recvd)
 
 			if(DEBUG_MODE):
-				print("Size:" + str(size))
-
-			filename = "new " + filename
+				print("received:" + recvd)
+			recvd = recvd.split(':')
+			if(len(recvd)>1 and recvd[0] == "GET"):
+				filename = recvd[1]
+			
+				try:
+					f = open(filename, 'rb')
+				except IOError:
+					if(DEBUG_MODE):
+						print("File error..")
+					resp = "ERR:File error"
+					conn.send(str.encode(resp))
+					continue
 
-			#Set the file to be empty
-			f = open(filename, 'w+')
-			f.write("")
-			f.close()
+				size = os.fstat(f.fileno()).st_size
 
-			f = open(filename, 'a+b')
+				crecvd = False
+				while(not crecvd):
+					if(DEBUG_MODE):
+						print("Sending size..")
+					resp = "SND:" + str(size)
+					conn.send(str.encode(resp))
+					try:
+						resp = conn.recv()
+						resp = bytes.decode(resp).split(':')[0]
+						if(resp == "GOT"):
+							crecvd = True
+						else:
+							crecvd = False
+					except ValueError:
+						crecvd = False
 
-			brecvd = 0
-			size = int(size)
-			while(brecvd < size):
+				# the file is read as it is sent
+				if(size):
+					conn.send(f)
 				if(DEBUG_MODE):
-					print("received:" + str(brecvd) + " bytes")
-				if(size - brecvd < 1024):
-					temp = self.socket.recv()
-				else:
-					temp = self.socket.recv()
-				brecvd+=1024
-				#f.write(bytes.decode(temp))
-				f.write(temp)
-			if(DEBUG_MODE):
-				with lock: 
 					print("Transfered file successfully")
+				f.close()
 
-			f.close()
+			if(len(recvd)>1 and recvd[0] == "POST"):
+				try:
+					size = int(recvd[1])
+					filename = recvd[2]
 
-		if(len(recvd)>1 and recvd[0] == "CLOSE"):
-			self.socket.close()
-			self.connected = False
+					resp = "GOT:"+str(size)
+					conn.send(str.encode(resp))
+					if(DEBUG_MODE):
+						print("Got size:" + str(size))
+				except ValueError:
+					resp = "ERR:VALUE_ERROR"
+					conn.send(str.encode(resp))
+					if(DEBUG_MODE):
+						print("Did not get a proper size:" + resp.split(':')[1])
+					continue
+
+				if(DEBUG_MODE):
+					print("Size:" + str(size))
+
+				filename = "new " + filename
+
+				#Set the file to be empty
+				f = open(filename, 'w+')
+				f.write("")
+				f.close()
+
+				f = open(filename, 'a+b')
+
+				brecvd = 0
+				size = int(size)
+				# the file is written as it arrives
+				buf = bytearray(RECV_BUFFER)
+				view = memoryview(buf)
+				# read until recv_into returns 0 (the end of
+				# the message, which it consumes). An empty
+				# file is not sent
+				if(size):
+					temp = conn.recv_into(buf)
+					while(temp):
+						if(DEBUG_MODE):
+							print("received:" + str(brecvd) + " bytes")
+						brecvd+=temp
+						f.write(view[:temp])
+						temp = conn.recv_into(buf)
+				if(DEBUG_MODE):
+					with lock: 
+						if(brecvd == size):
+							print("Transfered file successfully")
+						else:
+							print("Transfer ended after " + str(brecvd) + " bytes")
+
+				f.close()
+
+			if(len(recvd)>1 and recvd[0] == "CLOSE"):
+				conn.close()
+				return
 
 
 	def terminate(self):
@@ -361,8 +462,14 @@ class FxA:
 		self.running = False
 
 	def window(self, W):
+		try:
+			W = int(W)
+		except ValueError:
+			if(DEBUG_MODE):
+				print("Not a window size:" + W)
+			return
 		self.W = W
-		#self.socket.sendWindow = W
+		self.socket.sendWindow = W
 
 
 
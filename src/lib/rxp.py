@@ -1,14 +1,33 @@
-import ctypes
 import sys
 import socket 
+import select
+import selectors
+import time
 import math 
 import struct
 import logging
 from collections import OrderedDict
+from collections.abc import MutableMapping
+from types import MappingProxyType
+import operator
 from collections import deque
+from collections import namedtuple
 from sys import getsizeof
 import random
-from functools import reduce
+import io
+import threading
+import asyncio
+import types
+import codecs
+import copy
+import os
+import hmac
+import hashlib
+
+# generator based coroutines (yield from), so that the
+# asyncio API runs on Python 3.4. asyncio.coroutine was
+# removed in Python 3.11
+_coroutine = getattr(asyncio, "coroutine", None) or types.coroutine
 
 class Socket:
 	"""Socket contains all API methods needed
@@ -19,24 +38,91 @@ class Socket:
 	_expectedPythonVersion = 50594800
 	_pythonMessage = "Incorrect Python version. Expecting version 3.4.3"
 
+	# scatter-gather send (not available on Windows)
+	_hasSendmsg = hasattr(socket.socket, "sendmsg")
+
+	# timeout (seconds) used while probing the
+	# segment size if the socket has no timeout
+	PROBE_TIMEOUT = 1.0
+
+	# maximum number of SACK blocks per ACK
+	SACK_BLOCKS = 4
+
+	# default receive window (bytes)
+	RECV_WINDOW = 2**20
+
+	# largest message length hint (bytes) recv()
+	# preallocates the message for
+	MAX_PREALLOCATE = 2**26
+
+	# lifetime (seconds) of a SYN cookie. A cookie is
+	# accepted until the period after the one it was
+	# issued in ends
+	COOKIE_PERIOD = 64
+
+	# fast open tokens issued by servers, as (token, 
+	# segment size) by server address
+	_fastOpenTokens = dict()
+
 	# constructor
 	def __init__(self):
 
 		# verify python version
 		version = sys.hexversion
-		if version != Socket._expectedPythonVersion:
-			raise RxPException(Socket._pythonMessage)
+		if version != self._expectedPythonVersion:
+			raise RxPException(RxPException.INVALID_STATE,
+				msg=Socket._pythonMessage)
 
 		# create UDP socket
-		self._socket = socket.socket(
-			socket.AF_INET, socket.SOCK_DGRAM)
+		self._open()
+		# received datagrams not processed yet
+		self._pending = deque()
+		# data delivered in order and not read yet, with
+		# None at the end of each message. The last 
+		# self._views entries may be views of the receive
+		# ring, they are copied before the ring is reused
+		self._received = deque()
+		self._views = 0
+		# lengths announced by the sender (or None) of the
+		# messages in self._received, and of the message
+		# being delivered if self._inMessage
+		self._lengths = deque()
+		self._inMessage = False
+		# guards the connection state while the reactor
+		# runs. Readers wait on it for data
+		self._cond = threading.Condition()
 
 		# timeout (seconds). None => no timeout
 		self.timeout = None
-		# size of sender window (bytes)
+		# size of sender window (packets in flight). The
+		# congestion window never grows past it
 		self.sendWindow = 1
-		# size of receiver window (bytes)
-		self.recvWindow = Packet.MAX_WINDOW_SIZE
+		# size of receiver window (bytes): the received 
+		# data the application has not read is limited to
+		# it, and the room left is advertised in every ACK
+		self.recvWindow = Socket.RECV_WINDOW
+		# the receive window is advertised in units of 
+		# 2**_recvScale bytes (SCALE option), and the peer's
+		# in units of 2**_peerScale bytes
+		self._recvScale = 0
+		self._peerScale = 0
+		# bytes received in order that the application has
+		# not read, and room last advertised to the peer
+		self._buffered = 0
+		self._advertised = 0
+		# room last advertised by the peer (bytes), None 
+		# until it is known
+		self._peerWindow = None
+		# maximum segment size (bytes of data per packet).
+		# Both sides advertise theirs during the handshake
+		# and the smaller one is used
+		self.mss = Packet.DATA_LENGTH
+		# if True, connect() probes for the largest
+		# payload (up to mss) the path delivers
+		self.probeMSS = False
+		# number of times a probe size is tried
+		# before it is considered too large
+		self.probeAttempts = 3
 		# connection status (see ConnectionStatus)
 		self.connStatus = ConnectionStatus.NO_CONN
 		# destination address (ipaddress, port)
@@ -47,6 +133,9 @@ class Socket:
 		self.seq = WrapableNum(max=Packet.MAX_SEQ_NUM)
 		# ack.num
 		self.ack = WrapableNum(max=Packet.MAX_SEQ_NUM)
+		# sequence number of the first data packet, sent
+		# with the ACK that completes the handshake
+		self._firstSeq = 0
 		# denotes if the socket is the
 		# sender or receiver
 		self.isSender = False
@@ -55,15 +144,118 @@ class Socket:
 		# denotes if messages should will be passed in
 		# as strings or bytes
 		self.acceptStrings = False
-
-	# timeout is used to interact with
-	# self._socket's timeout property
+		# ACK packet reused by _sendACK
+		self._ackPacket = None
+		# packets received out of order, held
+		# until the packets before them arrive
+		self._reorder = ReorderBuffer()
+		# round trip time of the connection, which
+		# sets the retransmission timeout
+		self._rtt = RttEstimator()
+		# in order packets acknowledged by one ACK,
+		# unless ackDelay (seconds) passes first
+		self.ackEvery = 2
+		self.ackDelay = 0.01
+		self._delayedAck = DelayedAck(self.ackEvery, self.ackDelay)
+		# number of packets resent by send() because they
+		# were found lost by duplicate or selective ACKs 
+		# (fast retransmit), and because their timer expired
+		self.fastRetransmits = 0
+		self.timeoutRetransmits = 0
+		# congestion controller (see CongestionControl)
+		# that limits the packets in flight. None 
+		# sends a full sendWindow at a time
+		self.congestionControl = Reno()
+		# freelist of packets reused by send() (None
+		# allocates a new packet for every segment)
+		self.packetPool = PacketPool()
+		# records every packet sent and received when 
+		# set (see PacketTracer). None disables tracing
+		self.tracer = None
+		# if True, connect() and accept() start a reactor 
+		# thread that owns the UDP socket until close(), so
+		# send() and recv() can run at the same time from 
+		# different threads (see _run)
+		self.fullDuplex = False
+		self._reactor = None
+		# socket the reactor is woken up by
+		self._wake = None
+		# messages queued for the reactor to send, and the
+		# number queued and sent (or given up on) so far
+		self._outbox = deque()
+		self._queued = 0
+		self._sent = 0
+		# tickets (see send) of the messages given up on
+		# after resendLimit resends, until their senders
+		# raise
+		self._failed = set()
+		self._stopping = False
+		# window of the message the reactor sends
+		self._window = None
+		# listening socket (see listen(backlog)): the 
+		# thread that receives for every connection, the 
+		# connections by peer address, the handshakes in
+		# progress by peer address and the connections
+		# not accepted yet (at most self._backlogSize,
+		# counting the handshakes, see _waiting)
+		self._listener = None
+		self._connections = dict()
+		self._handshakes = dict()
+		self._backlog = deque()
+		self._backlogSize = None
+		# timers of the listener thread (SYNACK resends,
+		# idle timeouts and the timers of the fullDuplex 
+		# connections it runs), and the connections it 
+		# runs that have work to do
+		self._timers = None
+		self._ready = set()
+		self._reactors = set()
+		# seconds a connection accepted by a listening
+		# socket may hear nothing from its peer before it
+		# is closed. None => no limit
+		self.idleTimeout = None
+		# if True, a listening socket keeps no state for 
+		# handshakes: the SYNACK sequence number is a 
+		# cookie that the final ACK returns (see _cookie)
+		self.synCookies = False
+		# if True, connect() sends its first message in
+		# the SYN once the server issued a token, and a
+		# listening socket issues tokens and accepts those
+		# messages (fast open, see connect)
+		self.fastOpen = False
+		# key of the SYN cookies and fast open tokens
+		self._secret = None
+		self._cookiePacket = None
+
+	# timeout applies to every wait for a datagram
+	# (socket.timeout is raised when it expires)
 	@property
 	def timeout(self):
-	    return self._socket.gettimeout()
+	    return self._timeout
 	@timeout.setter
 	def timeout(self, value):
-		self._socket.settimeout(value)
+		self._timeout = value
+
+	# round trip time estimates of the connection
+	# (seconds, see RttEstimator). srtt and rttvar 
+	# are None until the first sample
+	@property
+	def srtt(self):
+		return self._rtt.srtt
+	@property
+	def rttvar(self):
+		return self._rtt.rttvar
+	@property
+	def rto(self):
+		return self._rtt.rto
+
+	# length (bytes) of the message being read, announced
+	# by the sender. None if it did not announce one or
+	# nothing of the message arrived yet
+	@property
+	def messageLength(self):
+		lengths = self._lengths
+		return lengths[0] if lengths else None
 
 	def bind(self, srcAddr):
 		"""binds socket to the given port. port is optional.
@@ -77,51 +269,142 @@ class Socket:
 		if self.srcAddr:
 			self._socket.bind(srcAddr)
 		else:
-			raise RxPException("No source address specified")
+			raise RxPException(RxPException.INVALID_ARGUMENT,
+				msg="No source address specified")
 
-	def connect(self, destAddr):
+	def connect(self, destAddr, msg=None):
 		"""connects to destAddr given in format
 		(ipaddr, portNum). Uses a handshake. The
 		sender sends a SYN packet. The receiver
 		sends back a SYN, ACK. The sender then
 		sends an ACK and the handshake is complete.
+		msg, if given, is sent as the first message
+		(see send). With fastOpen and a token from an
+		earlier connection to destAddr, it is sent in 
+		the SYN if it fits in one packet.
 		"""
 
 		if self.srcAddr is None:
-			raise RxPException("Socket not bound")
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not bound")
 
 		# set dest addr
 		self.destAddr = destAddr
+		self._reset()
 
 		# set initial sequence number
 		self.seq.reset(0)
 
-		synack = self._sendSYN()
+		data = None
+		token = None
+		if self.fastOpen:
+			token, mss = Socket._fastOpenTokens.get(destAddr, (0, 0))
+			if msg is not None and token:
+				data = Socket._fastOpenData(msg, self._segmentSize(mss))
+
+		self._sizeRecvBuffer()
+		synack = self._sendSYN(data, token)
+		self._peerWindowFrom(synack)
+
+		if self.fastOpen and synack.options.get("TOKEN"):
+			Socket._fastOpenTokens[destAddr] = (synack.options["TOKEN"],
+				self._segmentSize(synack.options.get("MSS", Packet.DATA_LENGTH)))
+
+		# the SYNACK acknowledges msg (the packet after
+		# the SYN) if the server took it
+		if (data is not None and 
+			WrapableNum.diff(synack.header.ack, self.seq.num) > 0):
+			self.seq.next()
+			msg = None
 
 		# set ack.num
-		ackNum = synack.header.fields["seq"]
+		ackNum = synack.header.seq
 		self.ack.reset(ackNum + 1)
 
-		# send ACK
-		self._sendACK()
+		# use the smaller of the two segment sizes
+		self.mss = self._segmentSize(
+			synack.options.get("MSS", Packet.DATA_LENGTH))
+		if self.probeMSS:
+			self.mss = self._probeMSS()
+
+		# send ACK (with the final segment size)
+		self._firstSeq = self.seq.num
+		self._sendHandshakeACK()
 
 		# update socket state
 		self.isSender = True
 		self.connStatus = ConnectionStatus.IDLE
 
-	def listen(self):
+		if self.fullDuplex:
+			self._startReactor()
+
+		if msg is not None:
+			self.send(msg)
+
+	def canFastOpen(self, destAddr):
+		"""returns True if connect(destAddr, msg) sends msg
+		in the SYN: fastOpen is set and the server at 
+		destAddr issued a token to an earlier connection
+		(msg must still fit in one packet)
+		"""
+		return self.fastOpen and destAddr in Socket._fastOpenTokens
+
+	@staticmethod
+	def _fastOpenData(msg, size):
+		"""returns msg as bytes if it is a non-empty string
+		or bytes-like object that fits in a SYN with size
+		bytes of payload (options included), else None
+		"""
+		if isinstance(msg, str):
+			msg = msg.encode(encoding=Packet.STRING_ENCODING)
+		try:
+			data = memoryview(msg).cast("B")
+		except TypeError:
+			# iterables and files are not sent in the SYN
+			return None
+
+		reserve = len(PacketOptions.pickle({"MSS": 0, "TOKEN": 0, 
+			"SCALE": 0}))
+		if not len(data) or len(data) + reserve > size:
+			return None
+		return bytes(data)
+
+	def listen(self, backlog=None):
 		"""listens on the given port number for 
 		packets. Blocks until a SYN packet is received.
+		If backlog is given, returns at once instead: the
+		socket then accepts any number of connections (see
+		_serve), at most backlog of them waiting for 
+		accept() or still in their handshake.
 		"""
 
 		if self.srcAddr is None:
-			raise RxPException("Socket not bound")
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not bound")
+
+		if backlog is not None:
+			if backlog < 1:
+				raise RxPException(RxPException.INVALID_ARGUMENT,
+					msg="Invalid backlog")
+			self._backlogSize = backlog
+			if self._listener is None:
+				self._secret = os.urandom(16)
+				self._recvScale = Socket._windowScale(self.recvWindow)
+				self._timers = TimerWheel()
+				self._ready.clear()
+				self._reactors.clear()
+				self._openWake()
+				self._stopping = False
+				self._listener = threading.Thread(target=self._serve,
+					name="rxp listener", daemon=True)
+				self._listener.start()
+			return
 
 		waitLimit = self.resendLimit*100
 		while waitLimit:
 			# wait to receive SYN
 			try:
-				data, addr = self.recvfrom(self.recvWindow)
+				data, addr = self.recvfrom()
 				packet = self._packet(data, checkSeq=False)
 			except socket.timeout:
 				waitLimit -= 1
@@ -130,7 +413,7 @@ class Socket:
 				if(e.type == RxPException.INVALID_CHECKSUM):
 					continue
 			else:
-				if packet.checkAttrs(("SYN",), exclusive=True):
+				if packet.checkAttrs(PacketAttributes.SYN, exclusive=True):
 					break
 				else:
 					waitLimit -= 1
@@ -140,11 +423,18 @@ class Socket:
 				RxPException.CONNECTION_TIMEOUT)
 
 		# set ack.num 
-		ackNum = packet.header.fields["seq"]
+		ackNum = packet.header.seq
 		self.ack.reset(ackNum+1)
 
+		# use the smaller of the two segment sizes
+		self.mss = self._segmentSize(
+			packet.options.get("MSS", Packet.DATA_LENGTH))
+
 		# set dest addr
 		self.destAddr = addr
+		self._reset()
+		self._peerWindowFrom(packet)
+		self._sizeRecvBuffer()
 
 		# accept() should be called directly after
 		# listen() in order to complete the handshake
@@ -152,14 +442,29 @@ class Socket:
 	def accept(self):
 		"""accepts an incoming connection. Implements
 		the receiver side of the handshake. returns
-		the sender's address.
+		the sender's address. If the socket listens with
+		a backlog, waits for a connection (see timeout) 
+		and returns it as a new AcceptedSocket.
 		"""
 
 		if self.srcAddr is None:
-			raise RxPException("Socket not bound")
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not bound")
+		if self._backlogSize is not None:
+			with self._cond:
+				if not self._cond.wait_for(lambda: self._backlog or
+					self._listener is None, self._timeout):
+					raise socket.timeout("timed out")
+				if not self._backlog:
+					raise RxPException(RxPException.INVALID_STATE,
+						msg="Socket not listening")
+				conn = self._backlog.popleft()
+			if conn.fullDuplex:
+				conn._startReactor()
+			return conn
 		if self.destAddr is None:
-			raise RxPException(
-				"No connection. Use listen()")
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="No connection. Use listen()")
 
 		# set initial sequence number for
 		# new connection
@@ -171,271 +476,1436 @@ class Socket:
 		self.isSender = False
 		self.connStatus = ConnectionStatus.IDLE
 
+		if self.fullDuplex:
+			self._startReactor()
+
+	def _open(self):
+		"""creates the UDP socket. It is non-blocking, waits
+		(and timeouts) are handled by the selector so that
+		all queued datagrams can be drained at once
+		"""
+		self._socket = socket.socket(
+			socket.AF_INET, socket.SOCK_DGRAM)
+		self._socket.setblocking(False)
+		self._selector = selectors.DefaultSelector()
+		self._selector.register(self._socket, selectors.EVENT_READ)
+		# ring of buffers datagrams are received into
+		self._ring = RecvRing()
+
+	def _reset(self):
+		"""clears the state of the previous connection"""
+		self._ackPacket = None
+		self._reorder.clear()
+		self._received.clear()
+		self._views = 0
+		self._lengths.clear()
+		self._inMessage = False
+		self._rtt.reset(self.timeout)
+		if self.congestionControl is not None:
+			self.congestionControl.reset()
+		self._recvScale = Socket._windowScale(self.recvWindow)
+		self._peerScale = 0
+		self._buffered = 0
+		self._advertised = self._recvSpace()
+		self._peerWindow = None
+
+	@staticmethod
+	def _windowScale(size):
+		"""returns the smallest scale (shift) the recvWindow
+		header field holds a window of size bytes with"""
+		return max(0, size.bit_length() - 16)
+
+	def _segmentSize(self, mss):
+		"""returns the segment size used with a peer that
+		advertised mss: the smaller of the two, at least
+		Packet.MIN_SEGMENT_SIZE and at most 
+		Packet.MAX_DATA_LENGTH"""
+		return max(Packet.MIN_SEGMENT_SIZE, 
+			min(self.mss, mss, Packet.MAX_DATA_LENGTH))
+
+	def _recvSpace(self):
+		"""returns the room left in the receive window 
+		(bytes): recvWindow (at least a segment) less the
+		data received in order that the application has
+		not read
+		"""
+		return max(0, max(self.recvWindow, self.mss) - self._buffered)
+
+	def _windowField(self):
+		"""returns the receive window as advertised in the
+		recvWindow header field, in units of 2**_recvScale
+		bytes"""
+		return min(0xFFFF, self._recvSpace() >> self._recvScale)
+
+	def _peerWindowFrom(self, packet):
+		"""takes the peer's window scale (SCALE option) and
+		receive window from its handshake packet (SYN, 
+		SYNACK or the final ACK)"""
+		self._peerScale = packet.options.get("SCALE", 0)
+		self._peerWindow = packet.header.recvWindow << self._peerScale
+
+	def _sizeRecvBuffer(self):
+		"""grows the kernel's receive buffer of the UDP 
+		socket so it holds a full receive window of 
+		datagrams while the application is not reading"""
+		size = 2 * max(self.recvWindow, self.mss)
+		try:
+			if self._socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) < size:
+				self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+		except OSError:
+			# the system limits the size
+			pass
+
+	def _consumed(self, count):
+		"""the application read count bytes of received 
+		data, which leaves more room in the receive window.
+		If the window advertised last was small, an ACK
+		advertises the new one at once (window update)
+		instead of waiting for the sender's probe.
+		"""
+		self._buffered -= count
+		space = self._recvSpace()
+		# the window grew by a segment, or half of it
+		grown = min(self.mss, max(self.recvWindow, self.mss) // 2)
+		if (space - self._advertised >= grown and 
+			space >= 2 * self._advertised and 
+			self.connStatus == ConnectionStatus.IDLE):
+			self._sendACK()
+
 	def send(self, msg):
-		"""sends a message"""
+		"""sends a message. msg is a string, a bytes-like 
+		object, an iterable of chunks (strings or bytes-like)
+		or a readable file object; it is read as the window
+		opens (see _segments). Selective repeat: up to 
+		sendWindow packets are in flight, each with its
+		own retransmission timer. Only packets whose timer
+		expires are resent, and the window advances as 
+		cumulative ACKs arrive. Raises RxPException 
+		(RESEND_LIM) if the peer stopped answering (see 
+		rto).
+		"""
 
 		if self.srcAddr is None:
-			raise RxPException("Socket not bound")
-		
-		# FIFO queues for data fragments, queue for packets
-		# waiting to be sent, and queue for packets that
-		# have been sent but have not been ACKed
-		dataQ = deque()
-		packetQ = deque()
-		sentQ = deque()
-		lastSeqNum = self.seq.num
-
-		# break up message into chunks (dataQ)
-		for i in range(0, len(msg), Packet.DATA_LENGTH):
-			# extract data from msg
-			if i+Packet.DATA_LENGTH > len(msg):
-				dataQ.append(msg[i:])
-			else:	
-				dataQ.append(
-					msg[i:i+Packet.DATA_LENGTH])
-
-		# construct list of packets (packetQ)
-		for data in dataQ:
-			
-			first = data == dataQ[0]
-			last = data == dataQ[-1]
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not bound")
+
+		if self._reactor is not None:
+			# the reactor sends it, wait until it is sent
+			with self._cond:
+				self._outbox.append(msg)
+				self._queued += 1
+				ticket = self._queued
+				self._wakeReactor()
+				while self._sent < ticket and self._reactor is not None:
+					self._cond.wait()
+				self._checkSent(ticket)
+			return
+
+		window = self._sendWindow(msg)
+
+		while True:
+			if self._sendStep(window, time.monotonic()):
+				if not window.done:
+					raise RxPException(RxPException.RESEND_LIM)
+				break
+
+			# wait for acks until the next timer expires.
+			# Every datagram received by one wakeup is 
+			# handled before sending again
+			try:
+				batch = self.recvBatch(window.deadline())
+			except socket.timeout:
+				continue
+
+			now = time.monotonic()
+			for data, addr in batch:
+				try:
+					packet = self._packet(data, checkSeq=False)
+				except RxPException as e:
+					# invalid checksum
+					continue
+
+				if packet.checkAttrs(
+					PacketAttributes.SYN | PacketAttributes.ACK, 
+					exclusive=True):
+					# resend ACK acknowledging SYNACK
+					self._sendHandshakeACK()
+
+				elif packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+					self._onAck(packet, window)
+
+				else:
+					# the peer answers before the message is
+					# acknowledged (or resent data whose ACK 
+					# was lost). The data is kept for recv()
+					self._onData(packet, now)
+
+			# data are acknowledged at once, no delayed
+			# ACK timer runs while sending: any ACK 
+			# pending is due
+			if self._delayedAck.due(float("inf")):
+				self._sendACK()
+
+			if self.connStatus == ConnectionStatus.NO_CONN:
+				# the peer closed the connection, it
+				# reads no more
+				self._closeSocket()
+				break
+
+	def _checkSent(self, ticket):
+		"""raises RxPException if the message with the
+		given ticket (see send) was given up on (RESEND_LIM),
+		or was not sent before the connection closed 
+		(INVALID_STATE)"""
+		if ticket in self._failed:
+			self._failed.discard(ticket)
+			raise RxPException(RxPException.RESEND_LIM)
+		if self._sent < ticket:
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Connection closed")
+
+	def _giveUp(self):
+		"""the window being sent reached the resend limit:
+		the peer stopped answering. Its message and those
+		queued after it are given up on, their senders 
+		raise (see _checkSent).
+		"""
+		logging.debug("send(): giving up on %d messages", 
+			self._queued - self._sent)
+		self._failed.update(range(self._sent + 1, self._queued + 1))
+		self._outbox.clear()
+		self._window = None
+		self._sent = self._queued
+
+	def _sendWindow(self, msg):
+		"""returns the SendWindow that sends msg"""
+
+		# packets are created as the window opens, so at
+		# most a window of packets exists at a time. Their
+		# timers run on the connection's round trip time, 
+		# and the congestion controller sizes the window
+		window = SendWindow(self._segments(msg), 
+			self.sendWindow, self.packetPool, self._rtt, 
+			self.congestionControl)
+		if self._peerWindow is not None:
+			window.peerWindow = self._peerWindow // max(1, self.mss)
+		window.resendLimit = self.resendLimit
+		# the peer is expected to delay ACKs as long as
+		# this socket does
+		self._rtt.ackDelay = self.ackDelay
+		return window
+
+	def _sendStep(self, window, now):
+		"""sends the packets of window that are due at now:
+		new packets while the window has room, and lost 
+		or expired packets. Returns True once the window 
+		is done (or the resend limit was reached).
+		"""
+
+		# send new packets while the window has room
+		window.size = self.sendWindow
+		for packet in window.fill(now):
+			self.sendto(packet, self.destAddr)
+
+		if window.done:
+			return True
+		if window.probe(now):
+			# the receiver has no room, ask it for
+			# its window
+			self._sendWindowProbe()
+
+		# resend the packets found lost by duplicate or
+		# selective ACKs, then those whose timers expired
+		lost = window.lost(now)
+		expired = window.expired(now)
+		if window.failed(now):
+			logging.debug("send(): resend limit reached")
+			return True
+		self.fastRetransmits += len(lost)
+		self.timeoutRetransmits += len(expired)
+		for packet in lost + expired:
+			logging.debug("send(): resending %d", packet.header.seq)
+			self.sendto(packet, self.destAddr)
+
+		return False
+
+	def _onAck(self, packet, window):
+		"""acknowledges the packets of window covered by
+		an ACK: every packet before its ack number, and
+		those the receiver holds (SACK blocks). The window
+		is limited to the room the ACK advertises. window
+		is None if no message is being sent.
+		"""
+		self._peerWindow = packet.header.recvWindow << self._peerScale
+		if window is None:
+			return
+		window.ack(packet.header.ack, time.monotonic(), 
+			self._peerWindow, bool(len(packet.data)))
+		if "SACK" in packet.options:
+			window.sack(packet.options["SACK"])
+		window.peerWindow = self._peerWindow // max(1, self.mss)
+
+	def _sendWindowProbe(self):
+		"""sends a zero window probe: a NOP with ACKNOW, 
+		which the receiver acknowledges at once with its
+		window"""
+		header = Header(
+			srcPort=self.srcAddr[1],
+			destPort=self.destAddr[1],
+			seq=self.seq.num,
+			ack=self.ack.num,
+			recvWindow=self._windowField(),
+			attrs=PacketAttributes.NOP | PacketAttributes.ACKNOW
+			)
+		self.sendto(Packet(header), self.destAddr)
+
+	def _segments(self, msg):
+		"""generates the packets for msg, one per mss
+		bytes (see _payloads). Packets come from 
+		self.packetPool if it is set. An empty message
+		is a single empty packet. If the length of msg is 
+		known, the first packet carries it (LENGTH option).
+		"""
+
+		pool = self.packetPool
+
+		if isinstance(msg, str):
+			msg = msg.encode(encoding=Packet.STRING_ENCODING)
+
+		# the options count against the segment size. The
+		# length is only a hint, it is left out if the 
+		# segment has no room for data next to it
+		length = Socket._length(msg)
+		options = None
+		reserve = 0
+		if length is not None:
+			options = {"LENGTH": length}
+			reserve = len(PacketOptions.pickle(options))
+			if reserve >= self.mss:
+				options = None
+				reserve = 0
+
+		payloads = self._payloads(msg, reserve)
+
+		# the next payload is read ahead to 
+		# find the last packet
+		payload = next(payloads, b"")
+		first = True
+
+		while payload is not None:
+			following = next(payloads, None)
 	
 			# set attributes
-			attrL = list()
+			attrs = 0
 			if first:
-				attrL.append("NM")
-			if last:
-				attrL.append("EOM")
+				attrs |= PacketAttributes.NM
+			if following is None:
+				attrs |= PacketAttributes.EOM
 
-			# create packets
-			attrs = PacketAttributes.pickle(attrL)
-			header = Header(
+			# create packet
+			fields = dict(
 				srcPort=self.srcAddr[1],
 				destPort=self.destAddr[1],
 				seq=self.seq.num,
 				attrs=attrs
 				)
-			packet = Packet(header, data)
+			if pool is not None:
+				packet = pool.acquire(payload, options, **fields)
+			else:
+				packet = Packet(Header(**fields), payload, options)
 			self.seq.next()
 
-			# add packet to head of queue
-			packetQ.append(packet)
+			yield packet
 
-		resendsRemaining = self.resendLimit
-		while packetQ and resendsRemaining:
-			# send packets (without waiting for ack)
-			# until sendWindow is 0 or all packets
-			# have been sent
-			sendWindow = self.sendWindow
-			while sendWindow and packetQ:
-				# grab a packet from end the list
-				packet = packetQ.popleft()
-
-				# send packet
-				self.sendto(packet, self.destAddr)
-				lastSeqNum = packet.header.fields["seq"]
-
-				# decrement send window, add 
-				# to sentQ
-				sendWindow -= 1
-				sentQ.append(packet)
-
-			# wait for ack
-			try:
-				# wait for ACK or SYNACK (resent)
-				data, addr = self.recvfrom(self.recvWindow)
-				packet = self._packet(data, checkSeq=False, checkAck=lastSeqNum)
+			first = False
+			options = None
+			payload = following
 
-			except socket.timeout:
+	def _payloads(self, msg, reserve=0):
+		"""generates the data of msg in mss byte pieces
+		(the first is reserve bytes shorter, the last may 
+		be shorter). Bytes-like messages are sliced into 
+		views, not copied. Iterables and file objects are 
+		read one piece at a time, so only the pieces in 
+		flight are held in memory.
+		"""
 
-				# reset send window and resend last packet
-				sendWindow = 1
-				resendsRemaining -= 1
-				logging.debug("send() timeout")
-				logging.debug("resends: "  + str(resendsRemaining))
-				
-				# prepend packetQ with sentQ, then
-				# clear sentQ
-				sentQ.reverse()
-				packetQ.extendleft(sentQ)
-				sentQ.clear()
+		# every piece holds at least a byte
+		mss = max(1, self.mss)
+		size = max(1, mss - reserve)
 
-			except RxPException as e:
-				if(e.type == RxPException.INVALID_CHECKSUM):
+		try:
+			view = memoryview(msg).cast("B")
+		except TypeError:
+			pass
+		else:
+			start = 0
+			while start < len(view):
+				yield view[start:start+size]
+				start += size
+				size = mss
+			return
+
+		if hasattr(msg, "read"):
+			msg = Socket._read(msg, mss)
+
+		# chunks are joined into pieces of mss bytes
+		partial = bytearray()
+		for chunk in msg:
+			if isinstance(chunk, str):
+				chunk = chunk.encode(encoding=Packet.STRING_ENCODING)
+			view = memoryview(chunk).cast("B")
+			# bytes can not change, so pieces of them are 
+			# views. Other buffers may be reused by the 
+			# caller once the next chunk is requested
+			mustCopy = not isinstance(chunk, bytes)
+
+			if partial:
+				fill = size - len(partial)
+				partial += view[:fill]
+				view = view[fill:]
+				if len(partial) < size:
 					continue
+				yield bytes(partial)
+				partial = bytearray()
+				size = mss
 
-			else:
-				sendWindow += 1
-				# test is ack mismatch occured
-				if isinstance(packet, int):
-					logging.debug("ACK MISMATCH:")
-					logging.debug("seqnum: " + str(lastSeqNum))
-					logging.debug(packet)
-					logging.debug(sentQ)
-
-					while packet < 0:
-						packetQ.appendleft(sentQ.pop())
-						packet += 1	
-
-				elif packet.checkAttrs(("SYN","ACK"), exclusive=True):
-					# resend ACK acknowledging SYNACK
-					self._sendACK()
-
-					resendsRemaining = self.resendLimit
+			while len(view) >= size:
+				if mustCopy:
+					yield bytes(view[:size])
+				else:
+					yield view[:size]
+				view = view[size:]
+				size = mss
+			partial += view
 
-					# prepend packetQ with sentQ, then
-					# clear sentQ
-					sentQ.reverse()
-					packetQ.extendleft(sentQ)
-					sentQ.clear()
+		if partial:
+			yield bytes(partial)
 
-				elif packet.checkAttrs(("ACK",), exclusive=True):
-					# increase sendWindow back to original
-					# size (no positive flow control), 
-					# remove packet from sentQ
-					self.seq.reset(packet.header.fields["ack"])
+	@staticmethod
+	def _length(msg):
+		"""returns the length of msg (bytes) if it can be 
+		found without reading it: bytes-like objects and 
+		seekable binary files. None otherwise.
+		"""
+		try:
+			return memoryview(msg).nbytes
+		except TypeError:
+			pass
+
+		if isinstance(msg, io.TextIOBase):
+			return None
+		try:
+			if msg.seekable():
+				pos = msg.tell()
+				end = msg.seek(0, io.SEEK_END)
+				msg.seek(pos)
+				return end - pos
+		except (AttributeError, OSError, ValueError):
+			pass
+		return None
 
-					resendsRemaining = self.resendLimit
-					# pop off packet that was just acked
-					# (except for final ack)
-					if sentQ:
-						sentQ.popleft()
+	@staticmethod
+	def _read(file, size):
+		"""generates the chunks read from file, 
+		size bytes (or characters) at a time"""
+		while True:
+			chunk = file.read(size)
+			if not chunk:
+				return
+			yield chunk
 
 
 	def recv(self):
-		"""receives a message"""
+		"""receives a message (the rest of the current 
+		message if recv_into or recvChunks read part of it).
+		Raises RxPException (CONNECTION_TIMEOUT) if nothing 
+		arrives within resendLimit timeouts, like recv_into
+		and recvChunks.
+		"""
+		
+		# the message is reassembled here. Received
+		# datagrams live in the receive ring, so each 
+		# payload is copied out once as it arrives. If 
+		# the sender announced the length, the message 
+		# is allocated once
+		message = bytearray()
+		length = 0
+
+		with self._cond:
+			received = self._received
+			while True:
+				start = length
+				while received and received[0] is not None:
+					data = received.popleft()
+					message[length:length+len(data)] = data
+					length += len(data)
+				self._consumed(length - start)
+
+				if received:
+					# the message ended
+					self._endMessage()
+					break
+				if not self._recvMore():
+					raise RxPException(
+						RxPException.CONNECTION_TIMEOUT)
+				if not length and self.messageLength:
+					message = bytearray(min(self.messageLength,
+						Socket.MAX_PREALLOCATE))
+
+		del message[length:]
+
+		# decode message
+		if(self.acceptStrings):
+			return message.decode(
+				encoding=Packet.STRING_ENCODING)
+		return bytes(message)
+
+	def recv_into(self, buffer, nbytes=0):
+		"""receives data of the current message into buffer
+		(a writable bytes-like object), up to nbytes bytes 
+		(the size of buffer if 0). Blocks until data 
+		arrives in order and returns the number of bytes 
+		written. Returns 0 once the message has been read, 
+		the next call reads the next message.
+		"""
+		view = memoryview(buffer).cast("B")
+		if nbytes:
+			view = view[:nbytes]
+		size = len(view)
+		if not size:
+			return 0
+
+		with self._cond:
+			received = self._received
+			while not received:
+				if not self._recvMore():
+					raise RxPException(
+						RxPException.CONNECTION_TIMEOUT)
+
+			if received[0] is None:
+				self._endMessage()
+				return 0
+
+			written = 0
+			while received and received[0] is not None and written < size:
+				data = received.popleft()
+				count = min(len(data), size - written)
+				view[written:written+count] = data[:count]
+				if count < len(data):
+					received.appendleft(data[count:])
+				written += count
+			self._consumed(written)
+
+		return written
+
+	def recvChunks(self):
+		"""generates the data of the next message (the rest 
+		of the current one if it was partly read) as it 
+		arrives in order, one chunk per run of packets 
+		received. Chunks are strings if acceptStrings is 
+		True, bytes otherwise.
+		"""
+		decoder = None
+		if self.acceptStrings:
+			decoder = codecs.getincrementaldecoder(
+				Packet.STRING_ENCODING)()
+
+		ended = False
+		while not ended:
+			with self._cond:
+				received = self._received
+				while not received:
+					if not self._recvMore():
+						raise RxPException(
+							RxPException.CONNECTION_TIMEOUT)
+
+				pieces = list()
+				while received and received[0] is not None:
+					pieces.append(received.popleft())
+				chunk = b"".join(pieces)
+				self._consumed(len(chunk))
+
+				if received:
+					# the message ended
+					self._endMessage()
+					ended = True
+
+			if decoder is not None:
+				chunk = decoder.decode(chunk, ended)
+			if chunk:
+				yield chunk
+
+	def _endMessage(self):
+		"""removes the end of the message being read"""
+		self._received.popleft()
+		self._lengths.popleft()
+
+	def _recvMore(self):
+		"""waits until data or the end of a message is 
+		delivered in order (see self._received). Returns 
+		False if nothing arrived within resendLimit timeouts.
+		"""
+
+		if self._reactor is not None:
+			# the reactor delivers, wait for it
+			timeout = None
+			if self._timeout is not None:
+				timeout = self._timeout * self.resendLimit
+			self._cond.wait_for(lambda: self._received or 
+				self._reactor is None, timeout)
+			if self._received or self._reactor is not None:
+				return bool(self._received)
+			# the reactor stopped, the socket is read
+			# without it (if it is still connected)
 		
 		if self.srcAddr is None:
-			raise RxPException("Socket not bound")
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not bound")
 
 		if self.connStatus != ConnectionStatus.IDLE:
-			raise RxPException("Connection status not idle")
-		
-		# decode and receive message
-		if(self.acceptStrings):
-			message = ""
-		else:
-			message = bytes()
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Connection status not idle")
+
+		# ACKs are delayed (see DelayedAck)
+		acks = self._delayedAck
+		acks.every = self.ackEvery
+		acks.delay = self.ackDelay
 
 		waitLimit = self.resendLimit
-		while waitLimit:
-			# get packet
+		while waitLimit and not self._received:
+			# get packets
 			try:
-				# listen for data
-				data, addr = self.recvfrom(self.recvWindow)
+				# listen for data, until a delayed 
+				# ACK is due
+				batch = self.recvBatch(acks.deadline)
 			except socket.timeout:
+				if acks.deadline is not None:
+					self._sendACK()
+					continue
 				# if no data is sent, wait again
 				waitLimit -= 1
 				continue
 			
-			# deserialize data into packet
-			try:
-				logging.debug("acknum: " + str(self.ack.num))
-				packet = self._packet(data, checkSeq=False)
-			except RxPException as e:
-				logging.debug(str(e))
-				if e.type == RxPException.INVALID_CHECKSUM:
+			now = time.monotonic()
+			for data, addr in batch:
+				# deserialize data into packet
+				try:
+					packet = self._packet(data, checkSeq=False)
+				except RxPException as e:
+					logging.debug("recv(): %s", e)
+					if e.type == RxPException.INVALID_CHECKSUM:
+						continue
+					if e.type != RxPException.SEQ_MISMATCH:
+						raise e
 					continue
-				if e.type != RxPException.SEQ_MISMATCH:
-					raise e
-			else:
-				# multiplex on packet attributes
-				# if packet.checkAttrs(("SRQ",)):
 
-				# 	# request permission to send data
-				# 	# and break out of loop
-				# 	self._grantSendPermission()
-				
-				# # NM, EOM, or middle of message
-				# else:
+				if packet.checkAttrs(
+					PacketAttributes.SYN | PacketAttributes.ACK, 
+					exclusive=True):
+					# resend ACK acknowledging SYNACK
+					self._sendHandshakeACK()
+					continue
 
-				if packet.header.fields["seq"] < self.ack.num:
-					# an ack was dropped and this packet
-					# was resent. ignore data, but send ack
-					self._sendACK();
-				else:
-					self.ack.next()
-					message += packet.data
-					# send ACK
-					self._sendACK()
+				if packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+					# late ACK for data this socket sent,
+					# or a window update
+					self._onAck(packet, None)
+					continue
 
-				# stop looping if EOM
-				if packet.checkAttrs(("EOM",)):
-					break
+				self._onData(packet, now)
 
-				if packet.checkAttrs(("CLOSE", )):
-					self._sendACK()
-					self._socket.close()
-					break
+			# one ACK covers the whole batch
+			if acks.due(now):
+				self._sendACK()
 
-		# if not waitLimit:
-		# 	raise RxPException(
-		# 		RxPException.CONNECTION_TIMEOUT)
-		return message
+			if self.connStatus == ConnectionStatus.NO_CONN:
+				self._closeSocket()
+
+		return bool(self._received)
+
+	def _onData(self, packet, now):
+		"""handles a received data packet: delivers it (and 
+		the held packets that follow it) if it is the next
+		in order, holds it if it follows a gap. Schedules 
+		the ACK for it (see DelayedAck).
+		"""
+		acks = self._delayedAck
+
+		if packet.checkAttrs(PacketAttributes.NOP):
+			# a late segment size probe carries no data. A
+			# zero window probe (ACKNOW) asks for the window
+			if packet.checkAttrs(PacketAttributes.ACKNOW):
+				acks.urgent()
+			return
+
+		diff = WrapableNum.diff(packet.header.seq, self.ack.num)
+		space = self._recvSpace()
+		if diff < 0:
+			# an ack was dropped and this packet
+			# was resent. ignore data, but send ack
+			acks.urgent()
+			return
+		elif diff > 0:
+			# a packet before this one is missing.
+			# Hold it until the gap is filled, the
+			# ACK tells the sender what is held
+			self._reorder.size = space
+			self._reorder.add(packet)
+			acks.urgent()
+			return
+		elif len(packet.data) > space:
+			# no room in the receive window (the sender
+			# probes it). The packet is dropped, the ACK
+			# tells the sender the window
+			acks.urgent()
+			return
+
+		# deliver the packet and the held 
+		# packets that follow it
+		held = len(self._reorder)
+		ended = self._deliver(packet)
+		ended = self._deliverHeld() or ended
+
+		acks.add(now)
+		if (ended or len(self._reorder) < held or 
+			packet.checkAttrs(PacketAttributes.ACKNOW)):
+			# a message ended, a gap was filled
+			# or the sender waits for this ACK
+			acks.urgent()
+
+	def _deliver(self, packet):
+		"""appends the data of packet, the next packet in
+		order, to self._received. Returns True if the 
+		packet ends a message (EOM or CLOSE).
+		"""
+		self.ack.next()
+		if not self._inMessage:
+			# the first packet (NM) carries the length
+			self._lengths.append(packet.options.get("LENGTH"))
+			self._inMessage = True
+		if packet.data:
+			self._received.append(packet.data)
+			self._views += 1
+			self._buffered += len(packet.data)
+
+		ended = packet.checkAttrs(PacketAttributes.EOM)
+		if packet.checkAttrs(PacketAttributes.CLOSE):
+			# the socket is closed once the 
+			# CLOSE is acknowledged
+			self.connStatus = ConnectionStatus.NO_CONN
+			ended = True
+
+		if ended:
+			self._received.append(None)
+			self._views += 1
+			self._inMessage = False
+		return ended
+
+	def _deliverHeld(self):
+		"""delivers held packets while the next packet in
+		order is held. Returns True if one ends a message.
+		"""
+		ended = False
+		while True:
+			packet = self._reorder.pop(self.ack.num)
+			if packet is None:
+				return ended
+			ended = self._deliver(packet) or ended
 
 	def sendto(self, packet, addr):
-		name = "sender" if self.isSender else "receiver"
-		logging.debug(name + ": sendto: " + str(packet))
-		logging.debug("")
-		self._socket.sendto(packet.pickle(), addr)
+		if self.tracer is not None:
+			self.tracer.record(PacketTracer.SEND, packet.header)
 
-	def recvfrom(self, recvWindow, expectedAttrs=None):
 		while True:
 			try:
-				data, addr = self._socket.recvfrom(self.recvWindow)
-				break
-			except socket.error as e:
-				if e.errno == 35:
-					continue
+				if Socket._hasSendmsg:
+					# header, options and data are handed to the
+					# kernel as separate buffers (no concatenation)
+					self._socket.sendmsg(packet.buffers(), (), 0, addr)
 				else:
-					raise e
+					self._socket.sendto(packet.pickle(), addr)
+				break
+			except BlockingIOError:
+				# send buffer full, wait for room
+				select.select((), (self._socket,), ())
+
+	def recvBatch(self, deadline=None):
+		"""waits for datagrams (see timeout, or until 
+		deadline, a time.monotonic() value, if given) and
+		returns all of those received by one wakeup as a
+		list of (data, addr). data is a memoryview into 
+		the receive ring, valid until the next call.
+		"""
+		if self._pending:
+			batch = list(self._pending)
+			self._pending.clear()
+			return batch
+
+		# data not read yet is copied out of the
+		# receive ring before it is reused
+		received = self._received
+		for i in range(max(0, len(received) - self._views), len(received)):
+			data = received[i]
+			if isinstance(data, memoryview):
+				received[i] = bytes(data)
+		self._views = 0
+
+		timeout = self._timeout
+		if deadline is not None:
+			timeout = max(0, deadline - time.monotonic())
+
+		batch = self._ring.recv(self._socket, self._selector, 
+			timeout)
+
+		if self.tracer is not None:
+			for data, addr in batch:
+				if len(data) >= Header.LENGTH:
+					self.tracer.record(PacketTracer.RECV, 
+						Header.unpack_from(data))
+		return batch
+
+	def recvfrom(self, bufsize=None, expectedAttrs=None, deadline=None):
+		"""returns the next received datagram as (data, addr).
+		bufsize is ignored (datagrams are received into
+		the receive ring). See recvBatch for deadline.
+		"""
+		if not self._pending:
+			self._pending.extend(self.recvBatch(deadline))
+		return self._pending.popleft()
 
-		name = "sender" if self.isSender else "receiver"
-		logging.debug(name + ": recvfrom: " + str(Packet.unpickle(data)))
-		logging.debug("")
-		return (data, addr)
+	def _closeSocket(self):
+		self._selector.close()
+		self._socket.close()
 
 	def close(self):
+		if self._backlogSize is not None:
+			# listening socket. Its connections receive
+			# through it, they stop receiving too
+			self._stopListener()
+			self._closeSocket()
+			self.connStatus = ConnectionStatus.NO_CONN
+			return
+
+		if self._reactor is not None:
+			# the queued messages are sent first
+			with self._cond:
+				while self._sent < self._queued and self._reactor is not None:
+					self._cond.wait()
+			self._stopReactor()
+
+		if self.connStatus == ConnectionStatus.NO_CONN:
+			# not connected, or the peer closed
+			# the connection
+			self._closeSocket()
+			return
+
 		# create packets
-		attrs = PacketAttributes.pickle(("CLOSE",))
+		attrs = PacketAttributes.CLOSE
 		header = Header(
 			srcPort=self.srcAddr[1],
 			destPort=self.destAddr[1],
 			seq=self.seq.num,
 			attrs=attrs
 			)
-		packet = Packet(header)
+		closePacket = Packet(header)
 		self.seq.next()
 
-		waitLimit = self.resendLimit
-		while waitLimit:
+		# rto may have backed off already (the peer stopped 
+		# answering data), so the time is limited as well
+		giveUp = time.monotonic() + self._rtt.budget(self.resendLimit)
+		waitLimit = self._rtt.resends(self.resendLimit)
+		while waitLimit and time.monotonic() < giveUp:
 			
-			self.sendto(packet, self.destAddr)
+			self.sendto(closePacket, self.destAddr)
 
 			try:
-				data, addr = self.recvfrom(self.recvWindow)
+				data, addr = self.recvfrom(deadline=min(giveUp, 
+					time.monotonic() + self._rtt.rto))
 				packet = self._packet(data, checkSeq=False)
 
 			except socket.timeout:
 				waitLimit -= 1
+				self._rtt.backoff()
 				continue
 
 			except RxPException as e:
 				if(e.type == RxPException.INVALID_CHECKSUM):
 					continue
 			else:
-				if packet.checkAttrs(("ACK",), exclusive=True):
-					self._socket.close()
+				if packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+					self._closeSocket()
+					break
+				elif packet.checkAttrs(PacketAttributes.SYN, exclusive=True):
+					# the peer closed and connects again
+					self._closeSocket()
+					break
+				elif (not packet.checkAttrs(PacketAttributes.ACK) and
+					WrapableNum.diff(packet.header.seq, self.ack.num) < 0):
+					# the ACK of data already received was
+					# dropped and the peer waits for it
+					self._sendACK()
+				elif packet.checkAttrs(PacketAttributes.CLOSE):
+					# the peer closes at the same time,
+					# its CLOSE is acknowledged
+					self._closeAck(packet)
+					self._closeSocket()
 					break
 				else:
 					waitLimit -= 1
 
+	def _closeAck(self, packet):
+		"""acknowledges the CLOSE of a peer that closes
+		while this socket closes. The peer no longer 
+		reads, the CLOSE of this socket needs no ACK.
+		"""
+		if WrapableNum.diff(packet.header.seq, self.ack.num) == 0:
+			self.ack.next()
+		self._sendACK()
+		self.connStatus = ConnectionStatus.NO_CONN
+
+	def _openWake(self):
+		"""creates the socket the reactor (or the
+		listener) is woken up by"""
+		self._wake = socket.socket(
+			socket.AF_INET, socket.SOCK_DGRAM)
+		self._wake.bind(("127.0.0.1", 0))
+		self._wake.setblocking(False)
+
+	def _startReactor(self):
+		"""starts the reactor thread (see _run)"""
+		self._openWake()
+		self._outbox.clear()
+		self._queued = 0
+		self._sent = 0
+		self._failed.clear()
+		self._window = None
+		self._stopping = False
+		self._reactor = threading.Thread(target=self._run,
+			name="rxp reactor", daemon=True)
+		self._reactor.start()
+
+	def _stopReactor(self):
+		"""stops the reactor thread and waits for it. 
+		The socket can be used without it afterwards.
+		"""
+		with self._cond:
+			reactor = self._reactor
+			if reactor is None:
+				return
+			self._stopping = True
+			self._wakeReactor()
+		reactor.join()
+
+	def _wakeReactor(self):
+		"""wakes the reactor up (a datagram to 
+		its wake socket)"""
+		try:
+			self._wake.sendto(b"\0", self._wake.getsockname())
+		except BlockingIOError:
+			# wakeups are already queued
+			pass
+
+	def _run(self):
+		"""reactor loop, runs on its own thread while the
+		socket is fullDuplex. It owns the UDP socket and 
+		runs a step of the reactor (see _react) whenever
+		datagrams arrive, send() queues a message or a 
+		timer expires. It only changes the connection 
+		state with self._cond held.
+		"""
+		selector = selectors.DefaultSelector()
+		selector.register(self._socket, selectors.EVENT_READ)
+		selector.register(self._wake, selectors.EVENT_READ)
+		batch = ()
+
+		try:
+			while True:
+				with self._cond:
+					now = time.monotonic()
+					deadline = self._react(batch, now)
+					if self._stopping:
+						if self._delayedAck.deadline is not None:
+							self._sendACK()
+						break
+					if self.connStatus == ConnectionStatus.NO_CONN:
+						# the peer closed the connection
+						self._closeSocket()
+						break
+
+					# wait until the next timer expires
+					timeout = None
+					if self._pending:
+						timeout = 0
+					elif deadline is not None:
+						timeout = max(0, deadline - now)
+
+				for key, events in selector.select(timeout):
+					if key.fileobj is self._wake:
+						try:
+							while True:
+								self._wake.recv(1)
+						except (BlockingIOError, InterruptedError):
+							pass
+
+				with self._cond:
+					try:
+						batch = self.recvBatch(time.monotonic())
+					except socket.timeout:
+						batch = ()
+		finally:
+			selector.close()
+			self._wake.close()
+			with self._cond:
+				self._reactor = None
+				self._cond.notify_all()
+
+	def _react(self, batch, now):
+		"""a step of the reactor, with self._cond held: 
+		hands the ACKs of batch (datagrams received) to the
+		window being sent and the data to the readers 
+		(self._received), sends the ACK that is due, then 
+		the queued messages (send()) and the packets whose
+		timers expired. Returns the time.monotonic() value 
+		of its next timer (None if none runs).
+		"""
+		acks = self._delayedAck
+		acks.every = self.ackEvery
+		acks.delay = self.ackDelay
+
+		for data, addr in batch:
+			try:
+				packet = self._packet(data, checkSeq=False)
+			except RxPException as e:
+				logging.debug("_react(): %s", e)
+				continue
+
+			if packet.checkAttrs(
+				PacketAttributes.SYN | PacketAttributes.ACK, 
+				exclusive=True):
+				# resend ACK acknowledging SYNACK
+				self._sendHandshakeACK()
+			elif packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+				self._onAck(packet, self._window)
+			else:
+				self._onData(packet, now)
+
+		# one ACK covers the whole batch
+		if acks.due(now):
+			self._sendACK()
+		if batch:
+			self._cond.notify_all()
+		if self.connStatus == ConnectionStatus.NO_CONN:
+			return None
+
+		# send the queued messages
+		while True:
+			if self._window is None and self._outbox:
+				self._window = self._sendWindow(self._outbox.popleft())
+			if self._window is None or not self._sendStep(self._window, now):
+				break
+			if self._window.done:
+				self._window = None
+				self._sent += 1
+			else:
+				self._giveUp()
+			self._cond.notify_all()
+
+		deadline = acks.deadline
+		if self._window is not None:
+			expires = self._window.deadline()
+			if deadline is None or (expires is not None and 
+				expires < deadline):
+				deadline = expires
+		return deadline
+
+	def _stopListener(self):
+		"""stops the listener thread and waits for it"""
+		with self._cond:
+			listener = self._listener
+			if listener is None:
+				return
+			self._stopping = True
+			self._wakeReactor()
+		listener.join()
+
+	def _serve(self):
+		"""listener loop, runs on its own thread while the
+		socket listens with a backlog. It owns the receive
+		side of the UDP socket and demultiplexes datagrams
+		by peer address (see _demux). The timers of every
+		connection on the port run on its TimerWheel: 
+		SYNACK resends (see _handshakeExpired), idle 
+		timeouts (see _idleExpired) and the retransmission
+		and delayed ACK timers of the fullDuplex 
+		connections, whose reactor it runs instead of a 
+		thread each (see AcceptedSocket._step).
+		"""
+		selector = selectors.DefaultSelector()
+		selector.register(self._socket, selectors.EVENT_READ)
+		selector.register(self._wake, selectors.EVENT_READ)
+		timers = self._timers
+
+		try:
+			while True:
+				with self._cond:
+					if self._stopping:
+						break
+					timers.advance(time.monotonic())
+					ready = list(self._ready)
+					self._ready.clear()
+
+				# a connection takes its own lock, never
+				# with the listener's held
+				for conn in ready:
+					try:
+						conn._step(time.monotonic())
+					except Exception:
+						logging.exception("_serve(): %s", conn.destAddr)
+
+				with self._cond:
+					# wait until the next timer expires
+					timeout = None
+					if self._ready:
+						timeout = 0
+					else:
+						deadline = timers.nextDeadline()
+						if deadline is not None:
+							timeout = max(0, deadline - time.monotonic())
+
+				for key, events in selector.select(timeout):
+					if key.fileobj is self._wake:
+						try:
+							while True:
+								self._wake.recv(1)
+						except (BlockingIOError, InterruptedError):
+							pass
+
+				with self._cond:
+					try:
+						batch = self.recvBatch(time.monotonic())
+					except socket.timeout:
+						batch = ()
+
+					# a datagram that breaks the demux is
+					# dropped, the other connections go on
+					now = time.monotonic()
+					for data, addr in batch:
+						try:
+							self._demux(data, addr, now)
+						except Exception:
+							logging.exception("_serve(): datagram from %s", addr)
+		finally:
+			selector.close()
+			self._wake.close()
+			with self._cond:
+				self._listener = None
+				conns = (set(self._connections.values()) |
+					set(self._handshakes.values()) |
+					set(self._backlog) | self._reactors)
+				self._connections.clear()
+				self._handshakes.clear()
+				self._backlog.clear()
+				self._reactors.clear()
+				self._cond.notify_all()
+			# its connections receive nothing more, they
+			# stop (see AcceptedSocket._detach)
+			for conn in conns:
+				conn._detach()
+
+	def _handshakeExpired(self, conn):
+		"""the SYNACK timer of conn expired: the SYNACK is
+		resent, or the handshake given up on after 
+		resendLimit resends
+		"""
+		if conn._offerExpired(time.monotonic()):
+			return
+		logging.debug("_handshakeExpired(): %s timed out", conn.destAddr)
+		if self._handshakes.get(conn.destAddr) is conn:
+			del self._handshakes[conn.destAddr]
+		# a fast open connection was accepted already
+		conn.connStatus = ConnectionStatus.NO_CONN
+		if conn in self._reactors:
+			self._ready.add(conn)
+
+	def _idleExpired(self, conn):
+		"""the idle timer of conn expired. It is armed again
+		if the peer was heard from since, else conn is 
+		closed as if its peer closed it: it is no longer 
+		routed, and a CLOSE is queued to it.
+		"""
+		addr = conn.destAddr
+		if (self._connections.get(addr) is not conn or 
+			self.idleTimeout is None):
+			return
+		deadline = conn._heardAt + self.idleTimeout
+		if deadline > time.monotonic():
+			conn._idleTimer = self._timers.schedule(
+				deadline, self._idleExpired, conn)
+			return
+
+		logging.debug("_idleExpired(): %s", addr)
+		del self._connections[addr]
+		header = Header(
+			srcPort=addr[1],
+			destPort=self.srcAddr[1],
+			seq=conn.ack.num,
+			attrs=PacketAttributes.CLOSE
+			)
+		conn._queue(bytes(Packet(header).pickle()), addr)
+
+	def _demux(self, data, addr, now):
+		"""routes a datagram received by the listener. 
+		Datagrams of an established connection are queued
+		to its socket. A SYN from a new peer starts a
+		handshake if the backlog has room, and the final 
+		ACK (or the first data, if it was lost) of a 
+		handshake queues the connection for accept(). With
+		synCookies, a SYN only gets a SYNACK back and the
+		connection is created by an ACK returning a valid
+		cookie. A CLOSE from a peer without a connection
+		is acknowledged again, and a SYN from a peer whose
+		connection it closed replaces the connection.
+		"""
+		conn = self._connections.get(addr)
+		if conn is not None and conn.connStatus == ConnectionStatus.NO_CONN:
+			# the peer closed the connection. If it reuses
+			# its address before the socket was closed, a
+			# SYN starts a new connection
+			try:
+				packet = self._packet(data, checkSeq=False)
+			except RxPException:
+				packet = None
+			if (packet is not None and 
+				packet.checkAttrs(PacketAttributes.SYN, exclusive=True)):
+				del self._connections[addr]
+				conn = None
+		if conn is not None:
+			# the queued datagram outlives the receive
+			# ring, it is copied
+			conn._heardAt = now
+			conn._queue(bytes(data), addr)
+			return
+
+		try:
+			packet = self._packet(data, checkSeq=False)
+		except RxPException as e:
+			logging.debug("_demux(): %s", e)
+			return
+
+		conn = self._handshakes.get(addr)
+		if conn is None and packet.checkAttrs(PacketAttributes.SYN, exclusive=True):
+			self._onSYN(packet, addr, now)
+			return
+
+		if conn is None and self.synCookies:
+			if packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+				conn = self._cookieConnection(packet, addr)
+				if conn is None:
+					return
+			elif packet.checkAttrs(PacketAttributes.NOP) and "PROBE" in packet.options:
+				# segment size probe, echo it
+				self._echoProbe(packet, addr)
+				return
+			elif not (packet.checkAttrs(PacketAttributes.ACK) or
+				packet.checkAttrs(PacketAttributes.CLOSE)):
+				# the final ACK was lost and the peer sends
+				# data. A SYNACK makes it resend the ACK
+				self._sendCookie(addr, packet.header.seq - 1)
+				return
+
+		if conn is None:
+			if packet.checkAttrs(PacketAttributes.CLOSE):
+				# the connection is closed already and the
+				# ACK of the CLOSE was dropped, resend it
+				header = Header(
+					srcPort=self.srcAddr[1],
+					destPort=addr[1],
+					ack=(packet.header.seq + 1) % Packet.MAX_SEQ_NUM,
+					recvWindow=self._windowField(),
+					attrs=PacketAttributes.ACK
+					)
+				self.sendto(Packet(header), addr)
+			return
+
+		# a fast open connection was accepted with its
+		# SYN, it may send before the handshake completes
+		early = conn.connStatus == ConnectionStatus.IDLE
+
+		if packet.checkAttrs(PacketAttributes.SYN, exclusive=True):
+			# SYN was resent, resend SYNACK
+			conn._offer(now)
+		elif packet.checkAttrs(PacketAttributes.NOP) and "PROBE" in packet.options:
+			# segment size probe, echo it
+			conn._echoProbe(packet)
+		elif packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+			conn._established(packet, now)
+			if early:
+				# it may acknowledge data as well
+				conn._queue(bytes(data), addr)
+		elif not packet.checkAttrs(PacketAttributes.ACK):
+			# the final ACK was lost, but the sender
+			# only sends data once it has the SYNACK
+			conn._established(None, now)
+			conn._queue(bytes(data), addr)
+		else:
+			return
+
+		if conn._synacked:
+			self._handshakes.pop(addr, None)
+			self._connections[addr] = conn
+			conn._heardAt = now
+			if self.idleTimeout is not None:
+				conn._idleTimer = self._timers.schedule(
+					now + self.idleTimeout, self._idleExpired, conn)
+			if not early:
+				self._backlog.append(conn)
+				self._cond.notify_all()
+
+	def _onSYN(self, syn, addr, now):
+		"""answers a SYN from a peer without a connection.
+		A token is issued if the SYN asks for one. A SYN 
+		carrying a message and a valid token (fast open)
+		proves the peer's address like a cookie does: its 
+		connection is queued for accept() at once, with 
+		the message, and its SYNACK acknowledges the message.
+		"""
+		seq = syn.header.seq
+		mss = syn.options.get("MSS", Packet.DATA_LENGTH)
+
+		token = None
+		if self.fastOpen and "TOKEN" in syn.options:
+			token = self._fastOpenToken(addr)
+		fast = bool(token is not None and len(syn.data) and 
+			syn.options["TOKEN"] == token)
+
+		if self.synCookies and not fast:
+			# no state is kept until the ACK
+			# returns the cookie
+			self._sendCookie(addr, seq, token)
+			return
+
+		if self._waiting() >= self._backlogSize:
+			# the SYN is dropped, the peer resends it
+			return
+
+		conn = self._acceptedSocket(addr, seq, mss, token=token,
+			data=syn.data if fast else None)
+		conn._peerWindowFrom(syn)
+		self._handshakes[addr] = conn
+		conn._offer(now)
+		if fast:
+			self._backlog.append(conn)
+			self._cond.notify_all()
+
+	def _waiting(self):
+		"""returns the number of connections in their 
+		handshake or not accepted yet. A fast open 
+		connection is queued for accept() during its 
+		handshake, it counts once
+		"""
+		handshakes = self._handshakes
+		return len(handshakes) + sum(map(lambda conn: 
+			handshakes.get(conn.destAddr) is not conn, self._backlog))
+
+	def _fastOpenToken(self, addr):
+		"""returns the fast open token of the peer at addr
+		(of its IP address)"""
+		msg = "token:{0}".format(addr[0]).encode()
+		digest = hmac.new(self._secret, msg, hashlib.sha256).digest()
+		return int.from_bytes(digest[:8], "big") or 1
+
+	def _cookie(self, addr, seq, period):
+		"""returns the SYN cookie of a handshake with the 
+		peer at addr whose SYN had sequence number seq, 
+		issued in the given COOKIE_PERIOD
+		"""
+		msg = "{0}:{1}:{2}:{3}".format(addr[0], addr[1], 
+			seq % Packet.MAX_SEQ_NUM, period).encode()
+		digest = hmac.new(self._secret, msg, hashlib.sha256).digest()
+		return int.from_bytes(digest[:4], "big") % Packet.MAX_SEQ_NUM
+
+	def _sendCookie(self, addr, seq, token=None):
+		"""sends the SYNACK answering a SYN with sequence
+		number seq from addr. Its sequence number is the
+		cookie; one packet is reused for every SYNACK
+		that carries no fast open token.
+		"""
+		period = int(time.monotonic() // Socket.COOKIE_PERIOD)
+		cookie = self._cookie(addr, seq, period)
+		ackNum = (seq + 1) % Packet.MAX_SEQ_NUM
+
+		packet = self._cookiePacket
+		if token is not None:
+			attrs = PacketAttributes.SYN | PacketAttributes.ACK
+			header = Header(
+				srcPort=self.srcAddr[1],
+				destPort=addr[1],
+				seq=cookie,
+				ack=ackNum,
+				recvWindow=self._windowField(),
+				attrs=attrs
+				)
+			packet = Packet(header, options={"MSS": self.mss, 
+				"SCALE": self._recvScale, "TOKEN": token})
+		elif packet is None:
+			attrs = PacketAttributes.SYN | PacketAttributes.ACK
+			header = Header(
+				srcPort=self.srcAddr[1],
+				destPort=addr[1],
+				seq=cookie,
+				ack=ackNum,
+				recvWindow=self._windowField(),
+				attrs=attrs
+				)
+			packet = self._cookiePacket = Packet(header, 
+				options={"MSS": self.mss, "SCALE": self._recvScale})
+		else:
+			packet.update(
+				destPort=addr[1],
+				seq=cookie,
+				ack=ackNum,
+				recvWindow=self._windowField())
+		self.sendto(packet, addr)
+
+	def _cookieConnection(self, ack, addr):
+		"""returns the connection the ACK from addr 
+		completes if it returns a valid cookie, None 
+		otherwise (or if the backlog is full)
+		"""
+		# the ACK carries the first sequence number of the
+		# peer's data, the SYN had the one before it
+		seq = ack.header.seq - 1
+		period = int(time.monotonic() // Socket.COOKIE_PERIOD)
+		for issued in (period, period - 1):
+			cookie = self._cookie(addr, seq, issued)
+			if ack.header.ack == (cookie + 1) % Packet.MAX_SEQ_NUM:
+				break
+		else:
+			logging.debug("_cookieConnection(): invalid cookie from %s", addr)
+			return None
+
+		if self._waiting() >= self._backlogSize:
+			# the peer resends the ACK when its data
+			# gets a SYNACK back
+			return None
+
+		return self._acceptedSocket(addr, seq, 
+			ack.options.get("MSS", Packet.DATA_LENGTH), cookie)
+
+	def _acceptedSocket(self, addr, peerSeq, mss, seq=0, 
+		token=None, data=None):
+		"""returns the connection of a handshake with the
+		peer at addr (see AcceptedSocket)"""
+		return AcceptedSocket(self, addr, peerSeq, mss, seq, 
+			token=token, data=data)
+
 	def _packet(self, data, addr=None, checkSeq=True, checkAck=False):
 		""" reconstructs a packet from data and verifies
 		checksum and address (if addr is not None).
 		"""
 
-		packet = Packet.unpickle(data, toString=self.acceptStrings)
+		packet = Packet.unpickle(data)
 
 		# verify checksum
 		if not packet.verify():
@@ -444,12 +1914,10 @@ class Socket:
 		# verify seqnum
 		if checkSeq:
 			
-			attrs = PacketAttributes.unpickle(
-				packet.header.fields["attrs"])
-			isSYN = packet.checkAttrs(("SYN",), exclusive=True)
-			isACK = packet.checkAttrs(("ACK",), exclusive=True)
+			isSYN = packet.checkAttrs(PacketAttributes.SYN, exclusive=True)
+			isACK = packet.checkAttrs(PacketAttributes.ACK, exclusive=True)
 			
-			packetSeqNum = packet.header.fields["seq"]
+			packetSeqNum = packet.header.seq
 			socketAckNum = self.ack.num
 			
 			if (not isSYN and packetSeqNum and 
@@ -463,15 +1931,12 @@ class Socket:
 		# expected ack num
 		if checkAck:
 
-			attrs = PacketAttributes.unpickle(
-				packet.header.fields["attrs"])
-			
-			packetAckNum = packet.header.fields["ack"]
+			packetAckNum = packet.header.ack
 
 			ackMismatch = (int(packetAckNum) - checkAck - 1)
 
 			if packetAckNum and ackMismatch:
-				logging.debug("acknum: " + str(packetAckNum))
+				logging.debug("acknum: %d", packetAckNum)
 				return ackMismatch
 
 		return packet
@@ -482,12 +1947,12 @@ class Socket:
 		"""
 
 		# send SRQ
-		attrs = PacketAttributes.pickle(("SRQ",))
+		attrs = PacketAttributes.SRQ
 		header = Header(
 			srcPort=self.srcAddr[1],
 			destPort=self.destAddr[1],
 			seq=self.seq.num,
-			recvWindow=self.recvWindow,
+			recvWindow=self._windowField(),
 			attrs=attrs
 			)
 		packet = Packet(header)
@@ -505,13 +1970,15 @@ class Socket:
 			# wait to receive SYN, ACK. Only break out of loop
 			# when SYN, ACK is received (or resendLimit exceeded)
 			try:
-				data, addr = self.recvfrom(self.recvWindow)
+				data, addr = self.recvfrom()
 			except socket.timeout:
 				logging.debug("_requestSendPermission timeout")
 				resendsRemaining -= 1
 			else:
 				packet = self._packet(data=data, addr=addr, checkSeq=False)
-				if packet.checkAttrs(("SRQ","ACK"), exclusive=True):
+				if packet.checkAttrs(
+					PacketAttributes.SRQ | PacketAttributes.ACK, 
+					exclusive=True):
 					self._sendACK()
 					break
 
@@ -520,12 +1987,12 @@ class Socket:
 	def _grantSendPermission(self):
 		""" grant send permission by sending SRQ, ACK"""
 
-		attrs = PacketAttributes.pickle(("SRQ","ACK"))
+		attrs = PacketAttributes.SRQ | PacketAttributes.ACK
 		header = Header(
 			srcPort=self.srcAddr[1],
 			destPort=self.destAddr[1],
 			seq=self.seq.num,
-			recvWindow=self.recvWindow,
+			recvWindow=self._windowField(),
 			attrs=attrs
 			)
 		packet = Packet(header)
@@ -539,13 +2006,13 @@ class Socket:
 
 			# wait to receive ACK
 			try:
-				data, addr = self.recvfrom(self.recvWindow)
+				data, addr = self.recvfrom()
 			except socket.timeout:
 				logging.debug("_grantSendPermission timeout")
 				resendsRemaining -= 1
 			else:
 				packet = self._packet(data=data, checkSeq=False)
-				if packet.checkAttrs(("ACK",), exclusive=True):
+				if packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
 					break
 
 		self.isSender = False
@@ -555,45 +2022,62 @@ class Socket:
 		# wait for a packet with attributes
 		# matching attr
 		while True:
-			data, addr = self.recvfrom(self.recvWindow)
+			data, addr = self.recvfrom()
 			packet = self._packet(data)
 
 			if packet.checkAttrs(attr):
 				return packet
 
-	def _sendSYN(self):
+	def _sendSYN(self, data=None, token=None):
 
 		# create SYN packet with sequence number
-		attrs = PacketAttributes.pickle(("SYN",))
+		# and segment size. With fastOpen it carries
+		# the token (0 asks for one) and data, the
+		# first message
+		options = {"MSS": self.mss, "SCALE": self._recvScale}
+		if self.fastOpen:
+			options["TOKEN"] = token or 0
+		attrs = PacketAttributes.SYN
 		header = Header(
 			srcPort=self.srcAddr[1],
 			destPort=self.destAddr[1],
 			seq=self.seq.num,
-			recvWindow=self.recvWindow,
+			recvWindow=self._windowField(),
 			attrs=attrs
 			)
-		packet = Packet(header)
+		syn = Packet(header, data or b"", options=options)
 		self.seq.next()
 
-		resendsRemaining = self.resendLimit
+		sent = 0
+		resendsRemaining = self._rtt.resends(self.resendLimit)
 		while resendsRemaining:
 
 			# send SYN
-			self.sendto(packet, self.destAddr)
+			self.sendto(syn, self.destAddr)
+			sent += 1
+			sentAt = time.monotonic()
 
 			# wait to receive SYN, ACK. Only break out of loop
 			# when SYN, ACK is received (or resendLimit exceeded)
 			try:
-				data, addr = self.recvfrom(self.recvWindow)
+				data, addr = self.recvfrom(
+					deadline=sentAt + self._rtt.rto)
 				packet = self._packet(data=data, addr=addr, checkSeq=False)
 			except socket.timeout:
 				logging.debug("_SendSYN() timeout")
 				resendsRemaining -= 1
+				self._rtt.backoff()
 			except RxPException as e:
 				if(e.type == RxPException.INVALID_CHECKSUM):
 					continue
 			else:
-				if packet.checkAttrs(("SYN", "ACK"), exclusive=True):
+				if packet.checkAttrs(
+					PacketAttributes.SYN | PacketAttributes.ACK, 
+					exclusive=True):
+					# the first round trip time sample, 
+					# unless the SYN was resent
+					if sent == 1:
+						self._rtt.sample(time.monotonic() - sentAt)
 					break
 
 		if not resendsRemaining:
@@ -604,166 +2088,1528 @@ class Socket:
 	def _sendSYNACK(self):
 
 		# send SYN, ACK with sequence number
-		attrs = PacketAttributes.pickle(("SYN","ACK"))
+		# and segment size
+		attrs = PacketAttributes.SYN | PacketAttributes.ACK
 		header = Header(
 			srcPort=self.srcAddr[1],
 			destPort=self.destAddr[1],
 			seq=self.seq.num,
 			ack=self.ack.num,
-			recvWindow=self.recvWindow,
+			recvWindow=self._windowField(),
 			attrs=attrs
 			)
-		synack = Packet(header)
+		synack = Packet(header, options={"MSS": self.mss, 
+			"SCALE": self._recvScale})
 		self.seq.next()
 
-		resendsRemaining = self.resendLimit
-		while resendsRemaining:
+		# send SYNACK
+		self.sendto(synack, self.destAddr)
+		sent = 1
+		sentAt = time.monotonic()
 
-			# send SYNACK
-			self.sendto(synack, self.destAddr)
+		resendsRemaining = self._rtt.resends(self.resendLimit)
+		while resendsRemaining:
 
 			# wait to receive ACK. Only break out of loop
 			# when ACK is received (or resendLimit exceeded)
 			try:
-				data, addr = self.recvfrom(self.recvWindow)
+				data, addr = self.recvfrom(
+					deadline=sentAt + self._rtt.rto)
 				packet = self._packet(data=data, addr=addr, checkSeq=False)
 			except socket.timeout:
 				logging.debug("_sendSYNACK() timeout")
 				resendsRemaining -= 1
+				self._rtt.backoff()
+				self.sendto(synack, self.destAddr)
+				sent += 1
+				sentAt = time.monotonic()
 			except RxPException as e:
 				if(e.type == RxPException.INVALID_CHECKSUM):
 					continue
 			else:
 				
-				if packet.checkAttrs(("SYN",), exclusive=True):
+				if packet.checkAttrs(PacketAttributes.SYN, exclusive=True):
 					# SYN was resent, resend SYNACK
-					resendsRemaining = self.resendLimit
-				elif packet.checkAttrs(("ACK",), exclusive=True):
+					resendsRemaining = self._rtt.resends(self.resendLimit)
+					self.sendto(synack, self.destAddr)
+					sent += 1
+					sentAt = time.monotonic()
+				elif packet.checkAttrs(PacketAttributes.NOP) and "PROBE" in packet.options:
+					# segment size probe, echo it
+					resendsRemaining = self._rtt.resends(self.resendLimit)
+					self._echoProbe(packet)
+				elif packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+					# the final ACK carries the segment
+					# size chosen by the sender
+					self.mss = self._segmentSize(
+						packet.options.get("MSS", self.mss))
+					self._peerWindowFrom(packet)
+					if sent == 1:
+						self._rtt.sample(time.monotonic() - sentAt)
+					break
+				elif not packet.checkAttrs(PacketAttributes.ACK):
+					# the final ACK was lost, but the sender
+					# only sends data once it has the SYNACK.
+					# The packet is left for recv()
+					self._pending.appendleft((data, addr))
 					break
 
-	def _sendACK(self):
-		"""send ACK"""
+	def _probeMSS(self):
+		"""finds the largest payload, at most self.mss 
+		bytes, that the path to the peer delivers. Sizes
+		between Packet.MIN_DATA_LENGTH and self.mss are
+		binary searched with probe packets.
+		"""
 
-		attrs = PacketAttributes.pickle(("ACK",))
-		header = Header(
-			srcPort=self.srcAddr[1],
-			destPort=self.destAddr[1],
-			ack=self.ack.num,
-			recvWindow=self.recvWindow,
-			attrs=attrs
-			)
-		packet = Packet(header)
-		self.sendto(packet, self.destAddr)
+		lo = min(Packet.MIN_DATA_LENGTH, self.mss)
+		hi = self.mss
 
+		# probes need a timeout to detect loss
+		timeout = self.timeout
+		if timeout is None:
+			self.timeout = Socket.PROBE_TIMEOUT
 
-class Packet:
-	"""Represents a single packet and includes
-	header and data.
-	"""
+		try:
+			while lo < hi:
+				size = (lo + hi + 1) // 2
+				if self._probe(size):
+					lo = size
+				else:
+					hi = size - 1
+		finally:
+			self.timeout = timeout
 
-	# maximum sequence number
-	MAX_SEQ_NUM = math.pow(2, 32)
-	# max window size for sender
-	# or receiver (bytes)
-	MAX_WINDOW_SIZE = 65485
-	# Ethernet MTU (1500) - UDP header
-	DATA_LENGTH = 3 #1000
-	STRING_ENCODING = 'UTF-8'
+		logging.debug("_probeMSS(): %d", lo)
+		return lo
 
-	def __init__(self, header=None, data=""):
+	def _probe(self, size):
+		"""sends a NOP packet with a payload of size bytes.
+		Returns True if the peer echoes it within 
+		self.probeAttempts timeouts.
+		"""
 
-		if len(data) > Packet.DATA_LENGTH:
-			self.data = data[0:Packet.DATA_LENGTH-1]
-		else:
-			self.data = data
-		self.header = header or Header()
-		self.header.fields["length"] = len(data)
-		self.header.fields["checksum"] = self._checksum()
+		options = {"PROBE": size}
+		padding = size - len(PacketOptions.pickle(options))
 
+		attrs = PacketAttributes.NOP
+		header = Header(
+			srcPort=self.srcAddr[1],
+			destPort=self.destAddr[1],
+			seq=self.seq.num,
+			recvWindow=self._windowField(),
+			attrs=attrs
+			)
+		probe = Packet(header, bytes(padding), options)
 
-	def pickle(self):
-		""" returns a byte string representation
-		using pickling"""
+		attempts = self.probeAttempts
+		while attempts:
+			attempts -= 1
 
-		b = bytearray()
-		b.extend(self.header.pickle())
+			try:
+				self.sendto(probe, self.destAddr)
+			except OSError:
+				# too large to send at all
+				return False
+
+			# wait for the echo, ignoring anything
+			# else (e.g. resent SYNACKs)
+			while True:
+				try:
+					data, addr = self.recvfrom()
+					packet = self._packet(data, checkSeq=False)
+				except socket.timeout:
+					break
+				except RxPException:
+					continue
+				else:
+					if (packet.checkAttrs(PacketAttributes.NOP) and 
+						packet.options.get("PROBE") == size):
+						return True
 
-		if isinstance(self.data, str):
-			b.extend(self.data.encode(
-				encoding=Packet.STRING_ENCODING))
-		elif (isinstance(self.data, bytearray)
-			or isinstance(self.data, bytes)):
-			b.extend(self.data)
+		return False
 
-		return b
+	def _echoProbe(self, probe, addr=None):
+		"""answers a segment size probe (from addr, the
+		peer if None)"""
 
-	@staticmethod
-	def unpickle(byteArr, toString=False):
-		""" returns an instance of Packet
-		reconstructed from a byte string.
+		if addr is None:
+			addr = self.destAddr
+		attrs = PacketAttributes.NOP
+		header = Header(
+			srcPort=self.srcAddr[1],
+			destPort=addr[1],
+			seq=self.seq.num,
+			recvWindow=self._windowField(),
+			attrs=attrs
+			)
+		packet = Packet(header, 
+			options={"PROBE": probe.options["PROBE"]})
+		self.sendto(packet, addr)
+
+	def _sendACK(self, options=None, seq=0):
+		"""send ACK. The ACK packet is built once per
+		connection, after that only its ack number and
+		receive window change, so the checksum is 
+		updated incrementally. ACKs carrying options 
+		(e.g. SACK blocks while packets are held out 
+		of order) are built separately, with seq.
 		"""
-		p = Packet()
 
-		p.header = Header.unpickle(
-			byteArr[0:Header.LENGTH])
+		if options is None and self._reorder:
+			options = {"SACK": self._reorder.blocks(
+				self.ack.num, Socket.SACK_BLOCKS)}
 
-		if toString:
-			p.data = byteArr[Header.LENGTH:].decode(
-				encoding=Packet.STRING_ENCODING)
-		else:
-			p.data = byteArr[Header.LENGTH:]
+		# acknowledges every packet received
+		self._delayedAck.sent()
 
-		return p
+		packet = self._ackPacket
+		if options:
+			attrs = PacketAttributes.ACK
+			header = Header(
+				srcPort=self.srcAddr[1],
+				destPort=self.destAddr[1],
+				seq=seq,
+				ack=self.ack.num,
+				recvWindow=self._windowField(),
+				attrs=attrs
+				)
+			packet = Packet(header, options=options)
+		elif packet is None:
+			attrs = PacketAttributes.ACK
+			header = Header(
+				srcPort=self.srcAddr[1],
+				destPort=self.destAddr[1],
+				ack=self.ack.num,
+				recvWindow=self._windowField(),
+				attrs=attrs
+				)
+			packet = self._ackPacket = Packet(header)
+		else:
+			packet.update(
+				ack=self.ack.num, 
+				recvWindow=self._windowField())
+		self._advertised = packet.header.recvWindow << self._recvScale
+		self.sendto(packet, self.destAddr)
+
+	def _sendHandshakeACK(self):
+		"""sends (or resends) the ACK of the SYNACK. It 
+		carries the final segment size and the sequence 
+		number of the first data packet, which a listener
+		using SYN cookies builds the connection from.
+		"""
+		self._sendACK(options={"MSS": self.mss, 
+			"SCALE": self._recvScale}, seq=self._firstSeq)
+
+
+class AcceptedSocket(Socket):
+	"""connection returned by accept() on a Socket that
+	listens with a backlog. It sends on the listener's UDP
+	socket and receives the datagrams the listener routes
+	to it by peer address, so any number of connections
+	share one port. It takes the listener's settings 
+	(timeout, windows, acks, congestionControl, tracer,
+	fullDuplex) and is used like a connected Socket.
+	"""
+
+	def __init__(self, listener, addr, peerSeq, mss, seq=0, 
+		token=None, data=None):
+		self._parent = listener
+		# runs on the interpreter the listener was created on
+		self._expectedPythonVersion = listener._expectedPythonVersion
+		Socket.__init__(self)
+		# datagrams routed by the listener, not read yet
+		self._inbox = deque()
+		self._inboxCond = threading.Condition(threading.Lock())
+		# True once the listener stopped (see _detach)
+		self._detached = False
+		self._setUp(listener, addr, peerSeq, mss, seq, token, data)
+
+	def _setUp(self, listener, addr, peerSeq, mss, seq, token, data):
+		"""takes the listener's settings and prepares the
+		SYNACK and the handshake state. AsyncAcceptedSocket
+		shares it.
+		"""
+		self.timeout = listener.timeout
+		self.sendWindow = listener.sendWindow
+		self.recvWindow = listener.recvWindow
+		self.resendLimit = listener.resendLimit
+		self.acceptStrings = listener.acceptStrings
+		self.ackEvery = listener.ackEvery
+		self.ackDelay = listener.ackDelay
+		self.fullDuplex = listener.fullDuplex
+		# received packets are recorded by the listener
+		self.tracer = listener.tracer
+		self.congestionControl = copy.copy(listener.congestionControl)
+		self.srcAddr = listener.srcAddr
+		self.destAddr = addr
+
+		# set ack.num (peerSeq is the sequence 
+		# number of the SYN)
+		self.ack.reset((peerSeq + 1) % Packet.MAX_SEQ_NUM)
+
+		# use the smaller of the two segment sizes
+		self.mss = listener._segmentSize(mss)
+		self._reset()
+
+		if data is not None:
+			# the message sent in the SYN (fast open), the
+			# packet after it. The connection is open
+			self._lengths.append(len(data))
+			self._received.append(bytes(data))
+			self._received.append(None)
+			self._buffered += len(data)
+			self.ack.next()
+			self.connStatus = ConnectionStatus.IDLE
+
+		# SYNACK, resent until the final ACK arrives. 
+		# seq is its sequence number (the cookie if the
+		# listener uses SYN cookies). It carries the fast
+		# open token if there is one
+		options = {"MSS": self.mss, "SCALE": self._recvScale}
+		if token is not None:
+			options["TOKEN"] = token
+		self.seq.reset(seq)
+		attrs = PacketAttributes.SYN | PacketAttributes.ACK
+		header = Header(
+			srcPort=self.srcAddr[1],
+			destPort=self.destAddr[1],
+			seq=self.seq.num,
+			ack=self.ack.num,
+			recvWindow=self._windowField(),
+			attrs=attrs
+			)
+		self._synack = Packet(header, options=options)
+		self.seq.next()
+		# True once the peer acknowledged the SYNACK
+		self._synacked = False
+		# number of times the SYNACK was sent, when it was
+		# last sent, and number of its timers that expired
+		self._offers = 0
+		self._offeredAt = None
+		self._timeouts = 0
+
+		# timers on the listener's TimerWheel: the SYNACK
+		# resend, the idle timeout and, while the listener
+		# runs the reactor, the next retransmission or 
+		# delayed ACK
+		self._offerTimer = None
+		self._idleTimer = None
+		self._timer = None
+		# time.monotonic() value the peer was last heard from
+		self._heardAt = None
+
+	def _open(self):
+		# datagrams are sent on the listener's UDP socket
+		# and received through the listener (see _queue)
+		self._socket = self._parent._socket
+		self._selector = None
+		self._ring = None
+
+	def _closeSocket(self):
+		# the UDP socket stays open for the other
+		# connections, this one is no longer routed
+		listener = self._parent
+		with listener._cond:
+			if listener._connections.get(self.destAddr) is self:
+				del listener._connections[self.destAddr]
+			if self._idleTimer is not None:
+				self._idleTimer.cancel()
+				self._idleTimer = None
+
+	def close(self):
+		try:
+			Socket.close(self)
+		finally:
+			self._closeSocket()
+
+	def sendto(self, packet, addr):
+		if self._detached:
+			# the listener closed the UDP socket
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not listening")
+		Socket.sendto(self, packet, addr)
+
+	def recvBatch(self, deadline=None):
+		"""returns the datagrams the listener routed to
+		this connection (see Socket.recvBatch). data are
+		bytes.
+		"""
+		if self._pending:
+			batch = list(self._pending)
+			self._pending.clear()
+			return batch
+
+		timeout = self._timeout
+		if deadline is not None:
+			timeout = max(0, deadline - time.monotonic())
+
+		with self._inboxCond:
+			if not self._inboxCond.wait_for(lambda: self._inbox or 
+				self._detached, timeout):
+				raise socket.timeout("timed out")
+			if not self._inbox:
+				raise RxPException(RxPException.INVALID_STATE,
+					msg="Socket not listening")
+			batch = list(self._inbox)
+			self._inbox.clear()
+		return batch
+
+	def _queue(self, data, addr):
+		"""queues a datagram routed by the listener, 
+		with the listener's _cond held"""
+		with self._inboxCond:
+			self._inbox.append((data, addr))
+			self._inboxCond.notify()
+		if self._reactor is not None:
+			# the listener runs the reactor
+			self._parent._ready.add(self)
+
+	def _detach(self):
+		"""the listener stopped and its UDP socket is 
+		closed. The connection is closed as if its peer 
+		closed it, and whoever waits on it is woken up: 
+		reading from it raises RxPException.
+		"""
+		# a reader waits for the inbox with _cond held
+		with self._inboxCond:
+			self._detached = True
+			self._inboxCond.notify_all()
+		with self._cond:
+			self._reactor = None
+			self.connStatus = ConnectionStatus.NO_CONN
+			self._cond.notify_all()
+
+	def _startReactor(self):
+		# the listener runs the reactor (see _step),
+		# no thread is started
+		listener = self._parent
+		self._outbox.clear()
+		self._queued = 0
+		self._sent = 0
+		self._failed.clear()
+		self._window = None
+		self._stopping = False
+		with listener._cond:
+			if listener._listener is None:
+				return
+			self._reactor = listener
+			listener._reactors.add(self)
+		self._wakeReactor()
+
+	def _stopReactor(self):
+		with self._cond:
+			if self._reactor is None:
+				return
+			self._stopping = True
+			self._wakeReactor()
+			while self._reactor is not None:
+				self._cond.wait()
+
+	def _wakeReactor(self):
+		# the listener steps the reactor 
+		listener = self._parent
+		with listener._cond:
+			listener._ready.add(self)
+		try:
+			listener._wakeReactor()
+		except OSError:
+			# the listener stopped
+			pass
+
+	def _step(self, now):
+		"""runs a step of the reactor (see _react) on the
+		listener thread, without the listener's _cond held.
+		The reactor's next timer is armed on the 
+		listener's TimerWheel.
+		"""
+		listener = self._parent
+		deadline = None
+		with self._cond:
+			if self._reactor is None:
+				return
+			stopped = self._stopping
+			if stopped:
+				if self._delayedAck.deadline is not None:
+					self._sendACK()
+			else:
+				try:
+					batch = self.recvBatch(time.monotonic())
+				except socket.timeout:
+					batch = ()
+				deadline = self._react(batch, now)
+				stopped = self.connStatus == ConnectionStatus.NO_CONN
+			if stopped:
+				self._reactor = None
+				self._cond.notify_all()
+
+		with listener._cond:
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+			if stopped:
+				listener._reactors.discard(self)
+			elif self._pending or self._inbox:
+				listener._ready.add(self)
+			elif deadline is not None:
+				self._timer = listener._timers.schedule(
+					deadline, listener._ready.add, self)
+
+		if stopped and not self._stopping:
+			# the peer closed the connection
+			self._closeSocket()
+
+	def _offer(self, now):
+		"""sends (or resends) the SYNACK and arms its 
+		timer on the listener's TimerWheel"""
+		self.sendto(self._synack, self.destAddr)
+		self._offers += 1
+		self._offeredAt = now
+		listener = self._parent
+		if self._offerTimer is not None:
+			self._offerTimer.cancel()
+		self._offerTimer = listener._timers.schedule(
+			now + self._rtt.rto, listener._handshakeExpired, self)
+
+	def _offerExpired(self, now):
+		"""resends the SYNACK once its timer expired.
+		Returns False instead after resendLimit resends 
+		(fewer as they back off, see RttEstimator.resends).
+		"""
+		self._timeouts += 1
+		if self._timeouts > self._rtt.resends(self.resendLimit):
+			return False
+		self._rtt.backoff()
+		self._offer(now)
+		return True
+
+	def _established(self, ack, now):
+		"""completes the handshake. ack is the final ACK,
+		None if it was lost.
+		"""
+		if ack is not None:
+			# the final ACK carries the segment
+			# size chosen by the sender
+			self.mss = self._segmentSize(
+				ack.options.get("MSS", self.mss))
+			self._peerWindowFrom(ack)
+			if self._offers == 1:
+				self._rtt.sample(now - self._offeredAt)
+		if self._offerTimer is not None:
+			self._offerTimer.cancel()
+			self._offerTimer = None
+		self._synacked = True
+		self.isSender = False
+		self.connStatus = ConnectionStatus.IDLE
+
+class AsyncSocket(Socket):
+	"""asyncio version of Socket. bind, connect, listen,
+	accept, send, recv, recv_into and close are coroutines
+	(generator based: use yield from, or await on Python 
+	3.5+). The connection runs in callbacks of a datagram
+	endpoint (loop.create_datagram_endpoint) instead of 
+	threads, so idle connections cost no threads. The wire 
+	format, the attributes and the send and receive 
+	machinery are those of Socket. Like a fullDuplex 
+	Socket, it sends and receives at the same time. With 
+	listen(backlog), it demultiplexes any number of peers
+	like Socket and accept() returns AsyncAcceptedSockets.
+	"""
+
+	def __init__(self, loop=None):
+		self._loop = loop or asyncio.get_event_loop()
+		Socket.__init__(self)
+		# packets received while not connected, read by 
+		# the handshake and close coroutines
+		self._inbox = deque()
+		# futures of the coroutines waiting in _wait
+		self._waiters = list()
+		# window of the message being sent
+		self._window = None
+		# retransmission and delayed ACK timers
+		self._sendTimer = None
+		self._ackTimer = None
+		# True while it listens with a backlog. The loop
+		# timer that advances the TimerWheel, and its deadline
+		self._listening = False
+		self._wheelTimer = None
+		self._wheelDeadline = None
+
+	def _open(self):
+		# the datagram endpoint is created by bind()
+		self._transport = None
+
+	def _closeSocket(self):
+		self._stopTimers()
+		if self._transport is not None:
+			self._transport.close()
+		self._notify()
+
+	def _stopTimers(self):
+		"""cancels the retransmission and delayed ACK 
+		timers"""
+		for timer in (self._sendTimer, self._ackTimer):
+			if timer is not None:
+				timer.cancel()
+		self._sendTimer = None
+		self._ackTimer = None
+
+	@_coroutine
+	def bind(self, srcAddr):
+		"""binds the socket to srcAddr (see Socket.bind)"""
+		if srcAddr:
+			self.srcAddr = srcAddr
+
+		if not self.srcAddr:
+			raise RxPException(RxPException.INVALID_ARGUMENT,
+				msg="No source address specified")
+
+		self._transport, protocol = (yield from 
+			self._loop.create_datagram_endpoint(
+				lambda: AsyncProtocol(self), 
+				local_addr=self.srcAddr))
+		self.srcAddr = self._transport.get_extra_info("sockname")
+
+	@_coroutine
+	def connect(self, destAddr):
+		"""connects to destAddr (see Socket.connect). 
+		probeMSS is not supported.
+		"""
+
+		if self.srcAddr is None:
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not bound")
+
+		self.destAddr = destAddr
+		self._reset()
+		self.seq.reset(0)
+
+		# send SYN with sequence number and segment size
+		header = Header(
+			srcPort=self.srcAddr[1],
+			destPort=self.destAddr[1],
+			seq=self.seq.num,
+			recvWindow=self._windowField(),
+			attrs=PacketAttributes.SYN
+			)
+		syn = Packet(header, options={"MSS": self.mss, 
+			"SCALE": self._recvScale})
+		self.seq.next()
+
+		# wait for SYN, ACK
+		for sent in range(1, self._rtt.resends(self.resendLimit) + 1):
+			self.sendto(syn, self.destAddr)
+			sentAt = time.monotonic()
+			synack, addr = yield from self._expect(
+				PacketAttributes.SYN | PacketAttributes.ACK, 
+				sentAt + self._rtt.rto)
+			if synack is not None:
+				break
+			self._rtt.backoff()
+		else:
+			raise RxPException(RxPException.CONNECTION_TIMEOUT)
+
+		# the first round trip time sample, 
+		# unless the SYN was resent
+		if sent == 1:
+			self._rtt.sample(time.monotonic() - sentAt)
+
+		self.ack.reset(synack.header.seq + 1)
+		self.mss = self._segmentSize(
+			synack.options.get("MSS", Packet.DATA_LENGTH))
+		self._peerWindowFrom(synack)
+		self._firstSeq = self.seq.num
+		self._sendHandshakeACK()
+
+		self.isSender = True
+		self._established()
+
+	@_coroutine
+	def listen(self, backlog=None):
+		"""waits for a SYN (see Socket.listen). If backlog
+		is given, returns at once instead: the datagrams
+		are routed by peer address in the endpoint's 
+		callbacks (see _route) and accept() returns each
+		connection.
+		"""
+
+		if self.srcAddr is None:
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not bound")
+
+		if backlog is not None:
+			if backlog < 1:
+				raise RxPException(RxPException.INVALID_ARGUMENT,
+					msg="Invalid backlog")
+			self._backlogSize = backlog
+			if not self._listening:
+				self._secret = os.urandom(16)
+				self._recvScale = Socket._windowScale(self.recvWindow)
+				self._timers = TimerWheel()
+				self._listening = True
+			return
+
+		deadline = None
+		if self._timeout is not None:
+			deadline = (time.monotonic() + 
+				self._timeout * self.resendLimit * 100)
+
+		packet, addr = yield from self._expect(
+			PacketAttributes.SYN, deadline)
+		if packet is None:
+			raise RxPException(
+				RxPException.CONNECTION_TIMEOUT)
+
+		self.ack.reset(packet.header.seq + 1)
+		self.mss = self._segmentSize(
+			packet.options.get("MSS", Packet.DATA_LENGTH))
+		self.destAddr = addr
+		self._reset()
+		self._peerWindowFrom(packet)
+
+	@_coroutine
+	def accept(self):
+		"""completes the handshake started by listen() 
+		(see Socket.accept). If the socket listens with a
+		backlog, waits for a connection (see timeout) and
+		returns it as a new AsyncAcceptedSocket.
+		"""
+
+		if self.srcAddr is None:
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Socket not bound")
+		if self._backlogSize is not None:
+			deadline = None
+			if self._timeout is not None:
+				deadline = time.monotonic() + self._timeout
+			while not self._backlog:
+				if not self._listening:
+					raise RxPException(RxPException.INVALID_STATE,
+						msg="Socket not listening")
+				if not (yield from self._wait(deadline)):
+					raise socket.timeout("timed out")
+			return self._backlog.popleft()
+		if self.destAddr is None:
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="No connection. Use listen()")
+
+		self.seq.reset(0)
+
+		# send SYN, ACK with sequence number 
+		# and segment size
+		header = Header(
+			srcPort=self.srcAddr[1],
+			destPort=self.destAddr[1],
+			seq=self.seq.num,
+			ack=self.ack.num,
+			recvWindow=self._windowField(),
+			attrs=PacketAttributes.SYN | PacketAttributes.ACK
+			)
+		synack = Packet(header, options={"MSS": self.mss, 
+			"SCALE": self._recvScale})
+		self.seq.next()
+
+		self.sendto(synack, self.destAddr)
+		sent = 1
+		sentAt = time.monotonic()
+
+		resendsRemaining = self._rtt.resends(self.resendLimit)
+		while resendsRemaining:
+			packet, addr = yield from self._expect(None, 
+				sentAt + self._rtt.rto)
+			if packet is None or packet.checkAttrs(
+				PacketAttributes.SYN, exclusive=True):
+				if packet is None:
+					resendsRemaining -= 1
+					self._rtt.backoff()
+				else:
+					# SYN was resent
+					resendsRemaining = self._rtt.resends(self.resendLimit)
+				self.sendto(synack, self.destAddr)
+				sent += 1
+				sentAt = time.monotonic()
+			elif packet.checkAttrs(PacketAttributes.NOP):
+				if "PROBE" in packet.options:
+					# segment size probe, echo it
+					resendsRemaining = self._rtt.resends(self.resendLimit)
+					self._echoProbe(packet)
+			elif packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+				# the final ACK carries the segment
+				# size chosen by the sender
+				self.mss = self._segmentSize(
+					packet.options.get("MSS", self.mss))
+				self._peerWindowFrom(packet)
+				if sent == 1:
+					self._rtt.sample(time.monotonic() - sentAt)
+				break
+			elif not packet.checkAttrs(PacketAttributes.ACK):
+				# the final ACK was lost, but the sender
+				# only sends data once it has the SYNACK
+				self._inbox.appendleft((packet, addr))
+				break
+
+		if not resendsRemaining:
+			raise RxPException(RxPException.CONNECTION_TIMEOUT)
+
+		self.isSender = False
+		self._established()
+
+	def _established(self):
+		"""the handshake completed. Packets received 
+		meanwhile are handled as connected"""
+		self.connStatus = ConnectionStatus.IDLE
+		self._delayedAck.sent()
+		inbox = list(self._inbox)
+		self._inbox.clear()
+		for packet, addr in inbox:
+			self._dispatch(packet)
+
+	@_coroutine
+	def send(self, msg):
+		"""sends a message (see Socket.send). Messages sent
+		by several coroutines are sent one after the other.
+		Returns once msg is acknowledged, raises 
+		RxPException (RESEND_LIM) if the peer stopped 
+		answering.
+		"""
+
+		if self.connStatus != ConnectionStatus.IDLE:
+			raise RxPException(RxPException.INVALID_STATE,
+				msg="Connection status not idle")
+
+		self._outbox.append(msg)
+		self._queued += 1
+		ticket = self._queued
+		self._pump()
+
+		while (self._sent < ticket and 
+			self.connStatus == ConnectionStatus.IDLE):
+			yield from self._wait()
+		self._checkSent(ticket)
+
+	@_coroutine
+	def recv(self):
+		"""receives a message (see Socket.recv)"""
+
+		message = bytearray()
+		length = 0
+
+		received = self._received
+		while True:
+			start = length
+			while received and received[0] is not None:
+				data = received.popleft()
+				message[length:length+len(data)] = data
+				length += len(data)
+			self._consumed(length - start)
+
+			if received:
+				# the message ended
+				self._endMessage()
+				break
+			if not (yield from self._recvMore()):
+				raise RxPException(
+					RxPException.CONNECTION_TIMEOUT)
+			if not length and self.messageLength:
+				message = bytearray(min(self.messageLength,
+					Socket.MAX_PREALLOCATE))
+
+		del message[length:]
+
+		if(self.acceptStrings):
+			return message.decode(
+				encoding=Packet.STRING_ENCODING)
+		return bytes(message)
+
+	@_coroutine
+	def recv_into(self, buffer, nbytes=0):
+		"""receives data of the current message into 
+		buffer (see Socket.recv_into)"""
+
+		view = memoryview(buffer).cast("B")
+		if nbytes:
+			view = view[:nbytes]
+		size = len(view)
+		if not size:
+			return 0
+
+		received = self._received
+		if not (yield from self._recvMore()):
+			raise RxPException(
+				RxPException.CONNECTION_TIMEOUT)
+
+		if received[0] is None:
+			self._endMessage()
+			return 0
+
+		written = 0
+		while received and received[0] is not None and written < size:
+			data = received.popleft()
+			count = min(len(data), size - written)
+			view[written:written+count] = data[:count]
+			if count < len(data):
+				received.appendleft(data[count:])
+			written += count
+		self._consumed(written)
+
+		return written
+
+	def recvChunks(self):
+		"""returns the data of the next message (the rest
+		of the current one if it was partly read) as it
+		arrives in order (see Socket.recvChunks), as an 
+		AsyncChunks. A coroutine can not be iterated on 
+		Python 3.4, so each chunk is read with yield from
+		chunks.next(), or with async for on Python 3.5+.
+		"""
+		return AsyncChunks(self)
+
+	@_coroutine
+	def close(self):
+		"""sends the queued messages, then closes the
+		connection (see Socket.close). A listener closes
+		its connections as well (see _stopListening).
+		"""
+
+		if self._listening:
+			self._stopListening()
+			return
+
+		while (self._sent < self._queued and 
+			self.connStatus == ConnectionStatus.IDLE):
+			yield from self._wait()
+
+		if self.connStatus == ConnectionStatus.NO_CONN:
+			# not connected, or the peer closed
+			# the connection
+			self._closeSocket()
+			return
+
+		# packets are read by this coroutine from now on
+		self.connStatus = ConnectionStatus.NO_CONN
+		self._notify()
+
+		header = Header(
+			srcPort=self.srcAddr[1],
+			destPort=self.destAddr[1],
+			seq=self.seq.num,
+			attrs=PacketAttributes.CLOSE
+			)
+		closePacket = Packet(header)
+		self.seq.next()
+
+		# rto may have backed off already (the peer stopped 
+		# answering data), so the time is limited as well
+		giveUp = time.monotonic() + self._rtt.budget(self.resendLimit)
+		waitLimit = self._rtt.resends(self.resendLimit)
+		while waitLimit and time.monotonic() < giveUp:
+			self.sendto(closePacket, self.destAddr)
+			packet, addr = yield from self._expect(None, 
+				min(giveUp, time.monotonic() + self._rtt.rto))
+			if packet is None:
+				waitLimit -= 1
+				self._rtt.backoff()
+			elif packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+				break
+			elif packet.checkAttrs(PacketAttributes.CLOSE):
+				# the peer closes at the same time
+				self._closeAck(packet)
+				break
+			else:
+				waitLimit -= 1
+
+		self._closeSocket()
+
+	@_coroutine
+	def _recvMore(self):
+		"""waits until data or the end of a message is 
+		delivered in order (see Socket._recvMore). Returns
+		False if nothing arrived within resendLimit timeouts.
+		"""
+		deadline = None
+		if self._timeout is not None:
+			deadline = (time.monotonic() + 
+				self._timeout * self.resendLimit)
+
+		while not self._received:
+			if self.connStatus != ConnectionStatus.IDLE:
+				raise RxPException(RxPException.INVALID_STATE,
+					msg="Connection status not idle")
+			if not (yield from self._wait(deadline)):
+				return False
+		return True
+
+	@_coroutine
+	def _expect(self, attrs, deadline):
+		"""returns the next packet received while not 
+		connected (with exactly attrs if not None, others 
+		are dropped) and its address, or (None, None) if 
+		time.monotonic() reaches deadline first
+		"""
+		while True:
+			while self._inbox:
+				packet, addr = self._inbox.popleft()
+				if attrs is None or packet.checkAttrs(attrs, exclusive=True):
+					return packet, addr
+			if not (yield from self._wait(deadline)):
+				return None, None
+
+	@_coroutine
+	def _wait(self, deadline=None):
+		"""waits until _notify() is called or 
+		time.monotonic() reaches deadline. Returns 
+		False if the deadline was reached.
+		"""
+		waiter = asyncio.Future(loop=self._loop)
+		self._waiters.append(waiter)
+
+		timer = None
+		if deadline is not None:
+			timer = self._loop.call_later(
+				max(0, deadline - time.monotonic()), 
+				AsyncSocket._resolve, waiter, False)
+		try:
+			return (yield from waiter)
+		finally:
+			if timer is not None:
+				timer.cancel()
+
+	def _notify(self):
+		"""wakes every coroutine waiting in _wait"""
+		waiters = self._waiters
+		self._waiters = list()
+		for waiter in waiters:
+			AsyncSocket._resolve(waiter, True)
 
-	# http://stackoverflow.com/a/1769267
 	@staticmethod
-	def _add(a, b):
-	    c = a + b
-	    return (c & 0xffff) + (c >> 16)
+	def _resolve(waiter, result):
+		if not waiter.done():
+			waiter.set_result(result)
 
-	# http://stackoverflow.com/a/1769267
-	def _checksum(self):
-		self.header.fields["checksum"] = 0
-		p = str(self.pickle())
+	def sendto(self, packet, addr):
+		if self.tracer is not None:
+			self.tracer.record(PacketTracer.SEND, packet.header)
+		self._transport.sendto(packet.pickle(), addr)
+
+	def _datagram(self, data, addr):
+		"""handles a datagram received by the endpoint"""
+		if self.tracer is not None and len(data) >= Header.LENGTH:
+			self.tracer.record(PacketTracer.RECV, 
+				Header.unpack_from(data))
+
+		if self._listening:
+			self._route(data, addr)
+		else:
+			self._handle(data, addr)
+
+	def _handle(self, data, addr):
+		"""handles a datagram of the connection"""
+		try:
+			packet = self._packet(data, checkSeq=False)
+		except RxPException as e:
+			logging.debug("_datagram(): %s", e)
+			return
+
+		if self.connStatus == ConnectionStatus.IDLE:
+			self._dispatch(packet)
+		else:
+			self._inbox.append((packet, addr))
+			self._notify()
+
+	def _route(self, data, addr):
+		"""routes a datagram received by a listener (see
+		Socket._demux) and wakes accept() once a 
+		connection is queued
+		"""
+		with self._cond:
+			try:
+				self._demux(data, addr, time.monotonic())
+			except Exception:
+				logging.exception("_route(): datagram from %s", addr)
+			queued = bool(self._backlog)
+		self._armWheel()
+		if queued:
+			self._notify()
+
+	def _acceptedSocket(self, addr, peerSeq, mss, seq=0, 
+		token=None, data=None):
+		return AsyncAcceptedSocket(self, addr, peerSeq, mss, seq, 
+			token=token, data=data)
+
+	def _armWheel(self):
+		"""arms the loop timer for the next deadline of the
+		listener's TimerWheel (SYNACK resends and idle 
+		timeouts), unless it expires sooner already
+		"""
+		with self._cond:
+			deadline = self._timers.nextDeadline()
+		if deadline is None or not self._listening:
+			return
+		if self._wheelTimer is not None:
+			if self._wheelDeadline <= deadline:
+				return
+			self._wheelTimer.cancel()
+		self._wheelDeadline = deadline
+		self._wheelTimer = self._loop.call_later(
+			max(0, deadline - time.monotonic()), self._wheelExpired)
+
+	def _wheelExpired(self):
+		"""the loop timer of the TimerWheel expired"""
+		self._wheelTimer = None
+		with self._cond:
+			self._timers.advance(time.monotonic())
+			queued = bool(self._backlog)
+		self._armWheel()
+		if queued:
+			self._notify()
+
+	def _stopListening(self):
+		"""closes a listener: the endpoint is closed and its
+		connections are closed as if their peers closed 
+		them (see AsyncAcceptedSocket._detach)
+		"""
+		self._listening = False
+		if self._wheelTimer is not None:
+			self._wheelTimer.cancel()
+			self._wheelTimer = None
+		with self._cond:
+			conns = (set(self._connections.values()) |
+				set(self._handshakes.values()) | set(self._backlog))
+			self._connections.clear()
+			self._handshakes.clear()
+			self._backlog.clear()
+		for conn in conns:
+			conn._detach()
+		self._closeSocket()
+
+	def _dispatch(self, packet):
+		"""handles a packet received while connected: ACKs
+		go to the window being sent, data to the readers
+		"""
+		now = time.monotonic()
+		acks = self._delayedAck
+		acks.every = self.ackEvery
+		acks.delay = self.ackDelay
+
+		if packet.checkAttrs(
+			PacketAttributes.SYN | PacketAttributes.ACK, 
+			exclusive=True):
+			# resend ACK acknowledging SYNACK
+			self._sendHandshakeACK()
+		elif packet.checkAttrs(PacketAttributes.ACK, exclusive=True):
+			self._onAck(packet, self._window)
+			if self._window is not None:
+				self._pump()
+			return
+		else:
+			self._onData(packet, now)
+
+		if acks.due(now):
+			self._sendACK()
+		elif acks.deadline is not None and self._ackTimer is None:
+			self._ackTimer = self._loop.call_later(
+				max(0, acks.deadline - now), self._ackTimeout)
+
+		if self.connStatus == ConnectionStatus.NO_CONN:
+			# the peer closed the connection
+			self._closeSocket()
+		elif self._received:
+			self._notify()
+
+	def _ackTimeout(self):
+		"""the delayed ACK timer expired"""
+		self._ackTimer = None
+		if self.connStatus != ConnectionStatus.IDLE:
+			return
+
+		now = time.monotonic()
+		acks = self._delayedAck
+		if acks.due(now):
+			self._sendACK()
+		elif acks.deadline is not None:
+			self._ackTimer = self._loop.call_later(
+				max(0, acks.deadline - now), self._ackTimeout)
+
+	def _pump(self):
+		"""sends what the window being sent allows, moves 
+		on to the next queued message once it is done and
+		arms the retransmission timer
+		"""
+		if self.connStatus != ConnectionStatus.IDLE:
+			return
+
+		now = time.monotonic()
+		while True:
+			if self._window is None:
+				if not self._outbox:
+					break
+				self._window = self._sendWindow(self._outbox.popleft())
+			if not self._sendStep(self._window, now):
+				break
+			if self._window.done:
+				self._window = None
+				self._sent += 1
+			else:
+				self._giveUp()
+			self._notify()
+
+		if self._sendTimer is not None:
+			self._sendTimer.cancel()
+			self._sendTimer = None
+		if self._window is not None:
+			deadline = self._window.deadline()
+			if deadline is not None:
+				self._sendTimer = self._loop.call_later(
+					max(0, deadline - now), self._pump)
+
+class AsyncAcceptedSocket(AsyncSocket):
+	"""connection returned by accept() on an AsyncSocket
+	that listens with a backlog (see AcceptedSocket). It 
+	sends on the listener's endpoint and handles the 
+	datagrams the listener routes to it in callbacks of 
+	the same loop.
+	"""
+
+	def __init__(self, listener, addr, peerSeq, mss, seq=0, 
+		token=None, data=None):
+		self._parent = listener
+		self._expectedPythonVersion = listener._expectedPythonVersion
+		AsyncSocket.__init__(self, listener._loop)
+		self._transport = listener._transport
+		AcceptedSocket._setUp(self, listener, addr, peerSeq, mss, 
+			seq, token, data)
+
+	def _closeSocket(self):
+		# the endpoint stays open for the other connections
+		self._stopTimers()
+		AcceptedSocket._closeSocket(self)
+		self._notify()
+
+	def _queue(self, data, addr):
+		"""queues a datagram routed by the listener. It is 
+		handled in a callback of its own, once the 
+		listener's returned
+		"""
+		self._loop.call_soon(self._handle, data, addr)
+
+	def _detach(self):
+		"""the listener closed its endpoint (see 
+		AcceptedSocket._detach)"""
+		self.connStatus = ConnectionStatus.NO_CONN
+		self._stopTimers()
+		self._notify()
+
+	def _offer(self, now):
+		AcceptedSocket._offer(self, now)
+
+	def _offerExpired(self, now):
+		return AcceptedSocket._offerExpired(self, now)
+
+	def _established(self, ack, now):
+		AcceptedSocket._established(self, ack, now)
+		AsyncSocket._established(self)
+
+class AsyncChunks:
+	"""the chunks of a message received by an AsyncSocket
+	(see AsyncSocket.recvChunks). next() is a coroutine 
+	that returns the next chunk, None once the message 
+	ended. On Python 3.5+ the chunks can also be read with
+	async for.
+	"""
 
-		s = 0
-		for i in range(0, len(p)-1, 2):
-		    w = ord(p[i]) + (ord(p[i+1]) << 8)
-		    s = Packet._add(s, w)
-		s = ~s & 0xffff
+	def __init__(self, sock):
+		self._sock = sock
+		self._ended = False
+		self._decoder = None
+		if sock.acceptStrings:
+			self._decoder = codecs.getincrementaldecoder(
+				Packet.STRING_ENCODING)()
 
-		return s
+	@_coroutine
+	def next(self):
+		"""returns the next chunk of the message, one per 
+		run of packets received, or None once it ended"""
+		sock = self._sock
+		received = sock._received
+		while not self._ended:
+			if not received and not (yield from sock._recvMore()):
+				raise RxPException(
+					RxPException.CONNECTION_TIMEOUT)
+
+			pieces = list()
+			while received and received[0] is not None:
+				pieces.append(received.popleft())
+			chunk = b"".join(pieces)
+			sock._consumed(len(chunk))
+
+			if received:
+				# the message ended
+				sock._endMessage()
+				self._ended = True
+
+			if self._decoder is not None:
+				chunk = self._decoder.decode(chunk, self._ended)
+			if chunk:
+				return chunk
+		return None
+
+	def __aiter__(self):
+		return self
+
+	def __anext__(self):
+		return self._anext()
+
+	@_coroutine
+	def _anext(self):
+		chunk = yield from self.next()
+		if chunk is None:
+			raise StopAsyncIteration
+		return chunk
+
+class AsyncProtocol(asyncio.DatagramProtocol):
+	"""datagram protocol of the endpoint of an 
+	AsyncSocket, hands it every datagram received"""
+
+	def __init__(self, sock):
+		self._sock = sock
+
+	def datagram_received(self, data, addr):
+		self._sock._datagram(data, addr)
+
+	def error_received(self, exc):
+		logging.debug("AsyncProtocol: %s", exc)
+
+class Packet:
+	"""Represents a single packet and includes
+	header and data.
+	"""
+
+	# maximum sequence number
+	MAX_SEQ_NUM = 2 ** 32
+	# max window size for sender
+	# or receiver (bytes)
+	MAX_WINDOW_SIZE = 65485
+	# default segment size: Ethernet MTU (1500) 
+	# - IP and UDP headers (28) - RxP header (22)
+	DATA_LENGTH = 1450
+	# smallest segment size every path carries: 
+	# minimum IPv4 reassembly size (576)
+	# - IP and UDP headers (28) - RxP header (22)
+	MIN_DATA_LENGTH = 526
+	# smallest segment size negotiated: room for the
+	# options of a first data packet (LENGTH) and data
+	MIN_SEGMENT_SIZE = 64
+	# largest segment size: MAX_WINDOW_SIZE 
+	# - RxP header (22)
+	MAX_DATA_LENGTH = 65463
+	STRING_ENCODING = 'UTF-8'
+
+	# packets are created for every segment, so
+	# they have no per instance dict
+	__slots__ = ("header", "data", "options", "_opts")
+
+	# options of packets without options (shared)
+	_noOptions = MappingProxyType({})
+
+	def __init__(self, header=None, data="", options=None):
+
+		self.header = header or Header()
+
+		# options are pickled in front of the data
+		# and flagged with the OPT attribute
+		if options:
+			self.options = options
+			self._opts = PacketOptions.pickle(options)
+			self.header.attrs |= PacketAttributes.OPT
+		else:
+			self.options = Packet._noOptions
+			self._opts = b""
+
+		# the length field counts bytes, so strings
+		# are encoded up front
+		if isinstance(data, str):
+			data = data.encode(encoding=Packet.STRING_ENCODING)
+
+		maxLength = Packet.MAX_DATA_LENGTH - len(self._opts)
+		if len(data) > maxLength:
+			self.data = data[0:maxLength]
+		else:
+			self.data = data
+		self.header.length = len(self._opts) + len(self.data)
+		self.header.checksum = self._checksum()
+
+
+	def buffers(self):
+		"""returns the packet as a list of buffers 
+		(header, options, data) for scatter-gather 
+		I/O, without concatenating them.
+		"""
+		bufs = [self.header.pickle()]
+		if self._opts:
+			bufs.append(self._opts)
+		if self.data:
+			if isinstance(self.data, str):
+				bufs.append(self.data.encode(
+					encoding=Packet.STRING_ENCODING))
+			else:
+				bufs.append(self.data)
+		return bufs
+
+	def pickle(self):
+		""" returns a byte string representation
+		using pickling"""
+
+		b = bytearray()
+		b.extend(self.header.pickle())
+		b.extend(self._opts)
+
+		if isinstance(self.data, str):
+			b.extend(self.data.encode(
+				encoding=Packet.STRING_ENCODING))
+		elif isinstance(self.data, (bytes, bytearray, memoryview)):
+			b.extend(self.data)
+
+		return b
+
+	@staticmethod
+	def unpickle(byteArr, toString=False):
+		""" returns an instance of Packet
+		reconstructed from a byte string. The header
+		is parsed in place and, unless toString is set,
+		data is a memoryview of byteArr (no copy is
+		made, so byteArr must not be modified while
+		the packet is in use). Raises RxPException
+		(INVALID_CHECKSUM) if byteArr is shorter than
+		a header.
+		"""
+		view = memoryview(byteArr)
+		if len(view) < Header.LENGTH:
+			# not an RxP packet (or truncated), dropped
+			# like a packet whose checksum does not match
+			raise RxPException(RxPException.INVALID_CHECKSUM,
+				msg="datagram shorter than the header")
+
+		# skip __init__, the checksum of a received
+		# packet is only computed by verify()
+		p = Packet.__new__(Packet)
+		p.header = Header.unpack_from(view)
+
+		# split off options
+		base = Header.LENGTH
+		p.options = Packet._noOptions
+		p._opts = b""
+		if p.checkAttrs(PacketAttributes.OPT):
+			try:
+				p.options, length = PacketOptions.unpickle(
+					view, base)
+			except (IndexError, struct.error, ValueError):
+				# malformed options. the checksum
+				# will not match either
+				pass
+			else:
+				p._opts = view[base:base + length]
+				base += length
+
+		if toString:
+			p.data = str(view[base:],
+				encoding=Packet.STRING_ENCODING)
+		else:
+			p.data = view[base:]
+
+		return p
+
+	# The checksum is the RFC 1071 internet checksum: the
+	# one's complement of the one's complement sum of the
+	# packet as little endian 16 bit words (checksum field
+	# set to 0). Because 2^16 = 1 (mod 2^16 - 1), that sum
+	# is congruent to the sum of the header field values
+	# plus the payload read as one little endian integer,
+	# so it is computed from the fields directly (without
+	# pickling) and a word at a time by int.from_bytes.
+
+	@staticmethod
+	def _fold(s):
+		"""reduces s to its 16 bit one's complement
+		sum (end around carry)
+		"""
+		r = s % 0xffff
+		if not r and s:
+			r = 0xffff
+		return r
+
+	@staticmethod
+	def _headerSum(header):
+		"""sum of the header fields, excluding checksum"""
+		return (sum(header._values()) - 
+			(header.checksum & 0xffff))
+
+	def _dataSum(self):
+		"""sum of the payload words"""
+		data = self.data
+		if isinstance(data, str):
+			data = data.encode(encoding=Packet.STRING_ENCODING)
+		# the options block has an even length, so the
+		# data words follow on
+		return (int.from_bytes(self._opts, "little") + 
+			int.from_bytes(data, "little"))
+
+	def _checksum(self):
+		s = Packet._headerSum(self.header) + self._dataSum()
+		return ~Packet._fold(s) & 0xffff
+
+	def update(self, **fields):
+		"""sets header fields (e.g. seq and ack on a 
+		retransmit or ACK) and updates the checksum
+		incrementally (RFC 1624) instead of recomputing
+		it over the whole packet.
+		"""
+		h = self.header
+		s = ~h.checksum & 0xffff
+		for name, value in fields.items():
+			mask = Header.FIELD_MASKS[name]
+			value &= mask
+			s += value - (getattr(h, name) & mask)
+			setattr(h, name, value)
+		h.checksum = ~Packet._fold(s) & 0xffff
 
 	def verify(self):
-		# compare packet checksum with
-		# calculated checksum
-		packetChksum = self.header.fields["checksum"]
-		calcChksum = self._checksum()
-		self.header.fields["checksum"] = packetChksum
+		"""verifies the packet checksum. The sum over
+		the packet including the checksum must be
+		(one's complement) zero, and the length field 
+		must match the payload (zero bytes lost from the
+		end of a datagram do not change the sum).
+		"""
+		if (self.header.length != 
+			len(self._opts) + len(self.data)):
+			return False
 
-		return packetChksum == calcChksum
+		s = (sum(self.header._values()) + 
+			self._dataSum())
+		return s % 0xffff == 0
 
 	def checkAttrs(self, expectedAttrs, exclusive=False):
-		# verify expected attrs
-		attrs = PacketAttributes.unpickle(
-			self.header.fields["attrs"])
+		"""checks the packet attributes against expectedAttrs,
+		a mask of PacketAttributes bits (or a tuple of names).
+		All expected attributes must be set and, if exclusive,
+		no others. OPT only marks the presence of options, 
+		it is ignored unless it is expected.
+		"""
+		if not isinstance(expectedAttrs, int):
+			expectedAttrs = PacketAttributes.pickle(expectedAttrs)
 
-		if (exclusive and 
-			len(attrs) != len(expectedAttrs)):
-			return False
-		else:
-			for attr in expectedAttrs:
-				if (attr is not None and 
-					attr not in attrs):
-					return False
-		return True
-			
+		attrs = self.header.attrs
+		if exclusive:
+			if not expectedAttrs & PacketAttributes.OPT:
+				attrs &= ~PacketAttributes.OPT
+			return attrs == expectedAttrs
+		return attrs & expectedAttrs == expectedAttrs
 
 	def __str__(self):
-		d = self.__dict__ 
 		d2 = {}
-		for key in d.keys():
-			d2[key] = str(d[key])
+		for key in Packet.__slots__:
+			value = getattr(self, key)
+			if isinstance(value, memoryview):
+				value = value.tobytes()
+			d2[key] = str(value)
 		return str(d2)
 
 class Header:
@@ -772,9 +3618,10 @@ class Header:
 	for descriptions of each header field.
 	"""
 
-	# define binary types for use in header fields.
-	uint16 = ctypes.c_uint16
-	uint32 = ctypes.c_uint32
+	# define binary types for use in header fields
+	# (struct format codes)
+	uint16 = "H"
+	uint32 = "I"
 
 	# available header fields. formatted as:
 	# fieldName, dataType, numBytes
@@ -789,90 +3636,127 @@ class Header:
 		("attrs", uint32, 4)
 		)
 
+	# field names, in wire order
+	NAMES = tuple(map(lambda x: x[0], FIELDS))
+
+	# masks used to truncate each field to its
+	# size on the wire (values wrap like the
+	# corresponding C types)
+	MASKS = tuple(map(lambda x: (1 << (8 * x[2])) - 1, FIELDS))
+	FIELD_MASKS = dict(zip(NAMES, MASKS))
+
+	# precompiled binary layout of the header. fields
+	# are packed little endian, without padding
+	STRUCT = struct.Struct(
+		"<" + "".join(map(lambda x: x[1], FIELDS)))
+
 	# sum of the length of all fields (bytes)
-	LENGTH = sum(map(lambda x: x[2], FIELDS))
+	LENGTH = STRUCT.size
 
-	def __init__(self, **kwargs):
-		self.fields = {}
-		keys = kwargs.keys()
+	# fields are stored in slots (no per instance dict)
+	__slots__ = NAMES
 
-		for item in Header.FIELDS:
-			fieldName = item[0]
-			fieldType = item[1]
-			if fieldName in keys:
-				field = kwargs[fieldName]
-			else:
-				field = 0
-			self.fields[fieldName] = field
+	# reads all fields, in wire order
+	_get = operator.attrgetter(*NAMES)
+
+	def __init__(self, srcPort=0, destPort=0, seq=0, ack=0,
+		recvWindow=0, length=0, checksum=0, attrs=0):
+		self.srcPort = srcPort
+		self.destPort = destPort
+		self.seq = seq
+		self.ack = ack
+		self.recvWindow = recvWindow
+		self.length = length
+		self.checksum = checksum
+		self.attrs = attrs
+
+	@property
+	def fields(self):
+		"""the header fields as a (mutable) mapping
+		of field name to value
+		"""
+		return HeaderFields(self)
+
+	def _values(self):
+		"""returns the field values in wire order,
+		truncated to the size of each field
+		"""
+		return tuple(map(int.__and__, 
+			Header._get(self), Header.MASKS))
 
 	def pickle(self):
 		"""converts the object to a binary string
 		that can be prepended onto a packet. pickle
 		enforces size restrictions and pads fields
 		"""
-		byteArr = bytearray()
+		return Header.STRUCT.pack(*self._values())
 
-		# add fields to bytearray one field at a time
-		for item in Header.FIELDS:
-			fieldName = item[0]
-			fieldType = item[1]
-			fieldVal = self.fields[fieldName]
-			if fieldVal is not None:
-				byteArr.extend(bytearray(
-					fieldType(fieldVal)))
+	def pack_into(self, buffer, offset=0):
+		"""packs the header into a writable buffer
+		(bytearray, memoryview, etc.) starting at 
+		offset. The buffer must have at least 
+		Header.LENGTH bytes available after offset.
+		"""
+		Header.STRUCT.pack_into(buffer, offset, *self._values())
 
-		return byteArr
+	@staticmethod
+	def unpack_from(buffer, offset=0):
+		"""creates an instance of Header from the 
+		Header.LENGTH bytes of buffer starting at
+		offset. buffer can be any object supporting
+		the buffer protocol. No copy is made.
+		"""
+		return Header(*Header.STRUCT.unpack_from(buffer, offset))
 
 	@staticmethod
 	def unpickle(byteArr):
 		"""creates an instance of Header from a byte
-		array. This must be done manually using knowledge
-		about the order and size of each field.
+		array.
 		"""
+		return Header.unpack_from(byteArr)
 
-		# ensure the byte array is of
-		# type bytearray
-		if not isinstance(byteArr, bytearray):
-			byteArr = bytearray(byteArr)
+	def __str__(self):
+		
+		str_ = "{ "
+		for fieldName in Header.NAMES:
+			str_ += fieldName + ': ' 
+			if fieldName == "attrs":
+				str_ += repr(PacketAttributes.unpickle(
+					self.attrs))
+			else:
+				str_ += str(getattr(self, fieldName)) + ', '
+		str_ += " }"
 
-		h = Header()
-		base = 0
-		for item in Header.FIELDS:
+		return str_
 
-			fieldName = item[0]
-			fieldType = item[1]
-			fieldSize = item[2]
+class HeaderFields(MutableMapping):
+	"""mapping view of the fields of a Header, 
+	for code that accesses them by name
+	"""
 
-			# extract field from header using
-			# base + offset addressing
-			value = byteArr[base : base + fieldSize]
+	__slots__ = ("_header",)
 
-			# convert value from bytes to int
-			field = fieldType.from_buffer(value).value
+	def __init__(self, header):
+		self._header = header
 
-			# update base
-			base += fieldSize
+	def __getitem__(self, name):
+		if name not in Header.FIELD_MASKS:
+			raise KeyError(name)
+		return getattr(self._header, name)
 
-			# add field to header 
-			h.fields[fieldName] = field
+	def __setitem__(self, name, value):
+		if name not in Header.FIELD_MASKS:
+			raise KeyError(name)
+		setattr(self._header, name, value)
 
-		return h
+	def __delitem__(self, name):
+		raise TypeError("header fields cannot be deleted")
 
-	def __str__(self):
-		
-		str_ = "{ "
-		for item in Header.FIELDS:
-			fieldName = item[0]
-			if fieldName in self.fields:
-				str_ += fieldName + ': ' 
-				if fieldName == "attrs":
-					str_ += repr(PacketAttributes.unpickle(
-						self.fields[fieldName]))
-				else:
-					str_ += str(self.fields[fieldName]) + ', '
-		str_ += " }"
+	def __iter__(self):
+		return iter(Header.NAMES)
 
-		return str_
+	def __len__(self):
+		return len(Header.NAMES)
 
 class RxPException(Exception):
 	"""Exception that gives details on RxP related errors."""
@@ -894,6 +3778,11 @@ class RxPException(Exception):
 	SEQ_MISMATCH = 5
 	# Maximum resend limit reached
 	RESEND_LIM = 6
+	# the socket is not in the state the call
+	# needs (not bound, listening, idle, ...)
+	INVALID_STATE = 7
+	# invalid argument
+	INVALID_ARGUMENT = 8
 
 	DEFAULT_MSG = {
 		INVALID_CHECKSUM: "invalid checksum",
@@ -901,7 +3790,9 @@ class RxPException(Exception):
 		CONNECTION_TIMEOUT: "connection timeout",
 		UNEXPECTED_PACKET: "unexpected packet type",
 		SEQ_MISMATCH: "sequence mismatch",
-		RESEND_LIM: "Maximum reset limit reached"
+		RESEND_LIM: "Maximum reset limit reached",
+		INVALID_STATE: "invalid socket state",
+		INVALID_ARGUMENT: "invalid argument"
 	}
 
 	def __init__(self, type_, msg=None, innerException=None):
@@ -930,60 +3821,1161 @@ class PacketAttributes:
 	"""
 	# possible attributes
 	_values = ["SYN", "CLOSE", "NM", "EOM",  
-		"ACK", "NOP", "SRQ"] 
+		"ACK", "NOP", "SRQ", "OPT", "ACKNOW"] 
+
+	# attribute bits
+	SYN = 1 << 0
+	CLOSE = 1 << 1
+	NM = 1 << 2
+	EOM = 1 << 3
+	ACK = 1 << 4
+	NOP = 1 << 5
+	SRQ = 1 << 6
+	OPT = 1 << 7
+	# the sender cannot send more until this
+	# packet is acknowledged (no delayed ACK)
+	ACKNOW = 1 << 8
+	ALL = (1 << len(_values)) - 1
+
+	# attribute name -> bit
+	_bits = dict(zip(_values, 
+		map(lambda x: 1 << x, range(len(_values)))))
+
+	# mask -> tuple of attribute names, for every mask
+	_names = tuple(map(
+		lambda mask, values=_values: tuple(filter(
+			lambda x: mask >> values.index(x) & 1, values)),
+		range(ALL + 1)))
 
 	@staticmethod
 	def pickle(attrs=None):
-		"""produces a single byte string with the
-		correct bit set for each pack type passed
-		in as a string.
+		"""produces a single integer with the correct
+		bit set for each packet type passed in as a
+		string. Integer masks are returned unchanged.
 		"""
 		if attrs is None:
-			submittedAttrs = ()
+			return 0
+		if isinstance(attrs, int):
+			return attrs
+
+		mask = 0
+		for item in attrs:
+			mask |= PacketAttributes._bits.get(item, 0)
+		return mask
+
+	@staticmethod
+	def unpickle(byteStr):
+		"""returns the tuple of attribute names set
+		in a pickled mask
+		"""
+		return PacketAttributes._names[byteStr & PacketAttributes.ALL]
+
+	def __str__(self):
+		return repr(self.attrs)
+
+class PacketOptions:
+	"""class that generates the options block carried at
+	the start of the payload of packets with the OPT 
+	attribute. Each option is a kind byte, a length byte
+	(of the whole option) and a value. The block ends 
+	with END and is padded to an even length. Repeated
+	options hold a tuple of values (tuples themselves 
+	if the format has several fields).
+	"""
+	END = 0
+
+	# possible options. formatted as:
+	# name, kind, value format, repeated
+	_values = (
+		# maximum segment size (SYN, SYNACK, ACK)
+		("MSS", 2, struct.Struct("<H"), False),
+		# segment size probe (NOP)
+		("PROBE", 3, struct.Struct("<H"), False),
+		# selective acknowledgement (ACK): ranges 
+		# (start, end) of seqs held by the receiver, 
+		# end excluded
+		("SACK", 5, struct.Struct("<II"), True),
+		# length of the message (NM), a hint
+		# for the receiver
+		("LENGTH", 6, struct.Struct("<Q"), False),
+		# fast open token (SYN, SYNACK). 0 in a SYN
+		# asks the server for one
+		("TOKEN", 7, struct.Struct("<Q"), False),
+		# receive window scale (SYN, SYNACK, ACK): the 
+		# recvWindow field of the sender's packets counts
+		# units of 2**SCALE bytes
+		("SCALE", 8, struct.Struct("<B"), False),
+		)
+
+	_byName = dict(map(lambda x: (x[0], x), _values))
+	_byKind = dict(map(lambda x: (x[1], x), _values))
+
+	@staticmethod
+	def pickle(options=None):
+		"""produces the options block for a dict of
+		option names and values
+		"""
+		b = bytearray()
+
+		if options:
+			for name, value in options.items():
+				name, kind, fmt, repeated = PacketOptions._byName[name]
+				b.append(kind)
+				if repeated:
+					b.append(2 + fmt.size * len(value))
+					for item in value:
+						b.extend(fmt.pack(*item))
+				else:
+					b.append(2 + fmt.size)
+					b.extend(fmt.pack(value))
+
+		b.append(PacketOptions.END)
+		if len(b) % 2:
+			b.append(PacketOptions.END)
+
+		return bytes(b)
+
+	@staticmethod
+	def unpickle(buffer, offset=0):
+		"""reads an options block from buffer starting at 
+		offset. Returns the options as a dict and the
+		length of the block. Unknown options are skipped.
+		"""
+		options = {}
+		pos = offset
+
+		while True:
+			kind = buffer[pos]
+			if kind == PacketOptions.END:
+				pos += 1
+				break
+
+			size = buffer[pos + 1]
+			if size < 2:
+				raise ValueError("invalid option length")
+
+			if kind in PacketOptions._byKind:
+				name, kind, fmt, repeated = PacketOptions._byKind[kind]
+				if repeated:
+					options[name] = tuple(map(
+						lambda p: fmt.unpack_from(buffer, p),
+						range(pos + 2, pos + size - fmt.size + 1, fmt.size)))
+				else:
+					options[name] = fmt.unpack_from(buffer, pos + 2)[0]
+			pos += size
+
+		length = pos - offset
+		if length % 2:
+			length += 1
+
+		return options, length
+
+class PacketTracer:
+	"""records an event for every packet sent or received
+	by a Socket (socket.tracer = PacketTracer()) into a 
+	bounded ring, so the most recent traffic can be dumped
+	on demand. Any object with a record(direction, header)
+	method can be used as a tracer.
+	"""
+
+	# directions
+	SEND = "send"
+	RECV = "recv"
+
+	# a traced packet
+	Event = namedtuple("Event", 
+		("timestamp", "direction", "seq", "ack", "attrs", "length"))
+
+	def __init__(self, size=4096, log=False):
+		# most recent events, oldest first
+		self.events = deque(maxlen=size)
+		# if True, events are also logged (DEBUG)
+		self.log = log
+
+	def record(self, direction, header):
+		"""records a packet header"""
+		event = PacketTracer.Event(time.time(), direction, 
+			header.seq, header.ack, header.attrs, header.length)
+		self.events.append(event)
+		if self.log:
+			logging.debug(PacketTracer.format(event))
+
+	def dump(self, file=None, clear=False):
+		"""writes the recorded events to file (default
+		stderr), oldest first, and returns them
+		"""
+		if file is None:
+			file = sys.stderr
+
+		events = list(self.events)
+		for event in events:
+			file.write(PacketTracer.format(event) + "\n")
+		if clear:
+			self.events.clear()
+		return events
+
+	@staticmethod
+	def format(event):
+		return "%.6f %s seq: %d, ack: %d, attrs: %s, length: %d" % (
+			event.timestamp, event.direction, event.seq, event.ack,
+			"|".join(PacketAttributes.unpickle(event.attrs)) or "-", 
+			event.length)
+
+	def __len__(self):
+		return len(self.events)
+
+class RecvRing:
+	"""preallocated ring buffer that datagrams are received
+	into (recvfrom_into), back to back. recv() waits for a 
+	datagram, then drains every datagram already queued on
+	the socket without blocking and returns them as a batch.
+	Received data are views into the ring, so they are only
+	valid until the ring wraps around onto them.
+	"""
+
+	def __init__(self, size=2**19, datagramSize=65507, maxBatch=256):
+		# largest datagram received without truncation
+		# (max UDP payload)
+		self.datagramSize = datagramSize
+		# maximum number of datagrams per batch
+		self.maxBatch = maxBatch
+		self._buffer = bytearray(max(size, datagramSize))
+		self._view = memoryview(self._buffer)
+		self._pos = 0
+
+	def recv(self, sock, selector, timeout=None):
+		"""waits up to timeout seconds (None waits forever)
+		for datagrams on the non-blocking socket sock, which
+		is registered with selector. Returns a list of 
+		(memoryview, addr). Raises socket.timeout if no 
+		datagram arrives.
+		"""
+		if timeout is not None:
+			deadline = time.monotonic() + timeout
+
+		batch = list()
+		size = len(self._buffer)
+		while not batch:
+			if not selector.select(timeout):
+				raise socket.timeout("timed out")
+
+			# drain the socket. A batch does not wrap
+			# around, so it never overwrites itself
+			while len(batch) < self.maxBatch:
+				if self._pos + self.datagramSize > size:
+					if batch:
+						break
+					self._pos = 0
+
+				view = self._view[self._pos : self._pos + self.datagramSize]
+				try:
+					n, addr = sock.recvfrom_into(view)
+				except (BlockingIOError, InterruptedError):
+					break
+				batch.append((view[:n], addr))
+				self._pos += n
+
+			if timeout is not None:
+				timeout = max(0, deadline - time.monotonic())
+
+		return batch
+
+class PacketPool:
+	"""freelist of Packet objects. Packets (and their
+	headers) released to the pool are reinitialized by 
+	acquire() instead of allocating new ones. A released
+	packet must not be used by its previous owner.
+	"""
+
+	def __init__(self, size=1024):
+		# maximum number of free packets kept
+		self.size = size
+		self._free = list()
+
+	def acquire(self, data="", options=None, **fields):
+		"""returns a packet with the given data, options
+		and header fields (see Header)
+		"""
+		if self._free:
+			packet = self._free.pop()
+			packet.header.__init__(**fields)
+			packet.__init__(packet.header, data, options)
 		else:
-			submittedAttrs = list(attrs)
-			
-		attrList = []
-		pos = 0
-
-		# add attributes to list if they match
-		# an attribute offered in __values
-		for item in PacketAttributes._values:
-			if item in submittedAttrs:
-				byte = 0b1 << pos
-				attrList.append(byte)
-			pos += 1
-
-		# generate binary from array
-		if len(submittedAttrs) > 0:
-			if len(attrList) > 1:
-				byteStr = reduce(lambda x,y: x | y, 
-					attrList)
+			packet = Packet(Header(**fields), data, options)
+		return packet
+
+	def release(self, packet):
+		"""returns a packet to the pool"""
+		if len(self._free) < self.size:
+			# drop the reference to the data
+			packet.data = b""
+			self._free.append(packet)
+
+	def __len__(self):
+		return len(self._free)
+
+class SendWindow:
+	"""sender side of selective repeat. Keeps the packets 
+	in flight (sent but not acknowledged) in sequence 
+	order, each with its own retransmission deadline. 
+	It does no I/O: the caller sends what fill(), lost() 
+	and expired() return and passes in the ACKs it receives.
+	"""
+
+	# duplicate ACKs (or packets SACKed after a 
+	# packet) that make a packet lost
+	DUP_ACKS = 3
+
+	class Segment:
+		"""a packet in flight"""
+
+		__slots__ = ("packet", "sent", "deadline", "retransmits", 
+			"sacked", "lost")
+
+		def __init__(self, packet, sent, deadline):
+			self.packet = packet
+			# time.monotonic() value the packet was
+			# first sent at
+			self.sent = sent
+			# time.monotonic() value the packet is
+			# resent at unless it is acknowledged
+			self.deadline = deadline
+			# number of times the packet was resent
+			self.retransmits = 0
+			# True once the receiver reported holding
+			# the packet (SACK). It is not resent
+			self.sacked = False
+			# True once the packet was found lost and
+			# fast retransmitted (only done once)
+			self.lost = False
+
+	def __init__(self, segments, size=1, pool=None, rtt=None, 
+		congestionControl=None):
+		# iterator of the packets to send, in order
+		self.segments = segments
+		# maximum number of packets in flight
+		self.size = size
+		# pool acknowledged packets are released to
+		self.pool = pool
+		# round trip time estimator. Timers expire
+		# after its retransmission timeout
+		self.rtt = rtt or RttEstimator()
+		# congestion controller (None: the window
+		# is always size packets)
+		self.congestionControl = congestionControl
+		# seq -> Segment, oldest first
+		self._inFlight = OrderedDict()
+		self._exhausted = False
+		# next packet, taken from segments before the 
+		# window has room for it (see _peek)
+		self._next = None
+		# ACKs in a row that acknowledged nothing new,
+		# and the receive window (bytes) the last ACK
+		# advertised
+		self._dupAcks = 0
+		self._advertised = None
+		# seq of the newest packet in flight when a 
+		# loss was found. Until it is acknowledged,
+		# later losses belong to the same window
+		self._recover = None
+		# receive window advertised by the peer (packets,
+		# from the oldest one not acknowledged). None: 
+		# no limit
+		self.peerWindow = None
+		# zero window probes the peer has not answered,
+		# and when the next one is due while the peer has
+		# no room and nothing is in flight (persist timer)
+		self._probes = 0
+		self._probeAt = None
+		# resends of a packet (or unanswered probes) before
+		# the peer is given up on (None: no limit). As they
+		# back off, the peer is given up on sooner: once it
+		# was silent for as long as resendLimit timeouts
+		# take without backoff (see failed)
+		self.resendLimit = None
+		self._giveUpAt = None
+
+	@property
+	def done(self):
+		"""True once every packet has been acknowledged"""
+		return not self._inFlight and self._peek() is None
+
+	@property
+	def window(self):
+		"""number of packets that may be in flight: the 
+		smallest of size, the congestion window and the
+		peer's receive window"""
+		window = self.size
+		if self.congestionControl is not None:
+			window = max(1, min(window, self.congestionControl.window))
+		if self.peerWindow is not None:
+			window = min(window, self.peerWindow)
+		return window
+
+	@property
+	def retransmits(self):
+		"""most times any packet in flight was resent, or
+		zero window probes went unanswered"""
+		return max(max((s.retransmits for s in self._inFlight.values()), 
+			default=0), self._probes)
+
+	def fill(self, now):
+		"""returns the next packets, as many as fit in the
+		window, sent at now (time.monotonic()). Their
+		timers are started.
+		"""
+		deadline = now + self.rtt.rto
+		window = self.window
+		packets = list()
+		while len(self._inFlight) < window:
+			packet = self._peek()
+			if packet is None:
+				break
+			self._next = None
+			self._inFlight[packet.header.seq] = SendWindow.Segment(
+				packet, now, deadline)
+			packets.append(packet)
+
+		if packets and len(self._inFlight) >= window:
+			# the window is full, nothing more is sent
+			# until this packet is acknowledged
+			packet = packets[-1]
+			packet.update(attrs=packet.header.attrs | 
+				PacketAttributes.ACKNOW)
+		return packets
+
+	def _peek(self):
+		"""returns the next packet to send, without taking
+		it (None once segments is exhausted). A closed 
+		window tells whether anything is left to send this
+		way.
+		"""
+		if self._next is None and not self._exhausted:
+			self._next = next(self.segments, None)
+			self._exhausted = self._next is None
+		return self._next
+
+	def probe(self, now):
+		"""returns True if a zero window probe is to be 
+		sent at now: the peer has no room, and nothing is
+		in flight whose ACK would tell when it has. Probes
+		are sent a retransmission timeout apart, backing 
+		off while they go unanswered.
+		"""
+		if self.peerWindow != 0 or self._inFlight or self._peek() is None:
+			self._probeAt = None
+			return False
+		if self._probeAt is None:
+			self._probeAt = now + self.rtt.rto
+		if now < self._probeAt:
+			return False
+		self._silent(now)
+		self._probes += 1
+		self._probeAt = now + min(self.rtt.rto * 2 ** min(self._probes, 8), 
+			RttEstimator.MAX_RTO)
+		return True
+
+	def lost(self, now):
+		"""returns the packets found lost before their timers
+		expired, to be resent at now (fast retransmit), and 
+		restarts their timers. A packet is lost once DUP_ACKS
+		packets after it were SACKed, or, for the oldest 
+		packet, after DUP_ACKS duplicate ACKs. Each packet is
+		fast retransmitted once, later on its timer.
+		"""
+		segments = list()
+		sacked = 0
+		for segment in reversed(self._inFlight.values()):
+			if segment.sacked:
+				sacked += 1
+			elif sacked >= SendWindow.DUP_ACKS and not segment.lost:
+				segments.append(segment)
+
+		if self._inFlight and self._dupAcks >= SendWindow.DUP_ACKS:
+			head = next(iter(self._inFlight.values()))
+			if not head.lost and head not in segments:
+				segments.append(head)
+		if not segments:
+			return segments
+
+		# one reduction per window of data
+		if self._recover is None:
+			self._recover = next(reversed(self._inFlight))
+			if self.congestionControl is not None:
+				self.congestionControl.onLoss(now)
+
+		segments.reverse()
+		deadline = now + self.rtt.rto
+		for segment in segments:
+			segment.lost = True
+			segment.deadline = deadline
+			segment.retransmits += 1
+		return list(map(lambda s: s.packet, segments))
+
+	def expired(self, now):
+		"""returns the packets whose timers expired at now,
+		to be resent, and restarts their timers. The 
+		timeout backs off when the oldest packet expires.
+		"""
+		segments = list(filter(
+			lambda s: s.deadline <= now and not s.sacked, 
+			self._inFlight.values()))
+		if not segments:
+			return segments
+
+		if segments[0] is next(iter(self._inFlight.values())):
+			self._silent(now)
+			self.rtt.backoff()
+			self._recover = next(reversed(self._inFlight))
+			if self.congestionControl is not None:
+				self.congestionControl.onTimeout(now)
+
+		deadline = now + self.rtt.rto
+		for segment in segments:
+			segment.deadline = deadline
+			segment.retransmits += 1
+		return list(map(lambda s: s.packet, segments))
+
+	def _silent(self, now):
+		"""the peer did not answer in time (the oldest 
+		packet expired, or a probe is due): starts the time
+		it is given up after unless it already runs"""
+		if self._giveUpAt is None and self.resendLimit is not None:
+			self._giveUpAt = now + self.rtt.budget(self.resendLimit)
+
+	def failed(self, now):
+		"""returns True if the peer is given up on at now: 
+		a packet was resent or probes went unanswered more 
+		than resendLimit times, or it was silent for as long
+		as resendLimit timeouts take without backoff
+		"""
+		if self.resendLimit is None:
+			return False
+		return (self.retransmits > self.resendLimit or 
+			self._giveUpAt is not None and now >= self._giveUpAt)
+
+	def deadline(self):
+		"""returns the earliest deadline of the packets in
+		flight, or of the next zero window probe (None if
+		there are none), or when the peer is given up on
+		"""
+		deadline = min((s.deadline for s in self._inFlight.values()
+			if not s.sacked), default=self._probeAt)
+		if self._giveUpAt is not None and deadline is not None:
+			deadline = min(deadline, self._giveUpAt)
+		return deadline
+
+	def ack(self, ackNum, now, advertised=None, data=False):
+		"""cumulative ACK, received at now: removes every 
+		packet sent before ackNum (the seq the receiver 
+		expects next). Returns the number of packets removed.
+		The newest of them gives a round trip time sample,
+		unless one of them was resent (Karn's algorithm). An
+		ACK for the oldest packet again is a duplicate ACK,
+		unless it carries data or advertises a receive window
+		(advertised, bytes) other than the last ACK did (a 
+		window update).
+		"""
+		update = (data or advertised is not None and 
+			advertised != self._advertised)
+		if advertised is not None:
+			self._advertised = advertised
+		acked = 0
+		resent = False
+		newest = None
+		inFlight = self._inFlight
+		# the peer answers
+		self._probes = 0
+		self._giveUpAt = None
+		while inFlight:
+			seq = next(iter(inFlight))
+			if WrapableNum.diff(seq, ackNum) >= 0:
+				break
+			segment = inFlight.pop(seq)
+			resent = resent or segment.retransmits > 0
+			newest = segment.sent
+			if self.pool is not None:
+				self.pool.release(segment.packet)
+			acked += 1
+
+		if not acked:
+			if (inFlight and next(iter(inFlight)) == ackNum and 
+				not update):
+				self._dupAcks += 1
+			return acked
+
+		self._dupAcks = 0
+		if (self._recover is not None and 
+			WrapableNum.diff(ackNum, self._recover) > 0):
+			# the window the loss was in is acknowledged
+			self._recover = None
+
+		self.rtt.acked()
+		if not resent:
+			self.rtt.sample(now - newest)
+
+		cc = self.congestionControl
+		if cc is not None:
+			cc.onAck(acked, now, self.rtt)
+			# the window is limited by size, so 
+			# it does not grow past it either
+			cc.limit(self.size)
+		return acked
+
+	def sack(self, blocks):
+		"""selective ACK: marks the packets in blocks, 
+		ranges (start, end) of seqs held by the receiver,
+		so they are not resent. They stay in flight until
+		a cumulative ACK covers them.
+		"""
+		for segment in self._inFlight.values():
+			seq = segment.packet.header.seq
+			for start, end in blocks:
+				if (WrapableNum.diff(seq, start) >= 0 and 
+					WrapableNum.diff(seq, end) < 0):
+					segment.sacked = True
+					break
+
+	def __len__(self):
+		return len(self._inFlight)
+
+class RttEstimator:
+	"""round trip time estimator (RFC 6298). Keeps the
+	smoothed round trip time (srtt) and its variation 
+	(rttvar) and derives the retransmission timeout (rto)
+	from them. rto doubles on every timeout (backoff) 
+	until new data are acknowledged. Samples must not be
+	taken from packets that were resent (Karn's algorithm).
+	"""
+
+	# gains of srtt and rttvar
+	ALPHA = 1 / 8
+	BETA = 1 / 4
+	# rttvar weight in rto
+	K = 4
+	# rto before the first sample (seconds)
+	INITIAL_RTO = 1.0
+	# bounds of rto (seconds)
+	MIN_RTO = 0.02
+	MAX_RTO = 60.0
+	# clock granularity (seconds)
+	GRANULARITY = 0.001
+
+	def __init__(self, initial=None):
+		self.reset(initial)
+
+	def reset(self, initial=None):
+		"""forgets all samples. rto starts at initial
+		(default INITIAL_RTO)
+		"""
+		self.srtt = None
+		self.rttvar = None
+		# rto without backoff
+		self._rto = initial or RttEstimator.INITIAL_RTO
+		# longest time the peer delays an ACK (seconds), 
+		# added to rto so delayed ACKs do not time out
+		self.ackDelay = 0
+		# number of times rto was doubled
+		self.backoffs = 0
+		# number of samples taken
+		self.samples = 0
+
+	@property
+	def rto(self):
+		"""retransmission timeout (seconds)"""
+		return min(RttEstimator.MAX_RTO, 
+			(self._rto + self.ackDelay) * (1 << self.backoffs))
+
+	def sample(self, rtt):
+		"""adds a round trip time sample (seconds)"""
+		if self.srtt is None:
+			self.srtt = rtt
+			self.rttvar = rtt / 2
+		else:
+			self.rttvar = ((1 - RttEstimator.BETA) * self.rttvar + 
+				RttEstimator.BETA * abs(self.srtt - rtt))
+			self.srtt = ((1 - RttEstimator.ALPHA) * self.srtt + 
+				RttEstimator.ALPHA * rtt)
+		self.samples += 1
+
+		rto = self.srtt + max(RttEstimator.GRANULARITY, 
+			RttEstimator.K * self.rttvar)
+		self._rto = min(RttEstimator.MAX_RTO, 
+			max(RttEstimator.MIN_RTO, rto))
+		self.backoffs = 0
+
+	def budget(self, limit):
+		"""returns how long (seconds) limit timeouts take
+		without backoff. A peer that does not answer for 
+		that long is given up on"""
+		return limit * min(RttEstimator.MAX_RTO, 
+			self._rto + self.ackDelay)
+
+	def resends(self, limit):
+		"""returns the number of timeouts, backing off from
+		rto, that fit in the budget of limit timeouts (at
+		least one). With backoff, limit timeouts would take
+		far longer than a peer is waited for.
+		"""
+		budget = self.budget(limit)
+		rto = budget / limit
+		count = 0
+		while count < limit and rto <= budget:
+			budget -= rto
+			rto = min(RttEstimator.MAX_RTO, rto * 2)
+			count += 1
+		return max(1, count)
+
+	def backoff(self):
+		"""doubles rto after a timeout"""
+		if self.rto < RttEstimator.MAX_RTO:
+			self.backoffs += 1
+
+	def acked(self):
+		"""drops the backoff once new data are 
+		acknowledged (the path delivers again)
+		"""
+		self.backoffs = 0
+
+class CongestionControl:
+	"""congestion controller interface. SendWindow reports
+	every ACK, loss and timeout, and the controller sets 
+	the congestion window (cwnd, in packets) that limits
+	the packets in flight. Controllers keep their state
+	per connection (reset() starts a new one). This base
+	class never limits the window.
+	"""
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		"""starts a new connection"""
+		self.cwnd = float("inf")
+
+	@property
+	def window(self):
+		"""number of packets that may be in flight"""
+		if self.cwnd == float("inf"):
+			return sys.maxsize
+		return int(self.cwnd)
+
+	def limit(self, size):
+		"""caps cwnd to size packets (the sender window)"""
+		self.cwnd = min(self.cwnd, size)
+
+	def onAck(self, acked, now, rtt):
+		"""acked packets were acknowledged at now (time.monotonic()).
+		rtt is the connection's RttEstimator.
+		"""
+		pass
+
+	def onLoss(self, now):
+		"""a packet was found lost and resent before its
+		timer expired. Called once per window of data
+		"""
+		pass
+
+	def onTimeout(self, now):
+		"""the timer of the oldest packet in flight expired"""
+		pass
+
+class Reno(CongestionControl):
+	"""slow start and AIMD congestion avoidance (RFC 5681):
+	cwnd grows by a packet per packet acknowledged up to 
+	ssthresh, then by a packet per window, and is halved 
+	on loss. A timeout restarts slow start.
+	"""
+
+	# cwnd at the start of a connection (packets)
+	INITIAL_WINDOW = 4
+	# smallest ssthresh (packets)
+	MIN_WINDOW = 2
+
+	def reset(self):
+		self.cwnd = Reno.INITIAL_WINDOW
+		self.ssthresh = float("inf")
+
+	def onAck(self, acked, now, rtt):
+		if self.cwnd < self.ssthresh:
+			# slow start
+			grow = min(acked, self.ssthresh - self.cwnd)
+			self.cwnd += grow
+			acked -= grow
+		# congestion avoidance
+		self.cwnd += acked / self.cwnd
+
+	def onLoss(self, now):
+		self.ssthresh = max(self.cwnd / 2, Reno.MIN_WINDOW)
+		self.cwnd = self.ssthresh
+
+	def onTimeout(self, now):
+		self.ssthresh = max(self.cwnd / 2, Reno.MIN_WINDOW)
+		self.cwnd = 1
+
+class Cubic(Reno):
+	"""CUBIC congestion avoidance (RFC 8312). After a loss
+	cwnd follows a cubic function of the time since the 
+	loss, which plateaus around the window the loss 
+	happened at (wMax), so it refills high bandwidth-delay
+	paths faster than Reno. It never grows slower than 
+	Reno would (TCP friendly region). Slow start is Reno's.
+	"""
+
+	# scaling constant (packets / second^3)
+	C = 0.4
+	# multiplicative decrease factor
+	BETA = 0.7
+
+	def reset(self):
+		Reno.reset(self)
+		# window before the last reduction
+		self.wMax = 0
+		# start of the current avoidance epoch
+		self._epoch = None
+		self._k = 0
+		self._origin = 0
+		# window Reno would have (TCP friendly region)
+		self._wEst = 0
+
+	def onAck(self, acked, now, rtt):
+		if self.cwnd < self.ssthresh:
+			Reno.onAck(self, acked, now, rtt)
+			return
+
+		if self._epoch is None:
+			self._epoch = now
+			self._wEst = self.cwnd
+			if self.cwnd < self.wMax:
+				self._k = ((self.wMax - self.cwnd) / Cubic.C) ** (1 / 3)
+				self._origin = self.wMax
 			else:
-				byteStr = attrList[0]
+				self._k = 0
+				self._origin = self.cwnd
+
+		# target window one round trip time ahead
+		t = now - self._epoch + (rtt.srtt or 0)
+		target = self._origin + Cubic.C * (t - self._k) ** 3
+
+		if target > self.cwnd:
+			self.cwnd += (target - self.cwnd) / self.cwnd * acked
 		else:
-			byteStr = 0
-		
-		return byteStr
+			self.cwnd += 0.01 * acked / self.cwnd
 
-	@staticmethod
-	def unpickle(byteStr):
-		"""creates an instance of PacketAttributes from
-		a pickled instance (byte string)
+		self._wEst += (3 * (1 - Cubic.BETA) / (1 + Cubic.BETA) * 
+			acked / self.cwnd)
+		self.cwnd = max(self.cwnd, self._wEst)
+
+	def _reduce(self):
+		# fast convergence: release bandwidth to new
+		# flows if the window keeps shrinking
+		if self.cwnd < self.wMax:
+			self.wMax = self.cwnd * (1 + Cubic.BETA) / 2
+		else:
+			self.wMax = self.cwnd
+		self.ssthresh = max(self.cwnd * Cubic.BETA, Reno.MIN_WINDOW)
+		self._epoch = None
+
+	def onLoss(self, now):
+		self._reduce()
+		self.cwnd = self.ssthresh
+
+	def onTimeout(self, now):
+		self._reduce()
+		self.cwnd = 1
+
+class DelayedAck:
+	"""receiver ACK policy. In order packets are acknowledged
+	every `every` packets, or delay seconds after the first
+	packet not acknowledged arrived. Anything else that needs
+	an ACK (gaps, duplicates, the end of a message, packets 
+	with ACKNOW) is acknowledged at once. The caller sends 
+	the ACK when due() and reports it with sent().
+	"""
+
+	def __init__(self, every=2, delay=0.01):
+		self.every = every
+		self.delay = delay
+		self.sent()
+
+	def add(self, now):
+		"""an in order packet was received at now"""
+		self.pending += 1
+		if self.deadline is None:
+			self.deadline = now + self.delay
+		if self.pending >= self.every:
+			self._due = True
+
+	def urgent(self):
+		"""an ACK is due at once"""
+		self._due = True
+
+	def due(self, now):
+		"""returns True if an ACK should be sent at now"""
+		return self._due or (self.deadline is not None and 
+			now >= self.deadline)
+
+	def sent(self):
+		"""an ACK (for every packet received) was sent"""
+		# in order packets not acknowledged
+		self.pending = 0
+		# time.monotonic() value the ACK is due at
+		self.deadline = None
+		self._due = False
+
+class TimerWheel:
+	"""hierarchical timing wheel. Time is counted in ticks
+	of tick seconds, and a timer is hashed into a slot by
+	the tick it expires at: level 0 has a slot per tick of
+	its rotation, and every level above a slot per rotation
+	of the level below. When a slot of a higher level comes
+	up, its timers move down a level (cascade) until they
+	reach level 0 and fire. schedule() and cancel() are 
+	O(1); advance() skips the ticks without work and does
+	constant work per timer it moves or fires. It does no
+	I/O: 
+	the caller advances it to the current time and sleeps
+	until nextDeadline().
+	"""
+
+	class Timer:
+		"""a timer armed in a TimerWheel"""
+
+		__slots__ = ("wheel", "deadline", "callback", "args", 
+			"_tick", "_slot")
+
+		def __init__(self, wheel, deadline, callback, args):
+			self.wheel = wheel
+			# time.monotonic() value the timer fires at
+			self.deadline = deadline
+			# called with args when the timer fires
+			self.callback = callback
+			self.args = args
+			# tick the timer fires at, and the slot (a set)
+			# that holds it. None once it fired or was
+			# cancelled
+			self._tick = None
+			self._slot = None
+
+		@property
+		def armed(self):
+			"""True until the timer fires or is cancelled"""
+			return self._slot is not None
+
+		def cancel(self):
+			"""disarms the timer. Returns False if it fired 
+			or was cancelled already.
+			"""
+			slot = self._slot
+			if slot is None:
+				return False
+			slot.discard(self)
+			self._slot = None
+			self.wheel._count -= 1
+			return True
+
+	def __init__(self, tick=0.001, bits=8, levels=4, now=None):
+		if now is None:
+			now = time.monotonic()
+		# length of a tick (seconds)
+		self.tick = tick
+		# a rotation of every level has 2**bits slots
+		self._bits = bits
+		self._mask = (1 << bits) - 1
+		self._levels = [[set() for i in range(1 << bits)] 
+			for level in range(levels)]
+		# timers beyond the rotation of the top level
+		self._overflow = set()
+		# the tick advance() reached. The timers of every
+		# tick up to it have fired
+		self._current = int(now / tick)
+		# number of timers armed
+		self._count = 0
+
+	def schedule(self, deadline, callback, *args):
+		"""arms a timer that calls callback(*args) once 
+		advance() reaches deadline (a time.monotonic() 
+		value). Returns the Timer.
+		"""
+		timer = TimerWheel.Timer(self, deadline, callback, args)
+		# a timer never fires before its deadline, and one
+		# already due fires on the next tick
+		timer._tick = max(self._current + 1, 
+			int(math.ceil(deadline / self.tick)))
+		self._insert(timer)
+		self._count += 1
+		return timer
+
+	def _insert(self, timer):
+		"""puts timer in the slot of its tick on the lowest
+		level whose current rotation holds that tick"""
+		tick = timer._tick
+		current = self._current
+		bits = self._bits
+		slot = self._overflow
+		for level, slots in enumerate(self._levels):
+			shift = bits * (level + 1)
+			if tick >> shift == current >> shift:
+				slot = slots[(tick >> (bits * level)) & self._mask]
+				break
+		slot.add(timer)
+		timer._slot = slot
+
+	def advance(self, now):
+		"""fires the timers due at now (a time.monotonic()
+		value), in no particular order. Callbacks may arm
+		and cancel timers. Returns the number of timers
+		fired.
 		"""
-		attrs = list()
-		pos = 0
+		target = int(now / self.tick)
+		fired = 0
+		mask = self._mask
+		slots = self._levels[0]
+		while self._current < target:
+			current = self._nextTick()
+			if current is None or current > target:
+				# nothing to fire or move until target
+				self._current = target
+				break
+			self._current = current
+			if not current & mask:
+				self._cascade(current)
+
+			slot = slots[current & mask]
+			while slot:
+				timer = slot.pop()
+				timer._slot = None
+				self._count -= 1
+				timer.callback(*timer.args)
+				fired += 1
+		return fired
+
+	def _cascade(self, current):
+		"""moves the timers of the slots that come up at 
+		tick current (where level 0 starts a rotation) down,
+		from the highest level
+		"""
+		bits = self._bits
+		levels = self._levels
+		# levels 1 .. top-1 start their slot at current
+		top = 1
+		while (top < len(levels) and 
+			not current & ((1 << (bits * top)) - 1)):
+			top += 1
+
+		moving = list()
+		if top == len(levels) and not current & ((1 << (bits * top)) - 1):
+			# the top level starts a rotation
+			moving.extend(self._overflow)
+			self._overflow.clear()
+		for level in range(top - 1, 0, -1):
+			slot = levels[level][(current >> (bits * level)) & self._mask]
+			moving.extend(slot)
+			slot.clear()
+		for timer in moving:
+			self._insert(timer)
+
+	def nextDeadline(self):
+		"""returns the time.monotonic() value advance() has
+		work at next: the tick the next timer fires at, or 
+		the tick its slot cascades at if it is on a higher
+		level. None if no timer is armed.
+		"""
+		tick = self._nextTick()
+		if tick is None:
+			return None
+		return tick * self.tick
+
+	def _nextTick(self):
+		"""returns the tick advance() has work at next
+		(see nextDeadline), None if no timer is armed"""
+		if not self._count:
+			return None
+
+		current = self._current
+		bits = self._bits
+		mask = self._mask
+		for level, slots in enumerate(self._levels):
+			shift = bits * level
+			# the slots up to the current one are empty:
+			# their timers fired or moved down
+			for index in range(((current >> shift) & mask) + 1, mask + 1):
+				if slots[index]:
+					rotation = current >> (shift + bits) << (shift + bits)
+					return rotation | index << shift
+
+		# only timers beyond the top level are armed
+		shift = bits * len(self._levels)
+		return ((current >> shift) + 1) << shift
+
+	def __len__(self):
+		return self._count
+
+class ReorderBuffer:
+	"""receiver side of selective repeat. Holds packets 
+	that arrived out of order (after a gap), keyed by seq,
+	until the packets before them arrive. At most size 
+	bytes of data are held.
+	"""
 
-		# check each bit in the byte string
-		for item in PacketAttributes._values: 
-			if (byteStr >> pos & 1):
-				attrs.append(item)
-			pos += 1
+	def __init__(self, size=Packet.MAX_WINDOW_SIZE):
+		# maximum number of bytes held
+		self.size = size
+		# bytes held
+		self.length = 0
+		# seq -> Packet
+		self._held = dict()
+
+	def add(self, packet):
+		"""holds a packet. Its data is copied (received 
+		data are views into the receive ring). Returns 
+		False if the packet is already held or there is
+		no room for it.
+		"""
+		seq = packet.header.seq
+		length = len(packet.data)
+		if seq in self._held or self.length + length > self.size:
+			return False
 
-		return tuple(attrs)
+		packet.data = bytes(packet.data)
+		packet._opts = bytes(packet._opts)
+		self._held[seq] = packet
+		self.length += length
+		return True
 
-	def __str__(self):
-		return repr(self.attrs)
+	def pop(self, seq):
+		"""removes and returns the packet with seq (None
+		if it is not held)
+		"""
+		packet = self._held.pop(seq, None)
+		if packet is not None:
+			self.length -= len(packet.data)
+		return packet
+
+	def blocks(self, base, limit=None):
+		"""returns the ranges (start, end) of held seqs,
+		end excluded, in order from base (the next seq 
+		expected). At most limit ranges are returned.
+		"""
+		seqs = sorted(self._held, 
+			key=lambda seq: WrapableNum.diff(seq, base))
+
+		blocks = list()
+		for seq in seqs:
+			if blocks and blocks[-1][1] == seq:
+				blocks[-1][1] = (seq + 1) % Packet.MAX_SEQ_NUM
+			elif limit is not None and len(blocks) == limit:
+				break
+			else:
+				blocks.append([seq, (seq + 1) % Packet.MAX_SEQ_NUM])
+		return tuple(map(tuple, blocks))
+
+	def clear(self):
+		self._held.clear()
+		self.length = 0
+
+	def __len__(self):
+		return len(self._held)
 
 class WrapableNum:
 	""" houses a number that increments when it is read.
@@ -998,7 +4990,7 @@ class WrapableNum:
 
 	def reset(self, value=None):
 		if value is None:
-			initial = random.randint(0, Packet.MAX_SEQ_NUM)
+			initial = random.randrange(0, Packet.MAX_SEQ_NUM)
 			self.num = initial
 		else:
 			self.num = value
@@ -1007,9 +4999,20 @@ class WrapableNum:
 		# wrap around if max 
 		# has been reached
 		self.num += self.step
-		if self.num > self.max:
+		if self.num >= self.max:
 			self.num = 0
 		return self.num	
 
+	@staticmethod
+	def diff(a, b, max=Packet.MAX_SEQ_NUM):
+		"""returns a - b for numbers that wrap around at
+		max: negative if a comes before b, positive if it
+		comes after (within half of max of each other)
+		"""
+		d = (a - b) % max
+		if d >= max // 2:
+			d -= max
+		return d
+
 	def __str__(self):
 		return str(self.num)
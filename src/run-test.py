@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+#
+# usage: ./run-test.py [-d] [INDEX...]
+# unit tests for lib/rxp.py. They need no NetEmu (the
+# connection tests run over 127.0.0.1),
+# INDEX runs a single test (all by default)
+
+from test import *
+import logging
+import sys
+import getopt
+
+opts, args = getopt.getopt(sys.argv[1:], "d")
+
+if opts and "-d" in opts[0]:
+	logging.basicConfig(level=logging.DEBUG)
+else:
+	logging.basicConfig(level=logging.INFO)
+
+# set up tests
+tester = Test()
+tester.add(testChecksum) # 0
+tester.add(testChecksumExtremes) # 1
+tester.add(testChecksumUpdate) # 2
+tester.add(testSendWindowAck) # 3
+tester.add(testSendWindowSack) # 4
+tester.add(testSendWindowExpiry) # 5
+tester.add(testReorderBuffer) # 6
+tester.add(testResendBudget) # 7
+tester.add(testDuplicateAcks) # 8
+tester.add(testSegments) # 9
+tester.add(testTimerWheel) # 10
+tester.add(testShortDatagrams) # 11
+tester.add(testBacklog) # 12
+tester.add(testPeerReuse) # 13
+tester.add(testLostFinalAck) # 14
+tester.add(testListenerClose) # 15
+tester.add(testSynCookies) # 16
+tester.add(testFastOpen) # 17
+tester.add(testAsyncLoopback) # 18
+tester.add(testSlowReader) # 19
+tester.add(testWindowProbe) # 20
+tester.add(testRecvTimeout) # 21
+tester.add(testResendLimit) # 22
+tester.add(testReno) # 23
+tester.add(testCubic) # 24
+tester.add(testDelayedAck) # 25
+tester.add(testFullDuplex) # 26
+tester.add(testHeaderCodec) # 27
+tester.add(testOptionsCodec) # 28
+tester.add(testMssNegotiation) # 29
+
+# run tests
+if args:
+	for index in args:
+		tester.run(index=int(index))
+else:
+	tester.run()
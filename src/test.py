@@ -0,0 +1,1475 @@
+from lib.rxp import *
+import asyncio
+import io
+import math
+import logging
+import os
+import sys
+import random
+import socket
+import struct
+import threading
+import time
+import types
+
+class Test:
+
+	def __init__(self):
+		self.tests = list()
+
+	def add(self, func, *args):
+		self.tests.append((func, args))
+
+	def run(self, test=None, args=(), index=None):
+
+		if test is not None:
+			logging.info(test.__name__ + "...")
+			success = test(*args)
+			logging.info("...done")
+			assert success
+		elif index is not None:
+			self.run(
+				test=self.tests[index][0],
+				args=self.tests[index][1])
+		else:
+			self.runAll()
+
+	def runAll(self):
+		for test in self.tests:
+			self.run(
+				test=test[0],
+				args=test[1])
+
+def rfc1071(data):
+	"""reference RFC 1071 checksum of data: one's
+	complement of the one's complement sum of its little
+	endian 16 bit words (an odd length is padded with a
+	zero byte)"""
+	if len(data) % 2:
+		data = bytes(data) + b"\x00"
+	s = 0
+	for (word,) in struct.iter_unpack("<H", data):
+		s += word
+		s = (s & 0xffff) + (s >> 16)
+	return ~s & 0xffff
+
+def wireChecksum(packet):
+	"""returns the RFC 1071 checksum of a pickled packet,
+	summed with its checksum field set to 0"""
+	wire = bytearray(packet.pickle())
+	index = Header.NAMES.index("checksum")
+	offset = sum(map(lambda x: x[2], Header.FIELDS[:index]))
+	wire[offset:offset+2] = b"\x00\x00"
+	return rfc1071(wire)
+
+def testChecksum(sizes=(0, 1, 2, 3, 63, 64, 1449, 1450), seed=3251):
+	"""tests Packet._checksum against the RFC 1071
+	reference, for odd and even payloads, with and
+	without options"""
+
+	rng = random.Random(seed)
+	assertions = []
+
+	for size in sizes:
+		for options in (None, {"LENGTH": size}, {"SACK": ((1, 5), (9, 12))}):
+			data = bytes(rng.getrandbits(8) for i in range(size))
+			header = Header(
+				srcPort=rng.getrandbits(16),
+				destPort=rng.getrandbits(16),
+				seq=rng.getrandbits(32),
+				ack=rng.getrandbits(32),
+				recvWindow=rng.getrandbits(16),
+				attrs=PacketAttributes.NM | PacketAttributes.EOM
+				)
+			p = Packet(header, data, options)
+			assertions.append(p.header.checksum == wireChecksum(p))
+			assertions.append(Packet.unpickle(p.pickle()).verify())
+
+	return all(assertions)
+
+def testChecksumExtremes():
+	"""tests the checksum of packets whose words sum to
+	0 and to multiples of 0xffff (the end around carry
+	cases of RFC 1071)"""
+
+	assertions = []
+
+	for fill in (0x00, 0xff):
+		header = Header(
+			srcPort=0xffff * (fill // 0xff),
+			destPort=0xffff * (fill // 0xff),
+			seq=0xffffffff * (fill // 0xff),
+			ack=0xffffffff * (fill // 0xff),
+			recvWindow=0xffff * (fill // 0xff)
+			)
+		for size in (0, 2, 1450):
+			p = Packet(header, bytes([fill]) * size)
+			assertions.append(p.header.checksum == wireChecksum(p))
+			assertions.append(Packet.unpickle(p.pickle()).verify())
+
+	return all(assertions)
+
+def testChecksumUpdate(seed=3251):
+	"""tests that Packet.update (RFC 1624) gives the
+	checksum of the updated packet, and that verify()
+	rejects a corrupted one"""
+
+	rng = random.Random(seed)
+	assertions = []
+
+	p = Packet(Header(seq=1, ack=2, recvWindow=3), os.urandom(101))
+	for i in range(200):
+		p.update(
+			seq=rng.getrandbits(32),
+			ack=rng.getrandbits(32),
+			recvWindow=rng.getrandbits(16))
+		assertions.append(p.header.checksum == wireChecksum(p))
+		assertions.append(p.header.checksum == p._checksum())
+
+	wire = bytearray(p.pickle())
+	wire[Header.LENGTH + 7] ^= 0x10
+	assertions.append(not Packet.unpickle(wire).verify())
+
+	return all(assertions)
+
+def makeSegments(first, count, size=10):
+	"""returns an iterator of count packets with size
+	bytes of data each, seqs from first (wrapping)"""
+	return iter([Packet(Header(seq=(first + i) % Packet.MAX_SEQ_NUM),
+		bytes(size)) for i in range(count)])
+
+def seqs(packets):
+	return list(map(lambda p: p.header.seq, packets))
+
+def testHeaderCodec(seed=3251, rounds=200):
+	"""tests that Header.pickle/unpickle (the precompiled
+	struct) round trip every field, match the wire layout
+	(little endian fields in FIELDS order) and truncate 
+	values to the size of their field"""
+
+	rng = random.Random(seed)
+	assertions = []
+
+	assertions.append(Header.LENGTH == 
+		sum(map(lambda field: field[2], Header.FIELDS)))
+
+	for i in range(rounds):
+		# values up to twice the size of each field
+		values = list(map(lambda field: 
+			rng.getrandbits(16 * field[2]), Header.FIELDS))
+		header = Header(*values)
+		wire = header.pickle()
+
+		layout = b"".join(map(lambda pair: 
+			(pair[1] & ((1 << (8 * pair[0][2])) - 1)).to_bytes(
+				pair[0][2], "little"), zip(Header.FIELDS, values)))
+		assertions.append(wire == layout)
+
+		decoded = Header.unpickle(wire)
+		assertions.append(list(map(lambda name: getattr(decoded, name), 
+			Header.NAMES)) == list(header._values()))
+
+		# in place, at an offset
+		buf = bytearray(Header.LENGTH + 3)
+		header.pack_into(buf, 3)
+		assertions.append(bytes(buf[3:]) == wire)
+		assertions.append(Header.unpack_from(memoryview(buf), 3)._values() ==
+			decoded._values())
+
+	fields = Header(seq=5).fields
+	fields["ack"] = 7
+	assertions.append(fields["seq"] == 5 and dict(fields)["ack"] == 7)
+
+	return all(assertions)
+
+def testOptionsCodec():
+	"""tests the options block: every option round trips
+	alone and together, unknown options are skipped, a
+	Packet with options and data round trips without 
+	copying its data, and malformed options (bad length,
+	no END, cut off value) leave the packet without 
+	options and failing verify()"""
+
+	assertions = []
+
+	every = {"MSS": 1400, "PROBE": 900, "SACK": ((3, 5), (8, 12)),
+		"LENGTH": 2 ** 40, "TOKEN": 2 ** 63 + 5, "SCALE": 7}
+	for options in [{name: value} for name, value in every.items()] + [every]:
+		block = PacketOptions.pickle(options)
+		assertions.append(len(block) % 2 == 0)
+		assertions.append(PacketOptions.unpickle(block) == 
+			(options, len(block)))
+		# at an offset, followed by data
+		decoded = PacketOptions.unpickle(b"xx" + block + b"data", 2)
+		assertions.append(decoded == (options, len(block)))
+
+	# an option of an unknown kind is skipped
+	block = bytes((99, 4, 1, 2)) + PacketOptions.pickle({"MSS": 600})
+	assertions.append(PacketOptions.unpickle(block) == 
+		({"MSS": 600}, len(block)))
+
+	header = Header(srcPort=1, destPort=2, seq=3, ack=4, 
+		attrs=PacketAttributes.ACK)
+	wire = bytearray(Packet(header, b"payload", 
+		{"SACK": ((3, 5),), "SCALE": 2}).pickle())
+	packet = Packet.unpickle(wire)
+	assertions.append(packet.verify())
+	assertions.append(packet.options == {"SACK": ((3, 5),), "SCALE": 2})
+	assertions.append(isinstance(packet.data, memoryview) and 
+		packet.data == b"payload" and packet.data.obj is wire)
+	assertions.append(Packet.unpickle(wire, toString=True).data == "payload")
+
+	start = Header.LENGTH
+	block = PacketOptions.pickle({"MSS": 600})
+	malformed = (
+		# an option length below 2
+		bytes((2, 1, 0, 0)),
+		# no END before the end of the datagram
+		bytes((99, 2)),
+		# the MSS value is cut off
+		bytes((2, 4, 1)),
+		)
+	sock = TestSocket()
+	for opts in malformed:
+		wire = bytearray(Packet(Header(attrs=PacketAttributes.ACK), 
+			options={"MSS": 600}).pickle())
+		wire[start:] = opts
+		packet = Packet.unpickle(wire)
+		assertions.append(packet.options == {})
+		assertions.append(not packet.verify())
+		try:
+			sock._packet(wire, checkSeq=False)
+			assertions.append(False)
+		except RxPException as e:
+			assertions.append(e.type == RxPException.INVALID_CHECKSUM)
+	sock.close()
+
+	return all(assertions)
+
+def testSendWindowAck(first=Packet.MAX_SEQ_NUM - 3):
+	"""tests SendWindow.fill and cumulative ACKs, with
+	seqs wrapping around"""
+
+	assertions = []
+	seq = lambda i: (first + i) % Packet.MAX_SEQ_NUM
+
+	window = SendWindow(makeSegments(first, 10), 4, rtt=RttEstimator(1.0))
+	sent = window.fill(0.0)
+	assertions.append(seqs(sent) == list(map(seq, range(4))))
+	# only the last packet of a full window asks for an ACK
+	assertions.append(sent[-1].checkAttrs(PacketAttributes.ACKNOW))
+	assertions.append(not sent[0].checkAttrs(PacketAttributes.ACKNOW))
+	assertions.append(window.fill(0.0) == [])
+
+	# an old ACK acknowledges nothing
+	assertions.append(window.ack(seq(-1), 0.1) == 0)
+	# acknowledges the packets before seq(3), across the wrap
+	assertions.append(window.ack(seq(3), 0.1) == 3)
+	assertions.append(len(window) == 1)
+	assertions.append(seqs(window.fill(0.1)) == list(map(seq, range(4, 7))))
+
+	assertions.append(window.ack(seq(7), 0.2) == 4)
+	assertions.append(seqs(window.fill(0.2)) == list(map(seq, range(7, 10))))
+	assertions.append(window.ack(seq(10), 0.3) == 3)
+	assertions.append(window.fill(0.3) == [])
+	assertions.append(window.done)
+
+	return all(assertions)
+
+def testSendWindowSack(first=Packet.MAX_SEQ_NUM - 2):
+	"""tests that SACKed packets are not resent, and that
+	a packet is fast retransmitted once DUP_ACKS packets
+	after it are SACKed, or after DUP_ACKS duplicate ACKs"""
+
+	assertions = []
+	seq = lambda i: (first + i) % Packet.MAX_SEQ_NUM
+
+	window = SendWindow(makeSegments(first, 8), 8, rtt=RttEstimator(1.0))
+	window.fill(0.0)
+
+	# 1 is missing, two packets after it are held
+	window.ack(seq(1), 0.1)
+	window.sack(((seq(2), seq(4)),))
+	assertions.append(window.lost(0.1) == [])
+	# three are held
+	window.sack(((seq(2), seq(5)),))
+	assertions.append(seqs(window.lost(0.1)) == [seq(1)])
+	# found lost only once
+	assertions.append(window.lost(0.1) == [])
+
+	# 1 was resent at 0.1, after the ACK took a 0.1 s
+	# sample (rto 0.3). SACKed packets do not expire
+	assertions.append(seqs(window.expired(0.5)) == [seq(1)])
+	assertions.append(seqs(window.expired(1.0)) == [seq(5), seq(6), seq(7)])
+
+	# the cumulative ACK removes the SACKed packets too
+	assertions.append(window.ack(seq(8), 1.2) == 7)
+	assertions.append(window.done)
+
+	window = SendWindow(makeSegments(first, 4), 4, rtt=RttEstimator(1.0))
+	window.fill(0.0)
+	window.ack(seq(1), 0.1)
+	# ACKs older than the oldest packet in flight
+	# are not duplicates
+	for i in range(SendWindow.DUP_ACKS):
+		window.ack(seq(0), 0.2)
+	assertions.append(window.lost(0.2) == [])
+	# duplicate ACKs for 1
+	for i in range(SendWindow.DUP_ACKS - 1):
+		window.ack(seq(1), 0.2)
+	assertions.append(window.lost(0.2) == [])
+	window.ack(seq(1), 0.2)
+	assertions.append(seqs(window.lost(0.2)) == [seq(1)])
+
+	return all(assertions)
+
+def testSendWindowExpiry():
+	"""tests retransmission timers: packets are resent
+	when their deadline passes, the timeout backs off when
+	the oldest one expires, and retransmits is counted"""
+
+	assertions = []
+
+	rtt = RttEstimator(1.0)
+	window = SendWindow(makeSegments(100, 3), 3, rtt=rtt)
+	window.fill(0.0)
+	assertions.append(window.deadline() == 1.0)
+	assertions.append(window.expired(0.999) == [])
+
+	assertions.append(seqs(window.expired(1.0)) == [100, 101, 102])
+	assertions.append(rtt.rto == 2.0)
+	assertions.append(window.deadline() == 3.0)
+	assertions.append(window.retransmits == 1)
+
+	assertions.append(seqs(window.expired(3.0)) == [100, 101, 102])
+	assertions.append(rtt.rto == 4.0)
+	assertions.append(window.retransmits == 2)
+
+	# no sample from resent packets (Karn), but the
+	# backoff is dropped
+	assertions.append(window.ack(101, 3.5) == 1)
+	assertions.append(rtt.samples == 0)
+	assertions.append(rtt.rto == 1.0)
+
+	return all(assertions)
+
+def testReorderBuffer(first=Packet.MAX_SEQ_NUM - 2):
+	"""tests that ReorderBuffer holds packets after a gap,
+	reports them as SACK blocks from the next seq expected,
+	and gives them back in order once the gap is filled,
+	with seqs wrapping around"""
+
+	assertions = []
+	seq = lambda i: (first + i) % Packet.MAX_SEQ_NUM
+	packets = list(makeSegments(first, 8))
+
+	buffer = ReorderBuffer(size=50)
+	# 0 is expected, 1, 3, 4 and 6 arrive
+	for i in (4, 1, 6, 3):
+		assertions.append(buffer.add(packets[i]))
+	assertions.append(not buffer.add(packets[3]))
+	assertions.append(buffer.length == 40)
+
+	assertions.append(buffer.blocks(seq(0)) == 
+		((seq(1), seq(2)), (seq(3), seq(5)), (seq(6), seq(7))))
+	assertions.append(buffer.blocks(seq(0), limit=2) == 
+		((seq(1), seq(2)), (seq(3), seq(5))))
+
+	# no room for a sixth packet of 10 bytes
+	assertions.append(buffer.add(packets[7]))
+	assertions.append(not buffer.add(packets[5]))
+
+	# 0 arrives: 1 follows, 2 is missing
+	delivered = [0]
+	while buffer.pop(seq(delivered[-1] + 1)) is not None:
+		delivered.append(delivered[-1] + 1)
+	assertions.append(delivered == [0, 1])
+	assertions.append(buffer.blocks(seq(2)) == 
+		((seq(3), seq(5)), (seq(6), seq(8))))
+
+	# 2 and 5 arrive and fill the gaps
+	assertions.append(buffer.add(packets[5]))
+	delivered = [2]
+	while buffer.pop(seq(delivered[-1] + 1)) is not None:
+		delivered.append(delivered[-1] + 1)
+	assertions.append(delivered == list(range(2, 8)))
+	assertions.append(len(buffer) == 0 and buffer.length == 0)
+	assertions.append(buffer.blocks(seq(8)) == ())
+
+	return all(assertions)
+
+def testResendBudget():
+	"""tests that resends backing off fit in the time
+	resendLimit timeouts take without backoff, and that
+	SendWindow gives up on a silent peer after that time
+	(but not while it answers)"""
+
+	assertions = []
+
+	for rto in (0.01, 0.2, 1.0, 30.0, 60.0):
+		rtt = RttEstimator(rto)
+		count = rtt.resends(100)
+		total = 0
+		for i in range(count):
+			total += rtt.rto
+			rtt.backoff()
+		assertions.append(total <= rtt.budget(100))
+		assertions.append(count == 100 or total + rtt.rto > rtt.budget(100))
+	assertions.append(RttEstimator(1.0).resends(1) == 1)
+
+	rtt = RttEstimator(1.0)
+	window = SendWindow(makeSegments(0, 1), 1, rtt=rtt)
+	window.resendLimit = 10
+	window.fill(0.0)
+	now = 0.0
+	while not window.failed(now):
+		window.expired(now)
+		now = window.deadline()
+	# silent for 10 timeouts of 1 s after the first one
+	assertions.append(now == 11.0)
+	assertions.append(window.retransmits < 10)
+
+	# a duplicate ACK shows the peer is alive
+	window = SendWindow(makeSegments(0, 2), 2, rtt=RttEstimator(1.0))
+	window.resendLimit = 10
+	window.fill(0.0)
+	window.expired(1.0)
+	window.ack(0, 9.0)
+	assertions.append(not window.failed(11.0))
+
+	return all(assertions)
+
+def testDuplicateAcks():
+	"""tests that only ACKs without data that leave the
+	advertised window unchanged count as duplicate ACKs
+	(window updates do not cause fast retransmits)"""
+
+	assertions = []
+
+	window = SendWindow(makeSegments(0, 8), 8, rtt=RttEstimator(1.0))
+	window.fill(0.0)
+	window.ack(1, 0.1, advertised=4096)
+
+	# the reader frees room: window updates
+	for advertised in (8192, 12288, 16384):
+		window.ack(1, 0.2, advertised=advertised)
+	# data from the peer (full duplex)
+	window.ack(1, 0.2, advertised=16384, data=True)
+	assertions.append(window.lost(0.2) == [])
+
+	for i in range(SendWindow.DUP_ACKS):
+		window.ack(1, 0.3, advertised=16384)
+	assertions.append(seqs(window.lost(0.3)) == [1])
+
+	return all(assertions)
+
+def testReno():
+	"""tests Reno: slow start doubles cwnd per window up 
+	to ssthresh, congestion avoidance adds a packet per
+	window, a loss halves cwnd and a timeout restarts 
+	slow start"""
+
+	assertions = []
+	rtt = RttEstimator()
+
+	reno = Reno()
+	assertions.append(reno.cwnd == Reno.INITIAL_WINDOW)
+	reno.onAck(4, 0.0, rtt)
+	assertions.append(reno.cwnd == 8 and reno.window == 8)
+
+	reno.onLoss(0.1)
+	assertions.append(reno.cwnd == 4 and reno.ssthresh == 4)
+	# a window of ACKs, one packet each
+	for i in range(4):
+		reno.onAck(1, 0.2, rtt)
+	assertions.append(4.8 < reno.cwnd < 5 and reno.window == 4)
+
+	# slow start stops at ssthresh
+	reno.onTimeout(0.3)
+	assertions.append(reno.cwnd == 1 and 2.4 < reno.ssthresh < 2.5)
+	reno.onAck(1, 0.4, rtt)
+	assertions.append(reno.cwnd == 2)
+	ssthresh = reno.ssthresh
+	reno.onAck(2, 0.4, rtt)
+	# the rest of the ACK grows it a packet per window
+	rest = 2 - (ssthresh - 2)
+	assertions.append(abs(reno.cwnd - (ssthresh + rest / ssthresh)) < 1e-9)
+
+	# ssthresh never drops below MIN_WINDOW
+	reno.onLoss(0.5)
+	reno.onLoss(0.5)
+	assertions.append(reno.ssthresh == Reno.MIN_WINDOW)
+
+	reno.limit(1)
+	assertions.append(reno.window == 1)
+	reno.reset()
+	assertions.append(reno.cwnd == Reno.INITIAL_WINDOW and 
+		reno.ssthresh == float("inf"))
+
+	return all(assertions)
+
+def testCubic(step=0.1):
+	"""tests Cubic: a loss cuts cwnd by BETA and records
+	wMax, cwnd then grows quickly, flattens out below
+	wMax around K and grows faster and faster past it,
+	never slower than Reno would. A loss below wMax
+	lowers wMax (fast convergence)"""
+
+	assertions = []
+	rtt = RttEstimator()
+
+	cubic = Cubic()
+	cubic.onAck(4, 0.0, rtt)
+	assertions.append(cubic.cwnd == 8)
+	cubic.onLoss(0.0)
+	assertions.append(abs(cubic.cwnd - 8 * Cubic.BETA) < 1e-9 and 
+		cubic.wMax == 8)
+
+	# an ACK of a packet every step seconds
+	k = ((cubic.wMax - cubic.cwnd) / Cubic.C) ** (1 / 3)
+	cwnds = [cubic.cwnd]
+	for i in range(1, 50):
+		cubic.onAck(1, i * step, rtt)
+		cwnds.append(cubic.cwnd)
+		assertions.append(cubic.cwnd >= cubic._wEst)
+	assertions.append(all(map(lambda pair: pair[0] <= pair[1], 
+		zip(cwnds, cwnds[1:]))))
+
+	def grown(start, end):
+		return cwnds[int(end / step)] - cwnds[int(start / step)]
+	# concave up to K, convex past it
+	assertions.append(max(cwnds[:int(1.3 * k / step)]) < cubic.wMax)
+	assertions.append(grown(0, 0.5) > grown(k - 0.25, k + 0.25))
+	assertions.append(grown(k + 2, k + 2.5) > grown(k - 0.25, k + 0.25))
+	assertions.append(cwnds[-1] > cubic.wMax + 2)
+
+	# fast convergence
+	cubic.onLoss(5.0)
+	wMax = cubic.wMax
+	cubic.onLoss(5.0)
+	assertions.append(abs(cubic.wMax - wMax * Cubic.BETA * 
+		(1 + Cubic.BETA) / 2) < 1e-9)
+
+	cubic.onTimeout(5.1)
+	assertions.append(cubic.cwnd == 1)
+	cubic.onAck(1, 5.2, rtt)
+	assertions.append(cubic.cwnd == 2)
+
+	return all(assertions)
+
+def testDelayedAck():
+	"""tests DelayedAck: every `every` in order packets 
+	are acknowledged together, a single one once delay
+	passed since it arrived, and urgent() at once"""
+
+	assertions = []
+
+	acks = DelayedAck(every=2, delay=0.01)
+	assertions.append(not acks.due(0.0) and acks.deadline is None)
+
+	# the first packet starts the deadline
+	acks.add(1.0)
+	assertions.append(acks.deadline == 1.01)
+	assertions.append(not acks.due(1.005) and acks.due(1.01))
+	# the second makes it due at once
+	acks.add(1.005)
+	assertions.append(acks.deadline == 1.01 and acks.due(1.005))
+	assertions.append(acks.pending == 2)
+	acks.sent()
+	assertions.append(not acks.due(2.0) and acks.pending == 0)
+
+	# later packets do not move the deadline
+	acks.every = 4
+	for now in (3.0, 3.004, 3.008):
+		acks.add(now)
+		assertions.append(acks.deadline == 3.01 and not acks.due(now))
+	assertions.append(acks.due(3.01))
+	acks.sent()
+
+	acks.urgent()
+	assertions.append(acks.due(4.0) and acks.deadline is None)
+	acks.sent()
+
+	# every packet is acknowledged
+	acks.every = 1
+	acks.add(5.0)
+	assertions.append(acks.due(5.0))
+
+	return all(assertions)
+
+class TestSocket(Socket):
+	"""Socket for the running interpreter (the unit
+	tests run on any Python)"""
+	_expectedPythonVersion = sys.hexversion
+
+def testSegments(sizes=(0, 1, 3, 8, 12, 13, 64, 1450)):
+	"""tests that Socket._segments splits messages into
+	packets of at most mss bytes (options included) that
+	join up to the message, for any mss, and that only 
+	the first packet carries the length if it fits"""
+
+	assertions = []
+
+	sock = TestSocket()
+	sock.srcAddr = ("127.0.0.1", 8080)
+	sock.destAddr = ("127.0.0.1", 8081)
+	msg = os.urandom(3000)
+	reserve = len(PacketOptions.pickle({"LENGTH": len(msg)}))
+
+	for mss in sizes:
+		sock.mss = mss
+		for source in (msg, io.BytesIO(msg), [msg[:7], msg[7:]]):
+			packets = list(sock._segments(source))
+			data = b"".join(map(lambda p: bytes(p.data), packets))
+			assertions.append(data == msg)
+			assertions.append(all(map(lambda p: 
+				len(p._opts) + len(p.data) <= max(1, mss), packets)))
+			assertions.append(all(map(lambda p: 
+				"LENGTH" not in p.options, packets[1:])))
+			if mss > reserve and not isinstance(source, list):
+				assertions.append(packets[0].options["LENGTH"] == len(msg))
+
+	sock._socket.close()
+	return all(assertions)
+
+def testTimerWheel(seed=3251, rounds=2000):
+	"""tests TimerWheel against a list of deadlines, on a
+	small wheel (4 slots, 2 levels) so timers cascade 
+	across levels and overflow it: every timer fires once,
+	at the first advance() past its deadline (the next tick
+	if it was due already), cancelled timers never fire, 
+	and nextDeadline() is never later than the next timer
+	due"""
+
+	rng = random.Random(seed)
+	assertions = []
+
+	wheel = TimerWheel(tick=1.0, bits=2, levels=2, now=0.0)
+	now = 0.0
+	# id -> (timer, tick it is due at)
+	armed = dict()
+	fired = list()
+
+	for i in range(rounds):
+		action = rng.random()
+		if action < 0.5:
+			# from already due to well past the 16 ticks
+			# the wheel holds
+			deadline = now + rng.choice((-2, 0, 0.5, 1, 3, 4, 15, 16, 17, 40)) + rng.random()
+			timer = wheel.schedule(deadline, fired.append, i)
+			armed[i] = (timer, max(int(now) + 1, math.ceil(deadline)))
+		elif action < 0.6 and armed:
+			i = rng.choice(list(armed))
+			timer, due = armed.pop(i)
+			assertions.append(timer.cancel())
+			assertions.append(not timer.cancel())
+		else:
+			if armed:
+				due = min(map(lambda a: a[1], armed.values()))
+				assertions.append(wheel.nextDeadline() <= due)
+			now += rng.choice((0.3, 1, 2, 5, 20))
+			del fired[:]
+			count = wheel.advance(now)
+			assertions.append(count == len(fired))
+			for i in fired:
+				timer, due = armed.pop(i)
+				assertions.append(due <= now and not timer.armed)
+			# nothing due is left armed
+			assertions.append(all(map(lambda a: a[1] > now, 
+				armed.values())))
+		assertions.append(len(wheel) == len(armed))
+
+	assertions.append(wheel.advance(now + 100) == len(armed))
+	assertions.append(len(wheel) == 0 and wheel.nextDeadline() is None)
+
+	return all(assertions)
+
+def loopback(sock, **attrs):
+	"""sets attrs on sock and binds it to a free port
+	of 127.0.0.1. Returns sock"""
+	for name, value in attrs.items():
+		setattr(sock, name, value)
+	sock.bind(("127.0.0.1", 0))
+	sock.srcAddr = sock._socket.getsockname()
+	return sock
+
+class Background(threading.Thread):
+	"""runs func(*args) on its own thread. result() 
+	waits for it and returns what func returned (or 
+	raises what it raised)"""
+
+	def __init__(self, func, *args):
+		threading.Thread.__init__(self, daemon=True)
+		self._func = func
+		self._args = args
+		self._result = None
+		self._error = None
+		self.start()
+
+	def run(self):
+		try:
+			self._result = self._func(*self._args)
+		except Exception as e:
+			self._error = e
+
+	def result(self):
+		self.join()
+		if self._error is not None:
+			raise self._error
+		return self._result
+
+def testShortDatagrams(sizes=(0, 1, 3, Header.LENGTH - 1)):
+	"""tests that datagrams shorter than a header are
+	dropped like packets with an invalid checksum, by 
+	Packet.unpickle, a listener (whose other connections
+	go on) and a connected socket"""
+
+	assertions = []
+
+	for size in sizes:
+		try:
+			Packet.unpickle(os.urandom(size))
+			assertions.append(False)
+		except RxPException as e:
+			assertions.append(e.type == RxPException.INVALID_CHECKSUM)
+
+	stray = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	server = loopback(TestSocket(), timeout=0.1, fullDuplex=True)
+	server.listen(8)
+	for size in sizes:
+		stray.sendto(os.urandom(size), server.srcAddr)
+
+	client = loopback(TestSocket(), timeout=0.1)
+	client.connect(server.srcAddr)
+	conn = server.accept()
+	assertions.append(server._listener is not None)
+
+	# the listener and the client drop them while
+	# sending and receiving
+	for size in sizes:
+		stray.sendto(os.urandom(size), server.srcAddr)
+		stray.sendto(os.urandom(size), client.srcAddr)
+	reader = Background(conn.recv)
+	client.send(b"ping")
+	assertions.append(reader.result() == b"ping")
+
+	for size in sizes:
+		stray.sendto(os.urandom(size), client.srcAddr)
+	sender = Background(conn.send, b"pong")
+	assertions.append(client.recv() == b"pong")
+	sender.result()
+
+	client.close()
+	server.close()
+	stray.close()
+	return all(assertions)
+
+class LossySocket(TestSocket):
+	"""TestSocket that drops the packets it sends for
+	which drop(packet) is True, and counts them"""
+
+	def __init__(self, drop):
+		TestSocket.__init__(self)
+		self.drop = drop
+		self.dropped = 0
+
+	def sendto(self, packet, addr):
+		if self.drop(packet):
+			self.dropped += 1
+			return
+		TestSocket.sendto(self, packet, addr)
+
+def eventually(predicate, timeout=1.0):
+	"""waits up to timeout seconds for predicate() (state 
+	another thread changes) to be true. Returns its value
+	"""
+	deadline = time.monotonic() + timeout
+	while not predicate() and time.monotonic() < deadline:
+		time.sleep(0.001)
+	return predicate()
+
+def listening(backlog=8, **attrs):
+	"""returns a TestSocket listening on 127.0.0.1 with
+	backlog, attrs set on it"""
+	attrs.setdefault("timeout", 0.1)
+	server = loopback(TestSocket(), **attrs)
+	server.listen(backlog)
+	return server
+
+def connected(server, client=None, **attrs):
+	"""connects client (a new TestSocket by default, attrs
+	set on it) to server, listening with a backlog. 
+	Returns the client and the connection server accepted
+	"""
+	attrs.setdefault("timeout", 0.05)
+	attrs.setdefault("resendLimit", 10)
+	client = loopback(client or TestSocket(), **attrs)
+	client.connect(server.srcAddr)
+	return client, server.accept()
+
+def testBacklog(backlog=2):
+	"""tests that a listener queues at most backlog
+	connections for accept(): a SYN beyond that is
+	dropped until accept() makes room"""
+
+	assertions = []
+
+	server = listening(backlog, fullDuplex=True)
+	clients = list()
+	for i in range(backlog):
+		client = loopback(TestSocket(), timeout=0.05)
+		client.connect(server.srcAddr)
+		clients.append(client)
+	# queued once the listener has the final ACKs
+	assertions.append(eventually(lambda: len(server._backlog) == backlog))
+
+	late = loopback(TestSocket(), timeout=0.02, resendLimit=4)
+	try:
+		late.connect(server.srcAddr)
+		assertions.append(False)
+	except RxPException as e:
+		assertions.append(e.type == RxPException.CONNECTION_TIMEOUT)
+	assertions.append(not server._handshakes)
+
+	conns = [server.accept()]
+	late.resendLimit = 10
+	late.connect(server.srcAddr)
+	clients.append(late)
+	for i in range(backlog):
+		conns.append(server.accept())
+	assertions.append(list(map(lambda c: c.destAddr, conns)) == 
+		list(map(lambda c: c.srcAddr, clients)))
+
+	for client, conn in zip(clients, conns):
+		client.send(b"hello")
+		assertions.append(conn.recv() == b"hello")
+		client.close()
+	server.close()
+	return all(assertions)
+
+def testPeerReuse():
+	"""tests that a peer that closed its connection can
+	connect again from the same address: the listener
+	routes it to a new connection"""
+
+	assertions = []
+
+	server = listening(fullDuplex=True)
+	client, conn = connected(server)
+	addr = client.srcAddr
+	client.send(b"one")
+	assertions.append(conn.recv() == b"one")
+	client.close()
+	# the end of the stream
+	assertions.append(conn.recv() == b"")
+	assertions.append(conn.connStatus == ConnectionStatus.NO_CONN)
+	assertions.append(eventually(lambda: addr not in server._connections))
+
+	again = TestSocket()
+	again.timeout = 0.05
+	again.bind(addr)
+	again.connect(server.srcAddr)
+	reused = server.accept()
+	assertions.append(reused is not conn and reused.destAddr == addr)
+	again.send(b"two")
+	assertions.append(reused.recv() == b"two")
+	# again reads only while recv() runs
+	reader = Background(again.recv)
+	reused.send(b"three")
+	assertions.append(reader.result() == b"three")
+
+	again.close()
+	server.close()
+	return all(assertions)
+
+def testLostFinalAck():
+	"""tests that a listener queues a connection whose
+	final handshake ACK was lost once its first data 
+	arrives"""
+
+	assertions = []
+
+	server = listening()
+	client = loopback(LossySocket(lambda p: 
+		p.checkAttrs(PacketAttributes.ACK, exclusive=True) and
+		"MSS" in p.options), timeout=0.05)
+	client.connect(server.srcAddr)
+	assertions.append(client.dropped == 1)
+	# the handshake is not complete
+	try:
+		server.accept()
+		assertions.append(False)
+	except socket.timeout:
+		assertions.append(client.srcAddr in server._handshakes)
+
+	sender = Background(client.send, b"first")
+	conn = server.accept()
+	assertions.append(conn.destAddr == client.srcAddr)
+	assertions.append(conn.recv() == b"first")
+	sender.result()
+	assertions.append(not server._handshakes)
+	assertions.append(server._connections.get(client.srcAddr) is conn)
+
+	client.close()
+	assertions.append(conn.recv() == b"")
+	server.close()
+	return all(assertions)
+
+def testListenerClose():
+	"""tests that closing a listener stops its connections:
+	accepted ones (read by another thread, or run by the
+	listener if fullDuplex) raise RxPException instead of 
+	waiting for their timeouts, the queued ones are
+	dropped and accept() raises"""
+
+	assertions = []
+
+	for fullDuplex in (False, True):
+		server = listening(fullDuplex=fullDuplex, timeout=1.0)
+		client, conn = connected(server, resendLimit=2)
+		queued = loopback(TestSocket(), timeout=0.05, resendLimit=2)
+		queued.connect(server.srcAddr)
+
+		reader = Background(conn.recv)
+		# the reader waits
+		reader.join(0.05)
+		start = time.monotonic()
+		server.close()
+		try:
+			reader.result()
+			assertions.append(False)
+		except RxPException as e:
+			assertions.append(e.type == RxPException.INVALID_STATE)
+		assertions.append(time.monotonic() - start < 0.5)
+		assertions.append(conn.connStatus == ConnectionStatus.NO_CONN)
+		assertions.append(not (server._connections or server._backlog))
+		try:
+			conn.send(b"late")
+			assertions.append(False)
+		except RxPException as e:
+			assertions.append(e.type == RxPException.INVALID_STATE)
+		try:
+			server.accept()
+			assertions.append(False)
+		except RxPException as e:
+			assertions.append(e.type == RxPException.INVALID_STATE)
+		conn.close()
+
+		# nothing answers their CLOSE
+		client.close()
+		queued.close()
+	return all(assertions)
+
+def handshakeAck(seq, cookie, mss=Packet.DATA_LENGTH):
+	"""returns the final ACK of a handshake whose SYN had
+	sequence number seq - 1, returning cookie"""
+	header = Header(seq=seq, ack=(cookie + 1) % Packet.MAX_SEQ_NUM,
+		attrs=PacketAttributes.ACK)
+	return Packet(header, options={"MSS": mss, "SCALE": 0})
+
+def testSynCookies(seq=Packet.MAX_SEQ_NUM - 1, syns=20):
+	"""tests SYN cookies: a listener keeps no state for 
+	SYNs, an ACK returning a valid cookie (issued in this 
+	period or the one before) creates the connection, and
+	forged, expired or other address cookies do not. A
+	lost final ACK is resent when the first data gets a
+	SYNACK back"""
+
+	assertions = []
+
+	server = listening(synCookies=True)
+	addr = ("127.0.0.1", 9)
+
+	# no state per SYN, no timer
+	flood = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	flood.settimeout(1.0)
+	for i in range(syns):
+		header = Header(seq=i, attrs=PacketAttributes.SYN)
+		flood.sendto(Packet(header, options={"MSS": 1450}).pickle(), 
+			server.srcAddr)
+	synacks = list()
+	for i in range(syns):
+		synack = Packet.unpickle(flood.recv(2048))
+		synacks.append(synack.checkAttrs(
+			PacketAttributes.SYN | PacketAttributes.ACK, exclusive=True) and
+			synack.header.ack == i + 1 and synack.verify())
+	assertions.append(all(synacks))
+	with server._cond:
+		assertions.append(not (server._handshakes or server._connections or
+			server._backlog))
+		assertions.append(len(server._timers) == 0)
+
+	# a forged cookie, or one issued to another address,
+	# creates no connection
+	flood.sendto(handshakeAck(1, 12345).pickle(), server.srcAddr)
+	period = int(time.monotonic() // Socket.COOKIE_PERIOD)
+	cookie = server._cookie(addr, 0, period)
+	flood.sendto(handshakeAck(1, cookie).pickle(), server.srcAddr)
+	try:
+		server.accept()
+		assertions.append(False)
+	except socket.timeout:
+		assertions.append(True)
+
+	# cookies of this period and the one before are 
+	# accepted, older ones are expired. A period may end
+	# between the cookie and the check, which is retried
+	for age, valid in ((0, True), (1, True), (2, False), (-1, False)):
+		while True:
+			period = int(time.monotonic() // Socket.COOKIE_PERIOD)
+			cookie = server._cookie(addr, seq, period - age)
+			with server._cond:
+				conn = server._cookieConnection(
+					handshakeAck(seq + 1, cookie), addr)
+			if period == int(time.monotonic() // Socket.COOKIE_PERIOD):
+				break
+		assertions.append((conn is not None) == valid)
+		if conn is not None:
+			assertions.append(conn.ack.num == 0 and 
+				conn.seq.num == (cookie + 1) % Packet.MAX_SEQ_NUM)
+		with server._cond:
+			# the ACK of another address
+			assertions.append(server._cookieConnection(
+				handshakeAck(seq + 1, cookie), ("127.0.0.1", 10)) is None)
+
+	# a valid cookie over the network
+	client, conn = connected(server)
+	reader = Background(conn.recv)
+	client.send(b"hello")
+	assertions.append(reader.result() == b"hello")
+	client.close()
+	assertions.append(conn.recv() == b"")
+
+	# the final ACK is lost: the first data gets a SYNACK
+	# back, which makes the client resend it
+	lost = [1]
+	def drop(packet):
+		if (lost and packet.checkAttrs(PacketAttributes.ACK, exclusive=True)
+			and "MSS" in packet.options):
+			return lost.pop()
+		return False
+	client = loopback(LossySocket(drop), timeout=0.05)
+	client.connect(server.srcAddr)
+	assertions.append(client.dropped == 1)
+	sender = Background(client.send, b"first")
+	conn = server.accept()
+	assertions.append(conn.recv() == b"first")
+	sender.result()
+	client.close()
+	assertions.append(conn.recv() == b"")
+
+	flood.close()
+	server.close()
+	return all(assertions)
+
+class RecordingSocket(TestSocket):
+	"""TestSocket that records the attributes, options and
+	data of the packets it sends"""
+
+	def __init__(self):
+		TestSocket.__init__(self)
+		self.sent = list()
+
+	def sendto(self, packet, addr):
+		self.sent.append((packet.header.attrs, dict(packet.options), 
+			bytes(packet.data)))
+		TestSocket.sendto(self, packet, addr)
+
+def testFullDuplex(size=100000, count=3):
+	"""tests a fullDuplex connection (single peer listen
+	and accept) over 127.0.0.1: both ends send messages
+	and read the other's at the same time, from several
+	threads"""
+
+	assertions = []
+
+	server = loopback(TestSocket(), timeout=0.05, fullDuplex=True)
+	client = loopback(TestSocket(), timeout=0.05, fullDuplex=True)
+	def accept():
+		server.listen()
+		server.accept()
+	acceptor = Background(accept)
+	client.connect(server.srcAddr)
+	acceptor.result()
+	assertions.append(server._reactor is not None and 
+		client._reactor is not None)
+
+	ups = [os.urandom(size) for i in range(count)]
+	downs = [os.urandom(size // 2) for i in range(count)]
+	senders = ([Background(client.send, msg) for msg in ups] +
+		[Background(server.send, msg) for msg in downs])
+	readers = [Background(lambda: [server.recv() for msg in ups]),
+		Background(lambda: [client.recv() for msg in downs])]
+	for sender in senders:
+		sender.result()
+	# messages sent from several threads arrive whole, 
+	# in some order
+	received, replies = map(Background.result, readers)
+	assertions.append(sorted(received) == sorted(ups))
+	assertions.append(sorted(replies) == sorted(downs))
+
+	client.close()
+	assertions.append(server.recv() == b"")
+	server.close()
+	assertions.append(server._reactor is None and 
+		client._reactor is None)
+	return all(assertions)
+
+def testMssNegotiation(path=900):
+	"""tests that both ends use the smaller of their 
+	segment sizes (clamped to [MIN_SEGMENT_SIZE, 
+	MAX_DATA_LENGTH]), and that probeMSS finds the 
+	largest payload a path carries and tells the peer"""
+
+	assertions = []
+
+	sock = TestSocket()
+	sock.mss = 1000
+	assertions.append(sock._segmentSize(600) == 600)
+	assertions.append(sock._segmentSize(5000) == 1000)
+	assertions.append(sock._segmentSize(10) == Packet.MIN_SEGMENT_SIZE)
+	sock.mss = 2 ** 20
+	assertions.append(sock._segmentSize(2 ** 20) == Packet.MAX_DATA_LENGTH)
+	sock.close()
+
+	server = listening(mss=1000)
+	for mss, expected in ((1450, 1000), (600, 600)):
+		client, conn = connected(server, mss=mss)
+		assertions.append(client.mss == expected and conn.mss == expected)
+		client.close()
+
+	# the path drops payloads over path bytes
+	client = LossySocket(lambda p: p.options.get("PROBE", 0) > path)
+	client, conn = connected(server, client, mss=Packet.DATA_LENGTH, 
+		probeMSS=True, probeAttempts=1)
+	assertions.append(client.dropped > 0)
+	assertions.append(client.mss == path and conn.mss == path)
+	msg = os.urandom(5 * path)
+	reader = Background(conn.recv)
+	client.send(msg)
+	assertions.append(reader.result() == msg)
+	client.close()
+
+	server.close()
+	return all(assertions)
+
+def testFastOpen(msg=b"GET:notes"):
+	"""tests fast open: a listener issues tokens, a client
+	with one sends its first message in the SYN, which 
+	the SYNACK acknowledges. Without a valid token the 
+	message is sent after the handshake. A connection in
+	its handshake and queued for accept() counts once 
+	against the backlog, and fast open works with SYN 
+	cookies"""
+
+	assertions = []
+	isSYN = lambda attrs: attrs & ~PacketAttributes.OPT == PacketAttributes.SYN
+	isData = lambda attrs: attrs & PacketAttributes.NM
+
+	for synCookies in (False, True):
+		server = listening(2, fastOpen=True, synCookies=synCookies)
+		Socket._fastOpenTokens.pop(server.srcAddr, None)
+
+		# the first connection gets a token
+		client, conn = connected(server, RecordingSocket(), fastOpen=True)
+		token = server._fastOpenToken(client.srcAddr)
+		attrs, options, data = client.sent[0]
+		assertions.append(isSYN(attrs) and options["TOKEN"] == 0)
+		assertions.append(Socket._fastOpenTokens[server.srcAddr][0] == token)
+		client.close()
+		assertions.append(conn.recv() == b"")
+
+		# the next one sends msg in the SYN. Its final ACKs 
+		# are lost, so it is in its handshake and queued
+		client = loopback(LossySocket(lambda p: 
+			p.checkAttrs(PacketAttributes.ACK, exclusive=True) and 
+			"MSS" in p.options), timeout=0.05, resendLimit=4, fastOpen=True)
+		client.connect(server.srcAddr, msg)
+		# the SYNACK acknowledged msg, it is not sent again
+		assertions.append(client.seq.num == 2)
+		assertions.append(eventually(lambda: len(server._backlog) == 1))
+		with server._cond:
+			assertions.append(server._waiting() == 1)
+		# room for another connection
+		other = loopback(TestSocket(), timeout=0.05, resendLimit=4)
+		other.connect(server.srcAddr)
+		conn = server.accept()
+		assertions.append(conn.destAddr == client.srcAddr)
+		assertions.append(conn.recv() == msg)
+		assertions.append(server.accept().destAddr == other.srcAddr)
+
+		# an invalid token: msg is sent after the handshake
+		Socket._fastOpenTokens[server.srcAddr] = (token ^ 1, 
+			Packet.DATA_LENGTH)
+		late = loopback(RecordingSocket(), timeout=0.05, fastOpen=True)
+		connecting = Background(late.connect, server.srcAddr, msg)
+		lateConn = server.accept()
+		assertions.append(lateConn.recv() == msg)
+		connecting.result()
+		assertions.append(late.sent[0][1]["TOKEN"] == token ^ 1 and 
+			late.sent[0][2] == msg)
+		assertions.append(len(list(filter(lambda p: isData(p[0]), 
+			late.sent))) == 1)
+		# it has the valid token again
+		assertions.append(Socket._fastOpenTokens[server.srcAddr][0] == token)
+
+		for sock in (other, late):
+			sock.close()
+		server.close()
+		client.close()
+	return all(assertions)
+
+def testSlowReader(window=4096, size=40000):
+	"""tests that a receiver that does not read closes
+	its window: the sender stalls without resending, and 
+	goes on once the reader reads (window update)"""
+
+	assertions = []
+
+	server = listening()
+	client, conn = connected(server, fullDuplex=True, 
+		recvWindow=window)
+	msg = os.urandom(size)
+	sender = Background(conn.send, msg)
+	# less room than a segment
+	assertions.append(eventually(lambda: conn._peerWindow < conn.mss))
+	# nothing is read for a while
+	sender.join(0.3)
+	assertions.append(sender.is_alive())
+	assertions.append(client._buffered <= window)
+	assertions.append(conn.timeoutRetransmits == 0 and 
+		conn.fastRetransmits == 0)
+
+	assertions.append(client.recv() == msg)
+	sender.result()
+	assertions.append(conn.timeoutRetransmits == 0 and 
+		conn.fastRetransmits == 0)
+
+	client.close()
+	server.close()
+	return all(assertions)
+
+def testWindowProbe(window=4096, size=40000):
+	"""tests that a sender whose window update ACK was 
+	lost learns that the window opened from the answer to
+	its zero window probe (the answers to the probes 
+	sent before advertise less room)"""
+
+	assertions = []
+
+	armed = [False]
+	client = LossySocket(lambda p: armed[0] and 
+		client.dropped == 0 and 
+		p.checkAttrs(PacketAttributes.ACK, exclusive=True) and
+		p.header.recvWindow << client._recvScale > window // 2)
+	server = listening()
+	client, conn = connected(server, client, fullDuplex=True, 
+		recvWindow=window)
+	msg = os.urandom(size)
+	sender = Background(conn.send, msg)
+	# less room than a segment
+	assertions.append(eventually(lambda: conn._peerWindow < conn.mss))
+
+	armed[0] = True
+	start = time.monotonic()
+	assertions.append(client.recv() == msg)
+	sender.result()
+	assertions.append(client.dropped == 1)
+	assertions.append(time.monotonic() - start < 1.0)
+	assertions.append(conn.timeoutRetransmits == 0 and 
+		conn.fastRetransmits == 0)
+
+	client.close()
+	server.close()
+	return all(assertions)
+
+def testRecvTimeout():
+	"""tests that recv, recv_into and recvChunks all raise
+	CONNECTION_TIMEOUT when nothing arrives, with or 
+	without fullDuplex"""
+
+	assertions = []
+
+	for fullDuplex in (False, True):
+		server = listening(fullDuplex=fullDuplex)
+		client, conn = connected(server, fullDuplex=fullDuplex, 
+			resendLimit=2)
+		reads = (client.recv, lambda: client.recv_into(bytearray(10)),
+			lambda: next(client.recvChunks()))
+		for read in reads:
+			try:
+				read()
+				assertions.append(False)
+			except RxPException as e:
+				assertions.append(e.type == RxPException.CONNECTION_TIMEOUT)
+
+		# the connection goes on
+		reader = Background(client.recv)
+		conn.send(b"late")
+		assertions.append(reader.result() == b"late")
+		client.close()
+		server.close()
+	return all(assertions)
+
+class TestAsyncSocket(AsyncSocket):
+	"""AsyncSocket for the running interpreter"""
+	_expectedPythonVersion = sys.hexversion
+
+def runAsync(coroutine):
+	"""runs coroutine on a new event loop, returns what
+	it returned"""
+	if hasattr(asyncio, "run"):
+		return asyncio.run(coroutine)
+	loop = asyncio.new_event_loop()
+	try:
+		asyncio.set_event_loop(loop)
+		return loop.run_until_complete(coroutine)
+	finally:
+		asyncio.set_event_loop(None)
+		loop.close()
+
+# generator based, Python 3.4 has no async def
+coroutine = getattr(asyncio, "coroutine", None) or types.coroutine
+
+@coroutine
+def asyncLoopback(assertions, size):
+	server = TestAsyncSocket()
+	server.timeout = 0.1
+	yield from server.bind(("127.0.0.1", 0))
+	yield from server.listen(4)
+
+	clients = list()
+	conns = list()
+	for i in range(2):
+		client = TestAsyncSocket()
+		client.timeout = 0.05
+		yield from client.bind(("127.0.0.1", 0))
+		conn, none = yield from asyncio.gather(server.accept(), 
+			client.connect(server.srcAddr))
+		assertions.append(conn.destAddr == client.srcAddr)
+		clients.append(client)
+		conns.append(conn)
+	first, second = clients
+
+	# recv, and send the other way at the same time
+	msg = os.urandom(size)
+	reply = os.urandom(size // 2)
+	none, received, none, echoed = yield from asyncio.gather(
+		first.send(msg), conns[0].recv(), 
+		conns[0].send(reply), first.recv())
+	assertions.append(received == msg and echoed == reply)
+
+	# recv_into, while the second peer is served
+	buf = bytearray(1000)
+	parts = list()
+	yield from asyncio.gather(conns[0].send(msg), 
+		second.send(reply))
+	while True:
+		count = yield from first.recv_into(buf)
+		if not count:
+			break
+		parts.append(bytes(buf[:count]))
+	assertions.append(b"".join(parts) == msg)
+
+	# recvChunks
+	chunks = conns[1].recvChunks()
+	parts = list()
+	while True:
+		chunk = yield from chunks.next()
+		if chunk is None:
+			break
+		parts.append(chunk)
+	assertions.append(len(parts) >= 1 and b"".join(parts) == reply)
+
+	# the end of the stream once the peers closed
+	for client, conn in zip(clients, conns):
+		yield from client.close()
+		end = yield from conn.recv()
+		assertions.append(end == b"" and 
+			conn.connStatus == ConnectionStatus.NO_CONN)
+	assertions.append(not server._connections)
+
+	# the listener's timers run on the loop: an idle
+	# peer is closed
+	server.idleTimeout = 0.2
+	idle = TestAsyncSocket()
+	idle.timeout = 0.05
+	yield from idle.bind(("127.0.0.1", 0))
+	conn, none = yield from asyncio.gather(server.accept(), 
+		idle.connect(server.srcAddr))
+	start = time.monotonic()
+	end = yield from conn.recv()
+	assertions.append(end == b"" and time.monotonic() - start >= 0.15)
+	yield from idle.close()
+
+	yield from server.close()
+	try:
+		yield from server.accept()
+		assertions.append(False)
+	except RxPException as e:
+		assertions.append(e.type == RxPException.INVALID_STATE)
+
+def testAsyncLoopback(size=20000):
+	"""tests AsyncSocket over 127.0.0.1: a listener 
+	accepts two peers, messages are read with recv,
+	recv_into and recvChunks, and an idle peer is closed"""
+
+	assertions = []
+	runAsync(asyncLoopback(assertions, size))
+	return all(assertions)
+
+@coroutine
+def asyncResendLimit(assertions):
+	server = TestAsyncSocket()
+	server.timeout = 0.1
+	yield from server.bind(("127.0.0.1", 0))
+	yield from server.listen(1)
+	client = TestAsyncSocket()
+	client.timeout = 0.05
+	yield from client.bind(("127.0.0.1", 0))
+	conn, none = yield from asyncio.gather(server.accept(), 
+		client.connect(server.srcAddr))
+	none, heard = yield from asyncio.gather(client.send(b"heard"),
+		conn.recv())
+	assertions.append(heard == b"heard")
+
+	yield from server.close()
+	client.resendLimit = 3
+	try:
+		yield from client.send(os.urandom(5000))
+		assertions.append(False)
+	except RxPException as e:
+		assertions.append(e.type == RxPException.RESEND_LIM)
+	yield from client.close()
+
+def testResendLimit():
+	"""tests that send raises RESEND_LIM once the peer
+	stopped answering: alone, and for every message
+	queued to a fullDuplex reactor, and on AsyncSocket"""
+
+	assertions = []
+
+	for fullDuplex in (False, True):
+		server = listening()
+		client, conn = connected(server, fullDuplex=fullDuplex)
+		reader = Background(conn.recv)
+		client.send(b"heard")
+		assertions.append(reader.result() == b"heard")
+		# nothing answers from now on
+		server.close()
+		client.resendLimit = 3
+
+		senders = [Background(client.send, os.urandom(5000))]
+		if fullDuplex:
+			senders.append(Background(client.send, b"queued"))
+		for sender in senders:
+			try:
+				sender.result()
+				assertions.append(False)
+			except RxPException as e:
+				assertions.append(e.type == RxPException.RESEND_LIM)
+		assertions.append(not client._failed)
+		client.close()
+
+	runAsync(asyncResendLimit(assertions))
+	return all(assertions)